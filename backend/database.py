@@ -1,5 +1,7 @@
 import os
 import json
+import tempfile
+import threading
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from models import VendorDraftModel, DocumentModel, ChatMessage
@@ -17,6 +19,10 @@ class JSONDatabase:
         self.documents_file = os.path.join(data_dir, "documents.json")
         self.chat_messages_file = os.path.join(data_dir, "chat_messages.json")
         
+        # Serializes every read-modify-write of the JSON files; DB calls run both on
+        # the event loop and in worker threads, so unlocked writers would drop records
+        self._write_lock = threading.Lock()
+        
         # Create empty files if they don't exist
         for file_path in [self.vendor_drafts_file, self.documents_file, self.chat_messages_file]:
             if not os.path.exists(file_path):
@@ -47,16 +53,23 @@ class JSONDatabase:
             return {}
     
     def _save_json(self, file_path: str, data: Dict[str, Any]):
-        """Save JSON data to file"""
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
+        """Save JSON data to file atomically so readers never see a half-written file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.data_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2, default=str)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
     
     # Vendor Draft operations
     def create_vendor_draft(self, vendor_draft: VendorDraftModel) -> str:
         """Create a new vendor draft"""
-        data = self._load_json(self.vendor_drafts_file)
-        data[vendor_draft.id] = vendor_draft.dict()
-        self._save_json(self.vendor_drafts_file, data)
+        with self._write_lock:
+            data = self._load_json(self.vendor_drafts_file)
+            data[vendor_draft.id] = vendor_draft.dict()
+            self._save_json(self.vendor_drafts_file, data)
         return vendor_draft.id
     
     def get_vendor_draft(self, draft_id: str) -> Optional[VendorDraftModel]:
@@ -123,20 +136,37 @@ class JSONDatabase:
     
     def update_vendor_draft(self, draft_id: str, updates: Dict[str, Any]) -> bool:
         """Update vendor draft"""
-        data = self._load_json(self.vendor_drafts_file)
-        if draft_id in data:
-            data[draft_id].update(updates)
-            data[draft_id]['updated_at'] = datetime.now().isoformat()
-            self._save_json(self.vendor_drafts_file, data)
-            return True
-        return False
+        with self._write_lock:
+            data = self._load_json(self.vendor_drafts_file)
+            if draft_id in data:
+                data[draft_id].update(updates)
+                data[draft_id]['updated_at'] = datetime.now().isoformat()
+                self._save_json(self.vendor_drafts_file, data)
+                return True
+            return False
     
     # Document operations
     def create_document(self, document: DocumentModel) -> str:
         """Create a new document"""
-        data = self._load_json(self.documents_file)
-        data[document.id] = document.dict()
-        self._save_json(self.documents_file, data)
+        with self._write_lock:
+            data = self._load_json(self.documents_file)
+            data[document.id] = document.dict()
+            self._save_json(self.documents_file, data)
+        return document.id
+    
+    def create_document_and_set_stage(self, document: DocumentModel, draft_id: str, stage: Optional[str] = None) -> str:
+        """Create a document and move its vendor draft to the given stage in one locked step"""
+        with self._write_lock:
+            documents = self._load_json(self.documents_file)
+            documents[document.id] = document.dict()
+            self._save_json(self.documents_file, documents)
+            
+            if stage is not None:
+                drafts = self._load_json(self.vendor_drafts_file)
+                if draft_id in drafts:
+                    drafts[draft_id]['chat_stage'] = stage
+                    drafts[draft_id]['updated_at'] = datetime.now().isoformat()
+                    self._save_json(self.vendor_drafts_file, drafts)
         return document.id
     
     def get_document(self, document_id: str) -> Optional[DocumentModel]:
@@ -148,13 +178,14 @@ class JSONDatabase:
     
     def update_document(self, document_id: str, updates: Dict[str, Any]) -> bool:
         """Update document"""
-        data = self._load_json(self.documents_file)
-        if document_id in data:
-            data[document_id].update(updates)
-            data[document_id]['updated_at'] = datetime.now().isoformat()
-            self._save_json(self.documents_file, data)
-            return True
-        return False
+        with self._write_lock:
+            data = self._load_json(self.documents_file)
+            if document_id in data:
+                data[document_id].update(updates)
+                data[document_id]['updated_at'] = datetime.now().isoformat()
+                self._save_json(self.documents_file, data)
+                return True
+            return False
     
     def get_documents_by_session(self, session_id: str) -> List[DocumentModel]:
         """Get all documents for a session"""
@@ -168,12 +199,13 @@ class JSONDatabase:
     # Chat message operations
     def save_chat_message(self, message: ChatMessage) -> str:
         """Save a chat message"""
-        data = self._load_json(self.chat_messages_file)
-        message_id = f"{message.session_id}_{len(data)}"
-        message_data = message.dict()
-        message_data['id'] = message_id
-        data[message_id] = message_data
-        self._save_json(self.chat_messages_file, data)
+        with self._write_lock:
+            data = self._load_json(self.chat_messages_file)
+            message_id = f"{message.session_id}_{len(data)}"
+            message_data = message.dict()
+            message_data['id'] = message_id
+            data[message_id] = message_data
+            self._save_json(self.chat_messages_file, data)
         return message_id
     
     def get_chat_history(self, session_id: str, limit: int = 50) -> List[ChatMessage]:
@@ -15,7 +15,7 @@ workers = multiprocessing.cpu_count() * 2 + 1  # (CPU cores × 2) + 1
 # For 4-core server: 9 workers
 # For 8-core server: 17 workers
 
-worker_class = "uvicorn.workers.UvicornWorker"  # ASGI-compatible worker
+worker_class = "uvicorn.workers.UvicornWorker"  # ASGI-compatible worker (loop/http "auto" pick uvloop + httptools when installed)
 worker_connections = 1000  # Max simultaneous clients per worker
 max_requests = 1000  # Restart worker after 1000 requests (prevents memory leaks)
 max_requests_jitter = 50  # Add randomness to prevent all workers restarting at once
@@ -7,6 +7,10 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Required configuration, checked once at startup (served by /health)
+REQUIRED_ENV_VARS = ["OPENAI_API_KEY"]
+MISSING_ENV_VARS = [var for var in REQUIRED_ENV_VARS if not os.getenv(var)]
+
 # Import routes
 from routes.chat import router as chat_router
 from routes.chat_enhanced import router as chat_enhanced_router  # NEW: Enhanced chat with confirmation
@@ -16,7 +20,10 @@ from routes.webhook_endpoints import router as webhook_router
 from routes.ocr_endpoints import router as ocr_router
 from routes.ocr_async_endpoints import router as ocr_async_router
 from routes.queue_endpoints import router as queue_router
-from routes.chatbot_endpoints import router as chatbot_router
+from routes.chatbot_endpoints import router as chatbot_router, close_email_http
+from utils.http_client import close_shared_http
+from utils.redis_client import close_redis
+from utils.openai_client import close_openai_clients
 
 # Create FastAPI app
 app = FastAPI(
@@ -70,6 +77,12 @@ app.include_router(ocr_async_router)
 app.include_router(queue_router)
 app.include_router(chatbot_router)
 
+# Close pooled outbound HTTP, Redis and OpenAI connections on shutdown
+app.add_event_handler("shutdown", close_shared_http)
+app.add_event_handler("shutdown", close_email_http)
+app.add_event_handler("shutdown", close_redis)
+app.add_event_handler("shutdown", close_openai_clients)
+
 @app.get("/", tags=["Root"])
 async def root():
     """
@@ -137,19 +150,16 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    required_env_vars = ["OPENAI_API_KEY"]
-    missing_vars = [var for var in required_env_vars if not os.getenv(var)]
-    
-    if missing_vars:
+    if MISSING_ENV_VARS:
         raise HTTPException(
             status_code=500, 
-            detail=f"Missing environment variables: {', '.join(missing_vars)}"
+            detail=f"Missing environment variables: {', '.join(MISSING_ENV_VARS)}"
         )
     
     return {
         "status": "healthy",
         "environment": {
-            "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+            "openai_configured": "OPENAI_API_KEY" not in MISSING_ENV_VARS,
             "uploads_dir": os.path.exists("uploads"),
             "data_dir": os.path.exists("data")
         }
@@ -163,6 +173,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
+        loop="uvloop",  # libuv event loop
+        http="httptools",  # C HTTP parser
         workers=1  # Keep 1 for development (reload doesn't work with >1)
         # For production: workers=4
     )
\ No newline at end of file
@@ -2,8 +2,6 @@ from fastapi import APIRouter, HTTPException
 from typing import Dict, Any, List
 import uuid
 from datetime import datetime
-import os
-from openai import OpenAI
 import json
 
 from models import (
@@ -14,6 +12,7 @@ from models import (
 )
 from database import db
 from services.tts_service import TTSService
+from utils.openai_client import openai_client
 
 router = APIRouter(prefix="/api/v1/chat", tags=["Chat Management"])
 tts_service = TTSService()
@@ -22,7 +21,7 @@ class ChatHandler:
     """Handles chat flow and responses using OpenAI"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai_client
         self.stage_contexts = {
             ChatStage.WELCOME: {
                 "requires_document": False,
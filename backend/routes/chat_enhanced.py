@@ -3,6 +3,8 @@ Enhanced Chat Routes with Confirmation Stage and MongoDB Integration
 Matches email registration pipeline exactly
 """
 from fastapi import APIRouter, HTTPException, UploadFile, File, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import Dict, Any, List
 import uuid
 import os
@@ -22,7 +24,7 @@ from database import db
 from services.tts_service import TTSService
 from utils.pdf_converter import pdf_converter
 from utils.catalogue_processor import catalogue_processor
-from openai import OpenAI
+from utils.openai_client import openai_client
 
 router = APIRouter(prefix="/api/v1/chat", tags=["Chat Management - Enhanced"])
 tts_service = TTSService()
@@ -40,7 +42,7 @@ class ChatHandler:
     """Handles chat flow with confirmation stage"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai_client
     
     async def extract_basic_detail_with_llm(self, message: str, current_details: Dict[str, Any]) -> Dict[str, Any]:
         """Use LLM to intelligently extract and update basic details with PROPER formatting"""
@@ -1211,9 +1213,7 @@ Examples:
 """
             
             try:
-                from openai import OpenAI
-                client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-                edit_response = client.chat.completions.create(
+                edit_response = openai_client.chat.completions.create(
                     model="gpt-4o",
                     messages=[{"role": "user", "content": edit_prompt}],
                     max_tokens=200,
@@ -1464,3 +1464,25 @@ async def get_chat_history_endpoint(session_id: str):
         "messages": [msg.dict() for msg in history],
         "total_messages": len(history)
     }
+
+
+@router.post("/tts/stream")
+async def text_to_speech_stream(tts_request: TTSRequest):
+    """
+    Streaming Text-to-Speech
+    
+    The MP3 audio is relayed as binary (audio/mpeg) while it is generated,
+    so playback can begin before synthesis finishes.
+    """
+    audio = tts_service.stream_speech(tts_request.text, tts_request.voice)
+    try:
+        # Pull the first chunk up front so API errors still surface as a 500
+        first_chunk = await run_in_threadpool(next, audio, b"")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to convert text to speech: {str(e)}")
+    
+    def body():
+        yield first_chunk
+        yield from audio
+    
+    return StreamingResponse(body(), media_type="audio/mpeg")
@@ -3,21 +3,38 @@ Admin Chatbot Endpoints - Hybrid Agentic System
 Intelligent router that uses pre-defined functions OR generates MongoDB queries dynamically
 """
 import os
-import json
+import orjson
 import logging
-import requests
+import functools
+import time
+import uuid
+import inspect
+import httpx
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from pymongo import MongoClient
-from openai import OpenAI
+from cachetools import TTLCache
+from aiolimiter import AsyncLimiter
+import tiktoken
 import re
 
+from utils.openai_client import openai_client
+
 router = APIRouter(prefix="/api/v1/chatbot", tags=["Admin Chatbot"])
 
-# Initialize OpenAI client
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_OPENAI_CONFIGURED = bool(os.getenv("OPENAI_API_KEY"))
+
+# Credential email configuration
+COMPANY_NAME = os.getenv("COMPANY_NAME", "Vendor Portal")
+VENDOR_PORTAL_URL = os.getenv("VENDOR_PORTAL_URL", "https://vendor-portal.company.com")
+SUPPORT_EMAIL = os.getenv("SUPPORT_EMAIL", "support@company.com")
+SUPPORT_PHONE = os.getenv("SUPPORT_PHONE", "+91-XXXXXXXXXX")
+ADMIN_SENDER_EMAIL = os.getenv("ADMIN_SENDER_EMAIL", "admin@company.com")
+NYLAS_API_KEY = os.getenv("NYLAS_API_KEY")
+NYLAS_GRANT_ID = os.getenv("NYLAS_GRANT_ID")
+NYLAS_BASE_URL = "https://api.us.nylas.com"
 
 # MongoDB connection
 mongo_uri = os.getenv("MONGO_URI")
@@ -406,7 +423,7 @@ You can call these functions by responding with JSON: {"function": "function_nam
       - "Send email to ankit@evolve.ai with username ankit_vendor and password Welcome@123"
       - "Email credentials to rohit@startup.in - username: rohit_vendor, password: Secure@456"
       - "Send login details to vendor@company.com username test_user password Pass@123"
-    **IMPORTANT**: This sends an email with credentials via Nylas API
+    **IMPORTANT**: This sends an email with credentials via Nylas API and returns the delivery result
     **VALIDATION**: 
       - Email format must be valid
       - Username must be 4-50 chars (alphanumeric + underscore/hyphen/dot)
@@ -539,10 +556,48 @@ If query too broad:
 Now, help the admin with their query. Analyze carefully, choose the right approach (function or dynamic query), and provide a helpful response."""
 
 
+# Response shape for the LLM decision. Not strict: MongoDB filters, updates and
+# function parameters are free-form objects that strict schemas cannot describe.
+CHAT_RESPONSE_SCHEMA = {
+    "name": "admin_decision",
+    "strict": False,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "function": {"type": ["string", "null"]},
+            "parameters": {"type": "object"},
+            "query_type": {"type": ["string", "null"]},
+            "collection": {"type": ["string", "null"]},
+            "operation": {"type": ["string", "null"]},
+            "query": {"type": ["object", "array", "null"]},
+            "update": {"type": ["object", "null"]},
+            "projection": {"type": ["object", "null"]},
+            "sort": {"type": ["object", "null"]},
+            "limit": {"type": ["integer", "null"]},
+            "response": {"type": "string"},
+            "data": {}
+        },
+        "required": ["response"],
+        "additionalProperties": False
+    }
+}
+
+
 # ============================================================================
 # PRE-DEFINED OPTIMIZED FUNCTIONS
 # ============================================================================
 
+# Short-lived caches for read-heavy functions; cleared whenever a dynamic update runs
+_VENDOR_DETAILS_CACHE = TTLCache(maxsize=256, ttl=30)
+_STATS_CACHE = TTLCache(maxsize=256, ttl=30)
+
+
+def invalidate_vendor_caches():
+    """Drop cached vendor details/statistics after vendor data changes"""
+    _VENDOR_DETAILS_CACHE.clear()
+    _STATS_CACHE.clear()
+
+
 class VendorQueryFunctions:
     """Pre-defined optimized functions for common queries"""
     
@@ -625,7 +680,7 @@ class VendorQueryFunctions:
                     query["created_at"] = date_query
         
         # Debug: Print query for troubleshooting
-        print(f"🔍 MongoDB Query: {json.dumps(query, indent=2, default=str)}")
+        print(f"🔍 MongoDB Query: {orjson.dumps(query, default=str, option=orjson.OPT_INDENT_2).decode()}")
         
         # Execute query with projection
         sort_direction = -1 if sort_by == "created_at" else 1
@@ -660,6 +715,10 @@ class VendorQueryFunctions:
     @staticmethod
     def get_vendor_details(identifier: str) -> Dict[str, Any]:
         """Get complete vendor details by ID, email, or company"""
+        cached = _VENDOR_DETAILS_CACHE.get(identifier)
+        if cached is not None:
+            return cached
+        
         query = {
             "$or": [
                 {"vendor_id": identifier},
@@ -687,6 +746,7 @@ class VendorQueryFunctions:
                 ]
             }
         
+        _VENDOR_DETAILS_CACHE[identifier] = vendors[0]
         return vendors[0]
     
     @staticmethod
@@ -758,7 +818,7 @@ class VendorQueryFunctions:
         query = {"$or": query_conditions} if query_conditions else {}
         
         # Debug logging
-        print(f"🔍 Search query: {json.dumps(query, indent=2)}")
+        print(f"🔍 Search query: {orjson.dumps(query, option=orjson.OPT_INDENT_2).decode()}")
         
         vendors = list(db.vendors.find(
             query,
@@ -778,6 +838,11 @@ class VendorQueryFunctions:
     @staticmethod
     def vendor_statistics(date_range: Dict = None) -> Dict[str, Any]:
         """Get dashboard-level vendor statistics"""
+        cache_key = orjson.dumps(date_range, default=str, option=orjson.OPT_SORT_KEYS)
+        cached = _STATS_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+        
         match_stage = {}
         
         if date_range:
@@ -826,12 +891,15 @@ class VendorQueryFunctions:
         
         result = list(db.vendors.aggregate(pipeline))[0]
         
-        return {
+        statistics = {
             "total_vendors": result["total"][0]["count"] if result["total"] else 0,
             "by_status": {item["_id"]: item["count"] for item in result["by_status"]},
             "by_document_type": {item["_id"]: item["count"] for item in result["by_document_type"]},
             "avg_processing_time_seconds": (result["avg_processing_time"][0]["avg_ms"] / 1000) if result["avg_processing_time"] else 0
         }
+        
+        _STATS_CACHE[cache_key] = statistics
+        return statistics
     
     @staticmethod
     def extraction_quality_report(confidence_threshold: float = 0.8) -> Dict[str, Any]:
@@ -978,21 +1046,21 @@ class VendorQueryFunctions:
         }
     
     @staticmethod
-    def send_vendor_credentials(recipient_email: str, username: str, password: str) -> Dict[str, Any]:
+    async def send_vendor_credentials(recipient_email: str, username: str, password: str) -> Dict[str, Any]:
         """
         Send vendor portal login credentials via email using Nylas API
         
+        Delivery goes through the pooled, rate-limited Nylas client, and its outcome
+        is recorded on the sent_emails log entry before this returns.
+        
         Args:
             recipient_email: Vendor's email address
             username: Portal login username
             password: Portal login password
             
         Returns:
-            Dict with send status, log details, and confirmation message
+            Dict with delivery status, log ID, and confirmation message
         """
-        import re
-        from services.nylas_service import NylasService
-        
         # ============================================================================
         # VALIDATION
         # ============================================================================
@@ -1023,72 +1091,89 @@ class VendorQueryFunctions:
                 "message": "❌ Password too short\n\nPassword must be at least 8 characters long for security."
             }
         
-        # 4. Username uniqueness check
+        # 4-5. Username uniqueness + rate limit lookups (single round-trip via $facet)
+        now = datetime.now()
+        one_day_ago = now - timedelta(days=1)
+        one_hour_ago = now - timedelta(hours=1)
+        
         try:
-            # Check if username already exists in sent_emails collection
-            existing_username = db.sent_emails.find_one(
-                {"username_sent": username},
-                {"recipient_email": 1, "sent_at": 1, "_id": 0}
-            )
-            
-            if existing_username:
-                sent_to = existing_username.get("recipient_email", "unknown")
-                sent_date = existing_username.get("sent_at", datetime.now())
-                sent_date_str = sent_date.strftime("%Y-%m-%d %H:%M:%S") if isinstance(sent_date, datetime) else str(sent_date)
-                
-                return {
-                    "success": False,
-                    "error": "Username already exists",
-                    "message": f"❌ Username already exists\n\nThe username '{username}' has already been assigned to another vendor.\n\n📋 Existing Assignment:\n• Username: {username}\n• Email: {sent_to}\n• Assigned on: {sent_date_str}\n\n💡 Please choose a different username.\n\nSuggestions:\n• {username}1\n• {username}_2\n• {username}_vendor\n• {recipient_email.split('@')[0]}_vendor"
+            pipeline = [
+                {
+                    "$match": {
+                        "$or": [{"username_sent": username}, {"sent_at": {"$gte": one_day_ago}}],
+                        "status": {"$ne": "failed"}
+                    }
+                },
+                {
+                    "$facet": {
+                        "existing_username": [
+                            {"$match": {"username_sent": username}},
+                            {"$limit": 1},
+                            {"$project": {"recipient_email": 1, "sent_at": 1, "_id": 0}}
+                        ],
+                        "recipient_count": [
+                            {"$match": {"recipient_email": recipient_email, "sent_at": {"$gte": one_day_ago}}},
+                            {"$count": "count"}
+                        ],
+                        "admin_count": [
+                            {"$match": {"sent_at": {"$gte": one_hour_ago}}},
+                            {"$count": "count"}
+                        ]
+                    }
                 }
+            ]
+            checks = list(db.sent_emails.aggregate(pipeline))[0]
         
         except Exception as e:
-            logging.warning(f"Username uniqueness check failed: {e}")
-            # Continue anyway - this is a non-critical check
+            logging.warning(f"Username uniqueness / rate limit check failed: {e}")
+            # Continue anyway - these are non-critical checks
+            checks = {}
         
-        # 5. Rate limiting check
-        try:
-            # Check per-recipient rate limit (max 3 per day)
-            one_day_ago = datetime.now() - timedelta(days=1)
-            recipient_count = db.sent_emails.count_documents({
-                "recipient_email": recipient_email,
-                "sent_at": {"$gte": one_day_ago}
-            })
-            
-            if recipient_count >= 3:
-                return {
-                    "success": False,
-                    "error": "Recipient rate limit exceeded",
-                    "message": f"⚠️ Rate limit reached\n\nThis recipient ({recipient_email}) has already received {recipient_count} credential emails today.\n\nLimit: 3 emails per recipient per day\nReset time: Tomorrow at midnight\n\nPlease wait before sending more emails to this recipient."
-                }
-            
-            # Check per-admin rate limit (max 50 per hour) - using a simple timestamp check
-            one_hour_ago = datetime.now() - timedelta(hours=1)
-            admin_count = db.sent_emails.count_documents({
-                "sent_at": {"$gte": one_hour_ago}
-            })
+        # 4. Username uniqueness check
+        existing_username = checks["existing_username"][0] if checks.get("existing_username") else None
+        
+        if existing_username:
+            sent_to = existing_username.get("recipient_email", "unknown")
+            sent_date = existing_username.get("sent_at", now)
+            sent_date_str = sent_date.strftime("%Y-%m-%d %H:%M:%S") if isinstance(sent_date, datetime) else str(sent_date)
             
-            if admin_count >= 50:
-                return {
-                    "success": False,
-                    "error": "Admin rate limit exceeded",
-                    "message": f"⚠️ Rate limit reached\n\nYou've sent {admin_count} credential emails in the last hour.\n\nLimit: 50 emails per hour\nReset time: {(one_hour_ago + timedelta(hours=1)).strftime('%I:%M %p')}\n\nNeed to send urgently? Contact system administrator."
-                }
+            return {
+                "success": False,
+                "error": "Username already exists",
+                "message": f"❌ Username already exists\n\nThe username '{username}' has already been assigned to another vendor.\n\n📋 Existing Assignment:\n• Username: {username}\n• Email: {sent_to}\n• Assigned on: {sent_date_str}\n\n💡 Please choose a different username.\n\nSuggestions:\n• {username}1\n• {username}_2\n• {username}_vendor\n• {recipient_email.split('@')[0]}_vendor"
+            }
         
-        except Exception as e:
-            logging.warning(f"Rate limit check failed: {e}")
-            # Continue anyway if rate limit check fails
+        # 5. Rate limiting check
+        # Check per-recipient rate limit (max 3 per day)
+        recipient_count = checks["recipient_count"][0]["count"] if checks.get("recipient_count") else 0
+        
+        if recipient_count >= 3:
+            return {
+                "success": False,
+                "error": "Recipient rate limit exceeded",
+                "message": f"⚠️ Rate limit reached\n\nThis recipient ({recipient_email}) has already received {recipient_count} credential emails today.\n\nLimit: 3 emails per recipient per day\nReset time: Tomorrow at midnight\n\nPlease wait before sending more emails to this recipient."
+            }
+        
+        # Check per-admin rate limit (max 50 per hour) - using a simple timestamp check
+        admin_count = checks["admin_count"][0]["count"] if checks.get("admin_count") else 0
+        
+        if admin_count >= 50:
+            return {
+                "success": False,
+                "error": "Admin rate limit exceeded",
+                "message": f"⚠️ Rate limit reached\n\nYou've sent {admin_count} credential emails in the last hour.\n\nLimit: 50 emails per hour\nReset time: {(one_hour_ago + timedelta(hours=1)).strftime('%I:%M %p')}\n\nNeed to send urgently? Contact system administrator."
+            }
         
         # ============================================================================
         # EMAIL GENERATION
         # ============================================================================
         
         # Get configuration from environment
-        company_name = os.getenv("COMPANY_NAME", "Vendor Portal")
-        portal_url = os.getenv("VENDOR_PORTAL_URL", "https://vendor-portal.company.com")
-        support_email = os.getenv("SUPPORT_EMAIL", "support@company.com")
-        support_phone = os.getenv("SUPPORT_PHONE", "+91-XXXXXXXXXX")
-        sender_email = os.getenv("ADMIN_SENDER_EMAIL", "admin@company.com")
+        company_name = COMPANY_NAME
+        portal_url = VENDOR_PORTAL_URL
+        support_email = SUPPORT_EMAIL
+        support_phone = SUPPORT_PHONE
+        sender_email = ADMIN_SENDER_EMAIL
         
         # Generate HTML email body
         email_body_html = f"""
@@ -1293,59 +1378,28 @@ This is an automated message. Please do not reply to this email.
         # SEND EMAIL VIA NYLAS
         # ============================================================================
         
-        try:
-            nylas = NylasService()
-            
-            # Prepare email data for Nylas v3 API
-            email_data = {
-                "subject": f"Your {company_name} Vendor Portal Login Credentials",
-                "to": [{"email": recipient_email}],
-                "from": [{"email": sender_email}],
-                "reply_to": [{"email": support_email}],
-                "body": email_body_html
-            }
-            
-            # Send email using Nylas
-            url = f"{nylas.base_url}/v3/grants/{nylas.grant_id}/messages/send"
-            response = requests.post(
-                url,
-                headers=nylas.headers,
-                json=email_data,
-                timeout=30
-            )
-            
-            if response.status_code not in [200, 201, 202]:
-                error_msg = response.text
-                logging.error(f"Nylas API error: {response.status_code} - {error_msg}")
-                return {
-                    "success": False,
-                    "error": f"Nylas API returned error: {response.status_code}",
-                    "message": f"❌ Failed to send credential email\n\nError: Nylas API returned error: {response.status_code}\n\nPlease verify:\n- Email address is correct: {recipient_email}\n- Email service is operational\n\nWould you like to retry with a corrected email?"
-                }
-            
-            response_data = response.json()
-            nylas_message_id = response_data.get("data", {}).get("id", "unknown")
-            
-        except requests.exceptions.Timeout:
-            return {
-                "success": False,
-                "error": "Request timeout",
-                "message": "❌ Failed to send credential email\n\nError: Request timeout while sending email\n\nThe email service took too long to respond. Please try again in a moment."
-            }
-        except Exception as e:
-            logging.error(f"Error sending email: {str(e)}")
+        if not all([NYLAS_API_KEY, NYLAS_GRANT_ID]):
+            error = "Missing Nylas configuration. Check NYLAS_API_KEY and NYLAS_GRANT_ID"
+            logging.error(f"Error sending email: {error}")
             return {
                 "success": False,
-                "error": str(e),
-                "message": f"❌ Failed to send credential email\n\nError: {str(e)}\n\nPlease check the email configuration and try again."
+                "error": error,
+                "message": f"❌ Failed to send credential email\n\nError: {error}\n\nPlease check the email configuration and try again."
             }
         
-        # ============================================================================
-        # LOG EMAIL SEND
-        # ============================================================================
+        # Prepare email data for Nylas v3 API
+        email_data = {
+            "subject": f"Your {company_name} Vendor Portal Login Credentials",
+            "to": [{"email": recipient_email}],
+            "from": [{"email": sender_email}],
+            "reply_to": [{"email": support_email}],
+            "body": email_body_html
+        }
         
+        # The sent_emails log is written before delivery (counting towards the rate
+        # limits straight away) and updated with the outcome after
         timestamp = datetime.now()
-        log_id = f"EMAIL_LOG_{int(timestamp.timestamp())}"
+        log_id = f"EMAIL_LOG_{int(timestamp.timestamp())}_{uuid.uuid4().hex[:8]}"
         
         try:
             email_log = {
@@ -1356,8 +1410,8 @@ This is an automated message. Please do not reply to this email.
                 "password_sent": password,  # Store password for admin reference
                 "sent_by_admin": "admin_user",  # Could be enhanced with actual admin tracking
                 "sent_at": timestamp,
-                "nylas_message_id": nylas_message_id,
-                "status": "sent",
+                "nylas_message_id": None,
+                "status": "sending",
                 "error_message": None
             }
             
@@ -1365,7 +1419,18 @@ This is an automated message. Please do not reply to this email.
             
         except Exception as e:
             logging.warning(f"Failed to log email send: {e}")
-            # Continue anyway - email was sent successfully
+            # Continue anyway - delivery does not depend on the log
+        
+        delivery = await _deliver_credential_email(log_id, email_data)
+        
+        if delivery["status"] == "failed":
+            return {
+                "success": False,
+                "error": delivery["error_message"],
+                "log_id": log_id,
+                "message": f"❌ Failed to send credential email\n\nError: {delivery['error_message']}\n\nPlease verify:\n- Email address is correct: {recipient_email}\n- Email service is operational\n\nWould you like to retry?"
+            }
+        nylas_message_id = delivery["nylas_message_id"]
         
         # ============================================================================
         # SUCCESS RESPONSE
@@ -1402,15 +1467,68 @@ Would you like to send credentials to another vendor?"""
         
         return {
             "success": True,
+            "status": "sent",
             "recipient_email": recipient_email,
             "username": username,
             "sent_at": timestamp.isoformat(),
             "log_id": log_id,
-            "nylas_message_id": nylas_message_id,
             "message": success_message
         }
 
 
+# ============================================================================
+# CREDENTIAL EMAIL DELIVERY
+# ============================================================================
+
+# Credential emails share one pooled HTTP client, throttled to stay inside the
+# Nylas send quota
+EMAIL_MAX_CONNECTIONS = 4
+
+_email_rate_limiter = AsyncLimiter(max_rate=200, time_period=1)
+_nylas_http = httpx.AsyncClient(
+    base_url=NYLAS_BASE_URL,
+    headers={
+        "Accept": "application/json",
+        "Authorization": f"Bearer {NYLAS_API_KEY}",
+        "Content-Type": "application/json"
+    },
+    timeout=30,
+    limits=httpx.Limits(max_connections=EMAIL_MAX_CONNECTIONS, max_keepalive_connections=EMAIL_MAX_CONNECTIONS)
+)
+
+
+async def _deliver_credential_email(log_id: str, email_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Send one credential email, record the outcome on its log entry, and return it"""
+    try:
+        async with _email_rate_limiter:
+            response = await _nylas_http.post(f"/v3/grants/{NYLAS_GRANT_ID}/messages/send", json=email_data)
+        
+        if response.status_code not in [200, 201, 202]:
+            logging.error(f"Nylas API error: {response.status_code} - {response.text}")
+            result = {"status": "failed", "error_message": f"Nylas API returned error: {response.status_code}"}
+        else:
+            nylas_message_id = response.json().get("data", {}).get("id", "unknown")
+            result = {"status": "sent", "nylas_message_id": nylas_message_id, "delivered_at": datetime.now()}
+    
+    except httpx.TimeoutException:
+        result = {"status": "failed", "error_message": "Request timeout while sending email"}
+    except Exception as e:
+        logging.error(f"Error sending email: {str(e)}")
+        result = {"status": "failed", "error_message": str(e)}
+    
+    try:
+        db.sent_emails.update_one({"email_log_id": log_id}, {"$set": result})
+    except Exception as e:
+        logging.warning(f"Failed to update email log {log_id}: {e}")
+    
+    return result
+
+
+async def close_email_http():
+    """Close the pooled Nylas client used for credential emails (call on app shutdown)"""
+    await _nylas_http.aclose()
+
+
 # ============================================================================
 # QUERY VALIDATOR
 # ============================================================================
@@ -1425,7 +1543,7 @@ class QueryValidator:
         "$expr", "$jsonSchema"  # Can be exploited
     ]
     
-    UPDATABLE_FIELDS = [
+    UPDATABLE_FIELDS = frozenset({
         "basic_info.mobile",
         "basic_info.mobile_cleaned",
         "basic_info.address",
@@ -1435,7 +1553,33 @@ class QueryValidator:
         "basic_info.company",
         "basic_info.email",
         "status"
-    ]
+    })
+    
+    @staticmethod
+    def _shape(obj: Any) -> Any:
+        """Structural fingerprint of a query: keys are kept, leaf values become their type name"""
+        if isinstance(obj, dict):
+            return ("dict", tuple((key, QueryValidator._shape(value)) for key, value in obj.items()))
+        if isinstance(obj, list):
+            return ("list", tuple(QueryValidator._shape(value) for value in obj))
+        return type(obj).__name__
+    
+    @staticmethod
+    def _find_forbidden_key(shape: Any) -> Optional[str]:
+        """Recursively walk the keys of a query shape and return the first forbidden operator found"""
+        if not isinstance(shape, tuple):
+            return None
+        
+        kind, children = shape
+        for child in children:
+            if kind == "dict":
+                key, child = child
+                if key in _FORBIDDEN_OPERATORS:
+                    return key
+            found = QueryValidator._find_forbidden_key(child)
+            if found:
+                return found
+        return None
     
     @staticmethod
     def validate_query(query_request: Dict[str, Any]) -> tuple[bool, Optional[str]]:
@@ -1451,40 +1595,62 @@ class QueryValidator:
         if operation not in ["find", "aggregate", "update", "count"]:
             return False, f"Operation '{operation}' not allowed"
         
-        # Check for forbidden operators
-        query_str = json.dumps(query_request.get("query", {}))
-        for forbidden in QueryValidator.FORBIDDEN_OPERATORS:
-            if forbidden in query_str:
+        # Check operators and update fields (cached per query shape, since the LLM
+        # tends to repeat the same query with different literal values)
+        is_valid, error_message = QueryValidator._validate_shape(
+            operation == "update",
+            QueryValidator._shape(query_request.get("query", {})),
+            QueryValidator._shape(query_request.get("update", {}))
+        )
+        if not is_valid:
+            return False, error_message
+        
+        # Check limit (the response schema allows null; treated as the default)
+        limit = query_request.get("limit") or 100
+        if limit > 1000:
+            return False, "Limit cannot exceed 1000 documents"
+        
+        return True, None
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def _validate_shape(is_update: bool, query_shape: Any, update_shape: Any) -> tuple[bool, Optional[str]]:
+        """Validate the structural part of a query; results are memoized on the shape"""
+        
+        # Check for forbidden operators (matched against keys, not substrings of values)
+        for shape in (query_shape, update_shape):
+            forbidden = QueryValidator._find_forbidden_key(shape)
+            if forbidden:
                 return False, f"Forbidden operator '{forbidden}' detected"
         
         # Validate update operations
-        if operation == "update":
-            update_doc = query_request.get("update", {})
-            update_fields = QueryValidator._extract_update_fields(update_doc)
+        if is_update:
+            update_fields = QueryValidator._extract_update_fields(update_shape)
             
             for field in update_fields:
                 if field not in QueryValidator.UPDATABLE_FIELDS:
                     return False, f"Field '{field}' is not updatable"
         
-        # Check limit
-        limit = query_request.get("limit", 100)
-        if limit > 1000:
-            return False, "Limit cannot exceed 1000 documents"
-        
         return True, None
     
     @staticmethod
-    def _extract_update_fields(update_doc: Dict) -> List[str]:
-        """Extract field names from update document"""
+    def _extract_update_fields(update_shape: Any) -> List[str]:
+        """Extract field names from the shape of an update document"""
         fields = []
         
-        for operator, values in update_doc.items():
-            if operator in ["$set", "$unset", "$inc"]:
-                fields.extend(values.keys())
+        if not isinstance(update_shape, tuple) or update_shape[0] != "dict":
+            return fields
+        
+        for operator, values in update_shape[1]:
+            if operator in ["$set", "$unset", "$inc"] and isinstance(values, tuple) and values[0] == "dict":
+                fields.extend(field for field, _ in values[1])
         
         return fields
 
 
+_FORBIDDEN_OPERATORS = frozenset(QueryValidator.FORBIDDEN_OPERATORS)
+
+
 # ============================================================================
 # QUERY EXECUTOR
 # ============================================================================
@@ -1505,7 +1671,7 @@ class QueryExecutor:
                 query = query_request.get("query", {})
                 projection = query_request.get("projection", {"_id": 0})
                 sort = query_request.get("sort", {})
-                limit = query_request.get("limit", 100)
+                limit = query_request.get("limit") or 100
                 
                 cursor = collection.find(query, projection)
                 
@@ -1546,6 +1712,7 @@ class QueryExecutor:
                 update = query_request.get("update", {})
                 
                 result = collection.update_many(query, update)
+                invalidate_vendor_caches()
                 
                 return {
                     "success": True,
@@ -1560,6 +1727,53 @@ class QueryExecutor:
             }
 
 
+# ============================================================================
+# CONVERSATION HISTORY
+# ============================================================================
+
+# Token budget for the conversation history sent alongside SYSTEM_PROMPT
+HISTORY_TOKEN_BUDGET = 4000
+MAX_MESSAGE_TOKENS = 2000
+
+@functools.lru_cache(maxsize=None)
+def get_token_encoding() -> tiktoken.Encoding:
+    """gpt-4o tokenizer, loaded on first use (tiktoken may download its BPE file)"""
+    return tiktoken.encoding_for_model("gpt-4o")
+
+
+def trim_conversation_history(history: List[ChatMessage]) -> List[Dict[str, str]]:
+    """Keep the most recent history messages (max 5) that fit in HISTORY_TOKEN_BUDGET
+    
+    Consecutive duplicates are dropped and oversized messages are cut down to
+    their head and tail.
+    """
+    token_encoding = get_token_encoding()
+    messages = []
+    used_tokens = 0
+    previous = None
+    
+    for msg in reversed(history[-5:]):
+        if (msg.role, msg.content) == previous:
+            continue
+        previous = (msg.role, msg.content)
+        
+        tokens = token_encoding.encode(msg.content)
+        content = msg.content
+        if len(tokens) > MAX_MESSAGE_TOKENS:
+            half = MAX_MESSAGE_TOKENS // 2
+            content = f"{token_encoding.decode(tokens[:half])}\n...\n{token_encoding.decode(tokens[-half:])}"
+            tokens = tokens[:MAX_MESSAGE_TOKENS]
+        
+        if used_tokens + len(tokens) > HISTORY_TOKEN_BUDGET:
+            break
+        
+        used_tokens += len(tokens)
+        messages.append({"role": msg.role, "content": content})
+    
+    messages.reverse()
+    return messages
+
+
 # ============================================================================
 # MAIN CHATBOT ENDPOINT
 # ============================================================================
@@ -1569,18 +1783,14 @@ async def chat_with_admin(request: ChatRequest):
     """
     Main chatbot endpoint - Intelligent routing to functions or dynamic queries
     """
-    start_time = datetime.now()
+    start_ns = time.monotonic_ns()
     
     try:
         # Build conversation messages
         messages = [{"role": "system", "content": SYSTEM_PROMPT}]
         
-        # Add conversation history
-        for msg in request.conversation_history[-5:]:  # Last 5 messages for context
-            messages.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        # Add conversation history (last 5 messages, trimmed to the token budget)
+        messages.extend(trim_conversation_history(request.conversation_history))
         
         # Add current user message
         messages.append({
@@ -1593,14 +1803,14 @@ async def chat_with_admin(request: ChatRequest):
             model="gpt-4o",  # or gpt-4-turbo
             messages=messages,
             temperature=0.3,  # Low temperature for accuracy
-            response_format={"type": "json_object"}  # Force JSON response
+            response_format={"type": "json_schema", "json_schema": CHAT_RESPONSE_SCHEMA}
         )
         
         llm_response = response.choices[0].message.content
-        llm_data = json.loads(llm_response)
+        llm_data = orjson.loads(llm_response)
         
         # Debug: Log LLM decision
-        print(f"🤖 LLM Decision: {json.dumps(llm_data, indent=2)}")
+        print(f"🤖 LLM Decision: {orjson.dumps(llm_data, option=orjson.OPT_INDENT_2).decode()}")
         
         # Route based on LLM decision
         if llm_data.get("function"):
@@ -1621,7 +1831,7 @@ async def chat_with_admin(request: ChatRequest):
             }
             query_type = "text_response"
         
-        execution_time = int((datetime.now() - start_time).total_seconds() * 1000)
+        execution_time = (time.monotonic_ns() - start_ns) // 1_000_000
         
         return ChatResponse(
             response=result.get("response", ""),
@@ -1642,73 +1852,24 @@ async def execute_function(llm_data: Dict[str, Any]) -> Dict[str, Any]:
     """Execute pre-defined function based on LLM decision"""
     
     function_name = llm_data["function"]
-    parameters = llm_data.get("parameters", {})
+    parameters = llm_data.get("parameters") or {}
     
-    functions = VendorQueryFunctions()
+    function, formatter = FUNCTION_DISPATCH.get(function_name, (None, None))
+    if function is None:
+        return {
+            "response": f"Function '{function_name}' not implemented",
+            "data": None
+        }
     
     try:
-        if function_name == "list_vendors":
-            # Handle empty or missing parameters gracefully
-            if not parameters or parameters == {}:
-                parameters = {"limit": 50}  # Default to showing 50 vendors
-            data = functions.list_vendors(**parameters)
-            response = format_list_vendors_response(data)
-        
-        elif function_name == "get_vendor_details":
-            data = functions.get_vendor_details(**parameters)
-            response = format_vendor_details_response(data)
-        
-        elif function_name == "count_vendors":
-            data = functions.count_vendors(**parameters)
-            response = format_count_response(data)
-        
-        elif function_name == "search_vendors_fuzzy":
-            # Ensure parameters are correctly formatted
-            search_text = parameters.get("search_text", "")
-            fields = parameters.get("fields", ["name", "company", "email"])
-            limit = parameters.get("limit", 20)
-            
-            # Validate fields is a list
-            if isinstance(fields, str):
-                fields = [fields]
-            
-            data = functions.search_vendors_fuzzy(search_text, fields, limit)
-            response = format_search_results(data)
-        
-        elif function_name == "vendor_statistics":
-            data = functions.vendor_statistics(**parameters)
-            response = format_statistics_response(data)
-        
-        elif function_name == "extraction_quality_report":
-            data = functions.extraction_quality_report(**parameters)
-            response = format_quality_report(data)
-        
-        elif function_name == "vendor_processing_timeline":
-            data = functions.vendor_processing_timeline(**parameters)
-            response = format_timeline_response(data)
-        
-        elif function_name == "batch_processing_health":
-            data = functions.batch_processing_health(**parameters)
-            response = format_health_report(data)
-        
-        elif function_name == "send_vendor_credentials":
-            # Handle credential email sending
-            recipient_email = parameters.get("recipient_email", "")
-            username = parameters.get("username", "")
-            password = parameters.get("password", "")
-            
-            # Call the function
-            result = functions.send_vendor_credentials(recipient_email, username, password)
-            
-            # Return the formatted message from the function
-            response = result.get("message", "Email processing completed")
-            data = result if result.get("success") else {"error": result.get("error")}
+        data = function(**parameters)
+        if inspect.isawaitable(data):
+            data = await data
+        response = formatter(data)
         
-        else:
-            return {
-                "response": f"Function '{function_name}' not implemented",
-                "data": None
-            }
+        # Credential sends carry their own message; only surface the error as data
+        if function_name == "send_vendor_credentials" and not data.get("success"):
+            data = {"error": data.get("error")}
         
         return {
             "response": response,
@@ -1727,6 +1888,20 @@ async def execute_function(llm_data: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
+def _search_vendors_fuzzy(search_text: str = "", fields: Any = None, limit: int = 20, **_) -> List[Dict[str, Any]]:
+    """Normalize LLM parameters for search_vendors_fuzzy"""
+    # Validate fields is a list
+    if isinstance(fields, str):
+        fields = [fields]
+    
+    return VendorQueryFunctions.search_vendors_fuzzy(search_text, fields, limit)
+
+
+async def _send_vendor_credentials(recipient_email: str = "", username: str = "", password: str = "", **_) -> Dict[str, Any]:
+    """Normalize LLM parameters for send_vendor_credentials"""
+    return await VendorQueryFunctions.send_vendor_credentials(recipient_email, username, password)
+
+
 async def execute_dynamic_query_safe(llm_data: Dict[str, Any]) -> Dict[str, Any]:
     """Execute dynamically generated query with validation"""
     
@@ -1761,6 +1936,9 @@ async def execute_dynamic_query_safe(llm_data: Dict[str, Any]) -> Dict[str, Any]
 # RESPONSE FORMATTERS
 # ============================================================================
 
+_STATUS_ICON = {"completed": "✅", "needs_review": "⚠️"}
+_CONFIDENCE_ICON = [(0.9, "✅"), (0.8, "⚠️")]
+
 def format_list_vendors_response(data: Dict) -> str:
     """Format list vendors response"""
     vendors = data["vendors"]
@@ -1773,28 +1951,27 @@ def format_list_vendors_response(data: Dict) -> str:
     
     # Conversational opening
     if total == 1:
-        response = f"Perfect! I found exactly 1 vendor matching your search:\n\n"
+        parts = [f"Perfect! I found exactly 1 vendor matching your search:\n\n"]
     elif total <= 5:
-        response = f"Great! I found {total} {vendor_word} for you:\n\n"
+        parts = [f"Great! I found {total} {vendor_word} for you:\n\n"]
     elif total <= 20:
-        response = f"I discovered {total} {vendor_word} matching your criteria. Here they are:\n\n"
+        parts = [f"I discovered {total} {vendor_word} matching your criteria. Here they are:\n\n"]
     else:
-        response = f"Wow! I found {total} {vendor_word} matching your search. Here are the first 20:\n\n"
+        parts = [f"Wow! I found {total} {vendor_word} matching your search. Here are the first 20:\n\n"]
     
     for i, vendor in enumerate(vendors[:20], 1):
         try:
             # Safely extract fields with defaults
-            basic_info = vendor.get('basic_info', {})
-            name = basic_info.get('name', 'Unknown')
-            company = basic_info.get('company', 'Unknown')
-            email = basic_info.get('email', 'N/A')
-            age = basic_info.get('age', 'N/A')
+            basic_info = vendor.get('basic_info') or {}
+            get = basic_info.get
             status = vendor.get('status', 'unknown')
             
-            status_icon = "✅" if status == "completed" else "⚠️" if status == "needs_review" else "🔄"
+            status_icon = _STATUS_ICON.get(status, "🔄")
             
-            response += f"{i}. {status_icon} **{name}** - {company}\n"
-            response += f"   Email: {email} | Age: {age} | Status: {status}\n\n"
+            parts.append(
+                f"{i}. {status_icon} **{get('name', 'Unknown')}** - {get('company', 'Unknown')}\n"
+                f"   Email: {get('email', 'N/A')} | Age: {get('age', 'N/A')} | Status: {status}\n\n"
+            )
         except Exception as e:
             # Skip vendors with corrupt data
             print(f"⚠️ Error formatting vendor {i}: {str(e)}")
@@ -1802,11 +1979,11 @@ def format_list_vendors_response(data: Dict) -> str:
     
     # Add helpful closing
     if total > 20:
-        response += f"_Showing 20 out of {total} results. Would you like me to show more or apply additional filters?_"
+        parts.append(f"_Showing 20 out of {total} results. Would you like me to show more or apply additional filters?_")
     elif total > 1:
-        response += "\n💡 Need more details about any vendor? Just ask!"
+        parts.append("\n💡 Need more details about any vendor? Just ask!")
     
-    return response
+    return "".join(parts)
 
 
 def format_vendor_details_response(data: Dict) -> str:
@@ -1824,39 +2001,35 @@ def format_vendor_details_response(data: Dict) -> str:
         return f"❌ {data['error']}"
     
     # Safe access for all vendor fields
-    basic_info = data.get('basic_info', {})
-    name = basic_info.get('name', 'Unknown')
-    age = basic_info.get('age', 'N/A')
-    gender = basic_info.get('gender', 'N/A')
-    email = basic_info.get('email', 'N/A')
-    mobile = basic_info.get('mobile', 'N/A')
-    company = basic_info.get('company', 'Unknown')
-    address = basic_info.get('address', 'N/A')
-    vendor_id = data.get('vendor_id', 'N/A')
-    status = data.get('status', 'Unknown')
-    
-    response = f"# Vendor Details: {name}\n\n"
-    response += f"**Vendor ID:** {vendor_id}\n"
-    response += f"**Status:** {status}\n\n"
-    
-    response += "## Basic Information\n"
-    response += f"- Name: {name}\n"
-    response += f"- Age: {age}\n"
-    response += f"- Gender: {gender}\n"
-    response += f"- Email: {email}\n"
-    response += f"- Mobile: {mobile}\n"
-    response += f"- Company: {company}\n"
-    response += f"- Address: {address}\n\n"
-    
-    if data.get("extracted_data"):
-        response += "## Extracted Documents\n"
+    basic_info = data.get('basic_info') or {}
+    get = basic_info.get
+    name = get('name', 'Unknown')
+    
+    parts = [
+        f"# Vendor Details: {name}\n\n"
+        f"**Vendor ID:** {data.get('vendor_id', 'N/A')}\n"
+        f"**Status:** {data.get('status', 'Unknown')}\n\n"
+        "## Basic Information\n"
+        f"- Name: {name}\n"
+        f"- Age: {get('age', 'N/A')}\n"
+        f"- Gender: {get('gender', 'N/A')}\n"
+        f"- Email: {get('email', 'N/A')}\n"
+        f"- Mobile: {get('mobile', 'N/A')}\n"
+        f"- Company: {get('company', 'Unknown')}\n"
+        f"- Address: {get('address', 'N/A')}\n\n"
+    ]
+    
+    extracted_data = data.get("extracted_data")
+    if extracted_data:
+        parts.append("## Extracted Documents\n")
         for doc_type in ["aadhar", "pan", "gst"]:
-            if data["extracted_data"].get(doc_type):
-                confidence = data["extracted_data"][doc_type].get("confidence", 0)
-                icon = "✅" if confidence > 0.9 else "⚠️" if confidence > 0.8 else "❌"
-                response += f"- {icon} **{doc_type.upper()}**: Confidence {confidence:.2%}\n"
+            doc = extracted_data.get(doc_type)
+            if doc:
+                confidence = doc.get("confidence", 0)
+                icon = next((icon for threshold, icon in _CONFIDENCE_ICON if confidence > threshold), "❌")
+                parts.append(f"- {icon} **{doc_type.upper()}**: Confidence {confidence:.2%}\n")
     
-    return response
+    return "".join(parts)
 
 
 def format_count_response(data: Dict) -> str:
@@ -1880,21 +2053,20 @@ def format_search_results(data: List[Dict]) -> str:
     
     # Conversational opening based on result count
     if len(data) == 1:
-        response = f"Perfect! I found exactly 1 {vendor_word} matching your search:\n\n"
+        parts = [f"Perfect! I found exactly 1 {vendor_word} matching your search:\n\n"]
     else:
-        response = f"Great! I found {len(data)} {vendor_word} matching your search:\n\n"
+        parts = [f"Great! I found {len(data)} {vendor_word} matching your search:\n\n"]
     
     for i, vendor in enumerate(data, 1):
         try:
             # Safe access for vendor fields
-            basic_info = vendor.get('basic_info', {})
-            name = basic_info.get('name', 'Unknown')
-            company = basic_info.get('company', 'Unknown')
-            email = basic_info.get('email', 'N/A')
-            status = vendor.get('status', 'Unknown')
+            basic_info = vendor.get('basic_info') or {}
+            get = basic_info.get
             
-            response += f"{i}. **{name}** - {company}\n"
-            response += f"   Email: {email} | Status: {status}\n\n"
+            parts.append(
+                f"{i}. **{get('name', 'Unknown')}** - {get('company', 'Unknown')}\n"
+                f"   Email: {get('email', 'N/A')} | Status: {vendor.get('status', 'Unknown')}\n\n"
+            )
         except Exception as e:
             # Skip vendors with corrupt data
             logging.warning(f"Skipping vendor {i} due to error: {e}")
@@ -1902,11 +2074,11 @@ def format_search_results(data: List[Dict]) -> str:
     
     # Add helpful suggestion
     if len(data) == 1:
-        response += "💡 Want to see full details or update this vendor? Just let me know!"
+        parts.append("💡 Want to see full details or update this vendor? Just let me know!")
     else:
-        response += "💡 Need more details about any of these vendors? Just ask!"
+        parts.append("💡 Need more details about any of these vendors? Just ask!")
     
-    return response
+    return "".join(parts)
 
 
 def format_statistics_response(data: Dict) -> str:
@@ -2010,7 +2182,7 @@ def format_dynamic_query_response(result: Dict, query_request: Dict) -> str:
         # Show first few results
         response += "Here's what I discovered:\n"
         for i, item in enumerate(data[:10], 1):
-            response += f"{i}. {json.dumps(item, indent=2)}\n"
+            response += f"{i}. {orjson.dumps(item, default=str, option=orjson.OPT_INDENT_2).decode()}\n"
         
         if count > 10:
             response += f"\n_Showing 10 out of {count} results. Want to see more?_"
@@ -2020,6 +2192,24 @@ def format_dynamic_query_response(result: Dict, query_request: Dict) -> str:
     return response
 
 
+# ============================================================================
+# FUNCTION DISPATCH
+# ============================================================================
+
+# function name -> (callable, response formatter)
+FUNCTION_DISPATCH = {
+    "list_vendors": (VendorQueryFunctions.list_vendors, format_list_vendors_response),
+    "get_vendor_details": (VendorQueryFunctions.get_vendor_details, format_vendor_details_response),
+    "count_vendors": (VendorQueryFunctions.count_vendors, format_count_response),
+    "search_vendors_fuzzy": (_search_vendors_fuzzy, format_search_results),
+    "vendor_statistics": (VendorQueryFunctions.vendor_statistics, format_statistics_response),
+    "extraction_quality_report": (VendorQueryFunctions.extraction_quality_report, format_quality_report),
+    "vendor_processing_timeline": (VendorQueryFunctions.vendor_processing_timeline, format_timeline_response),
+    "batch_processing_health": (VendorQueryFunctions.batch_processing_health, format_health_report),
+    "send_vendor_credentials": (_send_vendor_credentials, lambda result: result.get("message", "Email processing completed")),
+}
+
+
 # ============================================================================
 # HEALTH CHECK
 # ============================================================================
@@ -2031,6 +2221,6 @@ async def chatbot_health():
         "status": "healthy",
         "service": "Admin Chatbot",
         "mongodb_connected": True,
-        "openai_configured": bool(os.getenv("OPENAI_API_KEY")),
+        "openai_configured": _OPENAI_CONFIGURED,
         "timestamp": datetime.now().isoformat()
     }
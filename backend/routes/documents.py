@@ -1,8 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Request, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from typing import Dict, Any
 import os
 import uuid
 import asyncio
+import aiofiles
+import logging
+from pathlib import Path
 from datetime import datetime
 
 from models import (
@@ -11,33 +15,66 @@ from models import (
     DocumentUploadResponse, ExtractedDataResponse, APIResponse
 )
 from database import db
-from services.ocr_service import OCRService
+from services.ocr_service import OCRService, get_ocr_service
 from utils.validators import verify_vendor_info_with_documents
 
-router = APIRouter(prefix="/api/v1/documents", tags=["Document Processing"])
-ocr_service = OCRService()
+router = APIRouter(prefix="/api/v1/documents", tags=["Document Processing"], default_response_class=ORJSONResponse)
+logger = logging.getLogger(__name__)
 
 # Create uploads directory
 UPLOAD_DIR = "uploads"
+UPLOAD_DIR_PATH = Path(UPLOAD_DIR)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10 MB
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES + 64 * 1024  # allowance for multipart framing
+
+# Supported extensions and the leading bytes their content must start with
+FILE_SIGNATURES = {
+    '.jpg': b"\xff\xd8\xff",
+    '.jpeg': b"\xff\xd8\xff",
+    '.png': b"\x89PNG",
+    '.pdf': b"%PDF"
+}
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# OCR method for each processable document type
+OCR_HANDLERS = {
+    DocumentType.AADHAAR: OCRService.process_aadhaar_card,
+    DocumentType.PAN: OCRService.process_pan_card,
+    DocumentType.GST: OCRService.process_gst_certificate
+}
+
+# Stages in which each document type may not be uploaded yet, with the reason shown
+BLOCKED_UPLOAD_STAGES = {
+    DocumentType.AADHAAR: (
+        frozenset({ChatStage.COLLECTING_BASIC_DETAILS}),
+        "Please complete basic information first before uploading documents"
+    ),
+    DocumentType.PAN: (
+        frozenset({ChatStage.WELCOME, ChatStage.COLLECTING_BASIC_DETAILS, ChatStage.AADHAAR_REQUEST}),
+        "Please upload Aadhaar card first"
+    ),
+    DocumentType.GST: (
+        frozenset({ChatStage.WELCOME, ChatStage.COLLECTING_BASIC_DETAILS, ChatStage.AADHAAR_REQUEST, ChatStage.PAN_REQUEST}),
+        "Please upload Aadhaar and PAN cards first"
+    )
+}
+
+# Chat stage a vendor draft moves to while its document is being processed
+PROCESSING_STAGES = {
+    DocumentType.AADHAAR: ChatStage.AADHAAR_PROCESSING,
+    DocumentType.PAN: ChatStage.PAN_PROCESSING,
+    DocumentType.GST: ChatStage.GST_PROCESSING
+}
+
 async def process_document_background(document_id: str, file_path: str, document_type: DocumentType, session_id: str):
     """Background task to process uploaded document"""
     try:
-        # Update status to processing
-        db.update_document(document_id, {
-            "parse_status": ParseStatus.PROCESSING
-        })
-        
         # Process based on document type
-        if document_type == DocumentType.AADHAAR:
-            parsed_data, confidence = await ocr_service.process_aadhaar_card(file_path)
-        elif document_type == DocumentType.PAN:
-            parsed_data, confidence = await ocr_service.process_pan_card(file_path)
-        elif document_type == DocumentType.GST:
-            parsed_data, confidence = await ocr_service.process_gst_certificate(file_path)
-        else:
+        handler = OCR_HANDLERS.get(document_type)
+        if handler is None:
             raise ValueError(f"Unsupported document type: {document_type}")
+        parsed_data, confidence = await handler(get_ocr_service(), file_path)
         
         # Update document with parsed data
         db.update_document(document_id, {
@@ -67,11 +104,10 @@ async def process_document_background(document_id: str, file_path: str, document
                 
                 # Automatically verify vendor info after all documents are processed
                 try:
-                    vendor_drafts_file = os.path.join("data", "vendor_drafts.json")
-                    is_verified = verify_vendor_info_with_documents(vendor_drafts_file, vendor_draft.id)
-                    print(f"Vendor verification completed for {vendor_draft.id}: {is_verified}")
-                except Exception as e:
-                    print(f"Error during automatic verification for {vendor_draft.id}: {e}")
+                    is_verified = await verify_vendor_info_with_documents(db, vendor_draft.id)
+                    logger.info("Vendor verification completed for %s: %s", vendor_draft.id, is_verified)
+                except Exception:
+                    logger.exception("Error during automatic verification for %s", vendor_draft.id)
                     # Continue with registration completion even if verification fails
             
             # Add document ID to the documents list
@@ -82,10 +118,10 @@ async def process_document_background(document_id: str, file_path: str, document
             
             db.update_vendor_draft(vendor_draft.id, updates)
         
-        print(f"Successfully processed document {document_id}")
+        logger.info("Successfully processed document %s", document_id)
         
     except Exception as e:
-        print(f"Error processing document {document_id}: {e}")
+        logger.exception("Error processing document %s", document_id)
         # Update status to failed
         db.update_document(document_id, {
             "parse_status": ParseStatus.FAILED,
@@ -95,6 +131,7 @@ async def process_document_background(document_id: str, file_path: str, document
 @router.post("/upload/{session_id}")
 async def upload_document(
     session_id: str, 
+    request: Request,
     background_tasks: BackgroundTasks,
     document_type: str,
     file: UploadFile = File(...)
@@ -114,8 +151,7 @@ async def upload_document(
         Document upload confirmation with processing status
     """
     
-    # Add debug logging
-    print(f"DEBUG: Upload request - session_id: {session_id}, document_type: {document_type}")
+    logger.debug("Upload request - session_id: %s, document_type: %s", session_id, document_type)
     
     # Validate document type
     # Support common aliases (e.g. 'aadhar' -> 'aadhaar', 'gstin' -> 'gst', 'catalog' -> 'catalogue')
@@ -137,72 +173,83 @@ async def upload_document(
 
     try:
         doc_type = DocumentType(mapped)
-        print(f"DEBUG: Valid document type: {doc_type} (mapped from '{document_type}')")
+        logger.debug("Valid document type: %s (mapped from '%s')", doc_type, document_type)
     except ValueError:
-        print(f"DEBUG: Invalid document type: {document_type}. Valid types: aadhaar, pan, gst, catalogue")
+        logger.debug("Invalid document type: %s", document_type)
         raise HTTPException(status_code=400, detail=f"Invalid document type '{document_type}'. Valid types: aadhaar, pan, gst, catalogue")
     
     # Validate file type
-    allowed_extensions = {'.jpg', '.jpeg', '.png', '.pdf'}
     file_extension = os.path.splitext(file.filename)[1].lower()
-    if file_extension not in allowed_extensions:
+    if file_extension not in FILE_SIGNATURES:
         raise HTTPException(status_code=400, detail="File type not supported. Please upload JPG, PNG, or PDF files.")
     
+    # Validate size and content before anything is written to disk
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    if file.size and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    
+    # Read the first chunk and look up the vendor draft concurrently
+    # (JSON file database calls run off the event loop)
+    first_chunk, vendor_draft = await asyncio.gather(
+        file.read(UPLOAD_CHUNK_SIZE),
+        asyncio.to_thread(db.get_vendor_draft_by_session, session_id)
+    )
+    if not first_chunk.startswith(FILE_SIGNATURES[file_extension]):
+        raise HTTPException(status_code=400, detail=f"File content does not match a {file_extension[1:].upper()} file.")
+    
     # Check if vendor draft exists
-    vendor_draft = db.get_vendor_draft_by_session(session_id)
     if not vendor_draft:
-        print(f"DEBUG: Session not found: {session_id}")
+        logger.debug("Session not found: %s", session_id)
         raise HTTPException(status_code=404, detail="Chat session not found")
     
-    print(f"DEBUG: Found session. Current stage: {vendor_draft.chat_stage}")
+    logger.debug("Found session. Current stage: %s", vendor_draft.chat_stage)
     
     # Check if document type is expected based on current stage
-    current_stage = vendor_draft.chat_stage
-    
-    # More flexible stage validation - allow document upload in appropriate stages
-    if doc_type == DocumentType.AADHAAR:
-        if current_stage not in [ChatStage.AADHAAR_REQUEST, ChatStage.AADHAAR_PROCESSING]:
-            # Allow Aadhaar upload if basic details are complete or we're already in later stages
-            if current_stage == ChatStage.COLLECTING_BASIC_DETAILS:
-                raise HTTPException(status_code=400, detail="Please complete basic information first before uploading documents")
-    elif doc_type == DocumentType.PAN:
-        if current_stage not in [ChatStage.PAN_REQUEST, ChatStage.PAN_PROCESSING]:
-            if current_stage in [ChatStage.WELCOME, ChatStage.COLLECTING_BASIC_DETAILS, ChatStage.AADHAAR_REQUEST]:
-                raise HTTPException(status_code=400, detail="Please upload Aadhaar card first")
-    elif doc_type == DocumentType.GST:
-        if current_stage not in [ChatStage.GST_REQUEST, ChatStage.GST_PROCESSING]:
-            if current_stage in [ChatStage.WELCOME, ChatStage.COLLECTING_BASIC_DETAILS, ChatStage.AADHAAR_REQUEST, ChatStage.PAN_REQUEST]:
-                raise HTTPException(status_code=400, detail="Please upload Aadhaar and PAN cards first")
+    # (more flexible stage validation - only stages before the prerequisites are rejected)
+    blocked = BLOCKED_UPLOAD_STAGES.get(doc_type)
+    if blocked and vendor_draft.chat_stage in blocked[0]:
+        raise HTTPException(status_code=400, detail=blocked[1])
     
     try:
         # Generate unique filename
-        file_id = str(uuid.uuid4())
-        filename = f"{file_id}_{file.filename}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
+        # (client-supplied name is reduced to its last component to block path traversal)
+        file_id = uuid.uuid4().hex
+        safe_name = Path(file.filename).name
+        file_path = str(UPLOAD_DIR_PATH / f"{file_id}_{safe_name}")
         
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Stream uploaded file to disk in chunks (bounded memory per upload),
+        # enforcing the size cap for bodies sent without a usable Content-Length
+        written = len(first_chunk)
+        async with aiofiles.open(file_path, "wb") as buffer:
+            await buffer.write(first_chunk)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > MAX_UPLOAD_BYTES:
+                    break
+                await buffer.write(chunk)
         
-        # Create document record
+        if written > MAX_UPLOAD_BYTES:
+            os.remove(file_path)
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+        
+        # Create document record already marked as processing, and move the
+        # vendor draft to its processing stage in the same write
         document = DocumentModel(
             session_id=session_id,
             document_type=doc_type,
             filename=file.filename,
             s3_key=file_path,  # Using local path for now
-            parse_status=ParseStatus.PENDING
+            parse_status=ParseStatus.PROCESSING
         )
         
-        document_id = db.create_document(document)
-        
-        # Update vendor draft stage to processing
-        if doc_type == DocumentType.AADHAAR:
-            db.update_vendor_draft(vendor_draft.id, {"chat_stage": ChatStage.AADHAAR_PROCESSING})
-        elif doc_type == DocumentType.PAN:
-            db.update_vendor_draft(vendor_draft.id, {"chat_stage": ChatStage.PAN_PROCESSING})
-        elif doc_type == DocumentType.GST:
-            db.update_vendor_draft(vendor_draft.id, {"chat_stage": ChatStage.GST_PROCESSING})
+        document_id = await asyncio.to_thread(
+            db.create_document_and_set_stage,
+            document,
+            vendor_draft.id,
+            PROCESSING_STAGES.get(doc_type)
+        )
         
         # Start background processing
         background_tasks.add_task(
@@ -220,6 +267,8 @@ async def upload_document(
             "filename": file.filename
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload document: {str(e)}")
 
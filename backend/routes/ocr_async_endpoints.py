@@ -2,20 +2,87 @@
 Async OCR Processing Endpoints with Callback Pattern
 Accepts requests immediately (202), processes in background, calls back when done
 """
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import httpx
 import os
-from typing import Optional, Dict, Any
+import asyncio
+import random
+import multiprocessing
+import orjson
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List
 
-from services.ocr_service import OCRService
-from services.ai_catalogue_service import AICatalogueService
+from services.ocr_service import run_ocr_sync
+from services.ai_catalogue_service import ai_catalogue_service, BATCH_POLL_INTERVAL
+from utils.http_client import shared_http
+from utils.redis_client import redis_client
 
 router = APIRouter(prefix="/api/ocr/async", tags=["OCR Async"])
 
-# Initialize services
-ocr_service = OCRService()
-ai_catalogue_service = AICatalogueService()
+# OCRService method for each document type accepted by the /process-* endpoints
+OCR_METHODS = {
+    "aadhar": "process_aadhaar_card",
+    "pan": "process_pan_card",
+    "gst": "process_gst_certificate"
+}
+
+# Bounded task queue drained by a fixed worker pool, so bursts of requests
+# queue up instead of all running OCR at once
+OCR_QUEUE_SIZE = 256
+OCR_WORKER_COUNT = int(os.getenv("OCR_WORKER_COUNT", max(1, (os.cpu_count() or 1) // 4)))
+
+task_queue: Optional[asyncio.Queue] = None
+ocr_workers: List[asyncio.Task] = []
+
+# OCR itself runs in worker processes so Tesseract/Pillow and the response
+# post-processing don't hold this process's GIL. Spawned (not forked) children
+# build their own OCRService on import, with OMP_THREAD_LIMIT=1 set there.
+ocr_executor: Optional[ProcessPoolExecutor] = None
+
+# Catalogue tasks waiting on an OpenAI Batch API job (up to 24h) are parked in Redis
+# by task ID instead of holding an OCR worker, so they also survive restarts; a poller
+# per process collects finished jobs and completes their tasks
+CATALOGUE_BATCH_JOBS_KEY = "catalogue:batch_jobs"
+batch_poller: Optional[asyncio.Task] = None
+
+
+async def ocr_worker():
+    while True:
+        task_fn, args = await task_queue.get()
+        try:
+            await task_fn(*args)
+        except Exception as e:
+            print(f"❌ OCR worker error: {str(e)}")
+        finally:
+            task_queue.task_done()
+
+
+@router.on_event("startup")
+async def start_ocr_workers():
+    global task_queue, ocr_executor, batch_poller
+    task_queue = asyncio.Queue(maxsize=OCR_QUEUE_SIZE)
+    ocr_executor = ProcessPoolExecutor(
+        max_workers=OCR_WORKER_COUNT,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+    ocr_workers.extend(asyncio.create_task(ocr_worker()) for _ in range(OCR_WORKER_COUNT))
+    batch_poller = asyncio.create_task(poll_catalogue_batches())
+
+
+@router.on_event("shutdown")
+async def stop_ocr_workers():
+    for worker in ocr_workers:
+        worker.cancel()
+    if batch_poller is not None:
+        batch_poller.cancel()
+    if ocr_executor is not None:
+        ocr_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def enqueue_task(task_fn, *args):
+    """Queue a background task; raises asyncio.QueueFull when the queue is at capacity"""
+    task_queue.put_nowait((task_fn, args))
 
 
 class AsyncDocumentRequest(BaseModel):
@@ -30,6 +97,7 @@ class AsyncCatalogueRequest(BaseModel):
     callback_url: str
     vendor_id: str
     vendor_info: Optional[Dict[str, Any]] = None  # Company name, etc.
+    use_batch_api: bool = False  # OpenAI Batch API: half price, results within 24h
 
 
 class TaskAcceptedResponse(BaseModel):
@@ -38,23 +106,51 @@ class TaskAcceptedResponse(BaseModel):
     message: str
 
 
-async def send_callback(callback_url: str, payload: dict, max_retries: int = 3):
+@dataclass(slots=True)
+class CallbackPayload:
+    """Result posted back to the Node.js queue service"""
+    task_id: str
+    status: str  # "success" or "error"
+    extracted_data: Optional[Dict[str, Any]] = None
+    confidence: float = 0.0
+    error: Optional[str] = None
+    
+    def to_json_bytes(self) -> bytes:
+        return orjson.dumps(self, default=str)
+
+
+async def send_callback(callback_url: str, payload: CallbackPayload, max_retries: int = 3):
     """
     Send callback to Node.js service with retry logic
+    
+    Retries use exponential backoff with jitter; 4xx responses other than
+    408/429 are not retried.
     """
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        for attempt in range(max_retries):
-            try:
-                response = await client.post(callback_url, json=payload)
-                if response.status_code == 200:
-                    print(f"✅ Callback sent successfully for task {payload.get('task_id')}")
-                    return
-                else:
-                    print(f"⚠️ Callback failed (attempt {attempt + 1}): {response.status_code}")
-            except Exception as e:
-                print(f"❌ Callback error (attempt {attempt + 1}): {str(e)}")
-                if attempt == max_retries - 1:
-                    print(f"💥 Failed to send callback after {max_retries} attempts")
+    # Serialize once; retries resend the same bytes
+    content = payload.to_json_bytes()
+    
+    for attempt in range(max_retries):
+        try:
+            response = await shared_http.post(
+                callback_url,
+                content=content,
+                headers={"Content-Type": "application/json"}
+            )
+            if response.status_code == 200:
+                print(f"✅ Callback sent successfully for task {payload.task_id}")
+                return
+            
+            print(f"⚠️ Callback failed (attempt {attempt + 1}): {response.status_code}")
+            if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                print(f"💥 Callback rejected for task {payload.task_id}, not retrying")
+                return
+        except Exception as e:
+            print(f"❌ Callback error (attempt {attempt + 1}): {str(e)}")
+        
+        if attempt < max_retries - 1:
+            await asyncio.sleep(min(8.0, 0.25 * 2 ** attempt) + random.random() * 0.1)
+    
+    print(f"💥 Failed to send callback after {max_retries} attempts")
 
 
 async def process_document_async(
@@ -74,23 +170,20 @@ async def process_document_async(
             raise FileNotFoundError(f"Document not found: {document_path}")
         
         # Process based on document type
-        if document_type == "aadhar":
-            extracted_data, confidence = await ocr_service.process_aadhaar_card(document_path)
-        elif document_type == "pan":
-            extracted_data, confidence = await ocr_service.process_pan_card(document_path)
-        elif document_type == "gst":
-            extracted_data, confidence = await ocr_service.process_gst_certificate(document_path)
-        else:
+        method_name = OCR_METHODS.get(document_type)
+        if method_name is None:
             raise ValueError(f"Unknown document type: {document_type}")
+        extracted_data, confidence = await asyncio.get_running_loop().run_in_executor(
+            ocr_executor, run_ocr_sync, method_name, document_path
+        )
         
         # Send success callback
-        callback_payload = {
-            "task_id": task_id,
-            "status": "success",
-            "extracted_data": extracted_data,
-            "confidence": confidence,
-            "error": None
-        }
+        callback_payload = CallbackPayload(
+            task_id=task_id,
+            status="success",
+            extracted_data=extracted_data,
+            confidence=confidence
+        )
         
         await send_callback(callback_url, callback_payload)
         print(f"✅ Task completed successfully: {task_id}")
@@ -100,25 +193,19 @@ async def process_document_async(
         print(f"❌ Task failed: {task_id} | Error: {error_message}")
         
         # Send error callback
-        callback_payload = {
-            "task_id": task_id,
-            "status": "error",
-            "extracted_data": None,
-            "confidence": 0.0,
-            "error": error_message
-        }
+        callback_payload = CallbackPayload(task_id=task_id, status="error", error=error_message)
         
         await send_callback(callback_url, callback_payload)
 
 
 @router.post("/process-aadhar", response_model=TaskAcceptedResponse, status_code=202)
-async def process_aadhar_async(request: AsyncDocumentRequest, background_tasks: BackgroundTasks):
+async def process_aadhar_async(request: AsyncDocumentRequest):
     """
     Accept Aadhar processing request, return immediately, process in background
     """
     try:
-        # Add background task
-        background_tasks.add_task(
+        # Queue background task
+        enqueue_task(
             process_document_async,
             "aadhar",
             request.document_path,
@@ -132,18 +219,20 @@ async def process_aadhar_async(request: AsyncDocumentRequest, background_tasks:
             message="Aadhar processing task accepted and queued"
         )
         
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="OCR task queue is full, please retry later")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to accept task: {str(e)}")
 
 
 @router.post("/process-pan", response_model=TaskAcceptedResponse, status_code=202)
-async def process_pan_async(request: AsyncDocumentRequest, background_tasks: BackgroundTasks):
+async def process_pan_async(request: AsyncDocumentRequest):
     """
     Accept PAN processing request, return immediately, process in background
     """
     try:
-        # Add background task
-        background_tasks.add_task(
+        # Queue background task
+        enqueue_task(
             process_document_async,
             "pan",
             request.document_path,
@@ -157,18 +246,20 @@ async def process_pan_async(request: AsyncDocumentRequest, background_tasks: Bac
             message="PAN processing task accepted and queued"
         )
         
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="OCR task queue is full, please retry later")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to accept task: {str(e)}")
 
 
 @router.post("/process-gst", response_model=TaskAcceptedResponse, status_code=202)
-async def process_gst_async(request: AsyncDocumentRequest, background_tasks: BackgroundTasks):
+async def process_gst_async(request: AsyncDocumentRequest):
     """
     Accept GST processing request, return immediately, process in background
     """
     try:
-        # Add background task
-        background_tasks.add_task(
+        # Queue background task
+        enqueue_task(
             process_document_async,
             "gst",
             request.document_path,
@@ -182,24 +273,27 @@ async def process_gst_async(request: AsyncDocumentRequest, background_tasks: Bac
             message="GST processing task accepted and queued"
         )
         
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="OCR task queue is full, please retry later")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to accept task: {str(e)}")
 
 
 @router.post("/process-catalogue", response_model=TaskAcceptedResponse, status_code=202)
-async def process_catalogue_async(request: AsyncCatalogueRequest, background_tasks: BackgroundTasks):
+async def process_catalogue_async(request: AsyncCatalogueRequest):
     """
     Accept Catalogue CSV processing request, return immediately, process with AI in background
     """
     try:
-        # Add background task
-        background_tasks.add_task(
+        # Queue background task
+        enqueue_task(
             process_catalogue_async_task,
             request.document_path,
             request.task_id,
             request.callback_url,
             request.vendor_id,
-            request.vendor_info or {}
+            request.vendor_info or {},
+            request.use_batch_api
         )
         
         return TaskAcceptedResponse(
@@ -208,6 +302,8 @@ async def process_catalogue_async(request: AsyncCatalogueRequest, background_tas
             message="Catalogue processing task accepted and queued (AI processing)"
         )
         
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="OCR task queue is full, please retry later")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to accept task: {str(e)}")
 
@@ -217,10 +313,14 @@ async def process_catalogue_async_task(
     task_id: str,
     callback_url: str,
     vendor_id: str,
-    vendor_info: Dict[str, Any]
+    vendor_info: Dict[str, Any],
+    use_batch_api: bool = False,
+    batch_collected: bool = False
 ):
     """
     Background task that processes catalogue CSV with AI and sends callback
+    With use_batch_api, the first run only submits the Batch API job and parks the task;
+    poll_catalogue_batches runs it again (batch_collected) once the job has finished
     """
     try:
         print(f"🔄 Background catalogue processing started: {task_id} | Vendor: {vendor_id}")
@@ -229,21 +329,35 @@ async def process_catalogue_async_task(
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"CSV file not found: {csv_path}")
         
+        if use_batch_api and not batch_collected:
+            job = await ai_catalogue_service.submit_standardization_batch(csv_path)
+            if job is not None:
+                job.update(
+                    task_id=task_id,
+                    callback_url=callback_url,
+                    csv_path=csv_path,
+                    vendor_id=vendor_id,
+                    vendor_info=vendor_info
+                )
+                await redis_client.hset(CATALOGUE_BATCH_JOBS_KEY, task_id, orjson.dumps(job))
+                print(f"📦 Catalogue task {task_id} waiting on OpenAI batch {job['batch_id']}")
+                return
+        
         # Process catalogue with AI
         processed_data, confidence = await ai_catalogue_service.process_catalogue_with_ai(
             csv_path,
             vendor_id,
-            vendor_info
+            vendor_info,
+            use_batch_api
         )
         
         # Send success callback with processed data
-        callback_payload = {
-            "task_id": task_id,
-            "status": "success",
-            "extracted_data": processed_data,
-            "confidence": confidence,
-            "error": None
-        }
+        callback_payload = CallbackPayload(
+            task_id=task_id,
+            status="success",
+            extracted_data=processed_data,
+            confidence=confidence
+        )
         
         await send_callback(callback_url, callback_payload)
         print(f"✅ Catalogue task completed successfully: {task_id}")
@@ -253,17 +367,44 @@ async def process_catalogue_async_task(
         print(f"❌ Catalogue task failed: {task_id} | Error: {error_message}")
         
         # Send error callback
-        callback_payload = {
-            "task_id": task_id,
-            "status": "error",
-            "extracted_data": None,
-            "confidence": 0.0,
-            "error": error_message
-        }
+        callback_payload = CallbackPayload(task_id=task_id, status="error", error=error_message)
         
         await send_callback(callback_url, callback_payload)
 
 
+async def poll_catalogue_batches():
+    """Complete parked catalogue tasks whose Batch API jobs have finished"""
+    while True:
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        try:
+            jobs = await redis_client.hgetall(CATALOGUE_BATCH_JOBS_KEY)
+        except Exception as e:
+            print(f"⚠️ Could not read catalogue batch jobs: {e}")
+            continue
+        
+        for task_id, raw_job in jobs.items():
+            job = orjson.loads(raw_job)
+            try:
+                if not await ai_catalogue_service.collect_standardization_batch(job):
+                    continue
+                # Every process polls the same jobs; only the one that removes it completes it
+                if not await redis_client.hdel(CATALOGUE_BATCH_JOBS_KEY, task_id):
+                    continue
+            except Exception as e:
+                print(f"⚠️ Catalogue batch check failed for task {job['task_id']}: {e}")
+                continue
+            
+            await process_catalogue_async_task(
+                job["csv_path"],
+                job["task_id"],
+                job["callback_url"],
+                job["vendor_id"],
+                job["vendor_info"],
+                use_batch_api=True,
+                batch_collected=True
+            )
+
+
 @router.get("/health")
 async def async_ocr_health():
     """Health check for async OCR endpoints"""
@@ -271,5 +412,7 @@ async def async_ocr_health():
         "status": "healthy",
         "service": "async_ocr_processing",
         "callback_enabled": True,
+        "queued_tasks": task_queue.qsize() if task_queue else 0,
+        "workers": OCR_WORKER_COUNT,
         "catalogue_ai_enabled": True  # ✅ Catalogue AI processing enabled
     }
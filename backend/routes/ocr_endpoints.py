@@ -3,32 +3,98 @@ OCR Processing Endpoints
 Exposes OCR service functionality via REST API
 Used by Node.js BullMQ workers for Stage 4 processing
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Literal, Optional, Tuple
+from pathlib import Path
 import os
+import asyncio
+import hashlib
+import time
+import orjson
 
-from services.ocr_service import OCRService
+from services.ocr_service import OCRService, get_ocr_service
+from utils.queue_logging import get_queue_logger
+from utils.redis_client import redis_client
 
-router = APIRouter(prefix="/api/ocr", tags=["OCR"])
+# Responses are built from trusted OCR output, so they skip response_model
+# validation and are serialized directly with orjson
+router = APIRouter(prefix="/api/ocr", tags=["OCR"], default_response_class=ORJSONResponse)
+logger = get_queue_logger("vendor.ocr")
 
-# Initialize OCR service
-ocr_service = OCRService()
+# OCR results cached by document content, so BullMQ retries and duplicate
+# uploads of the same file skip the OpenAI call
+OCR_CACHE_TTL = 86400  # 24 hours
+# Tesseract fallback results (confidence 0.5) and other low-confidence reads are not
+# cached, so a retry gets another chance at the Vision API
+OCR_CACHE_MIN_CONFIDENCE = 0.6
+
+
+# Environment is loaded before routers are imported, so this is read once
+_OPENAI_CONFIGURED = bool(os.getenv("OPENAI_API_KEY"))
+
+# Health results reused for this long, so frequent probes skip the checks
+HEALTH_CACHE_TTL = 2.0  # seconds
+_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+
+async def _ocr_cache_key(document_type: str, document_path: str) -> str:
+    content = await asyncio.to_thread(Path(document_path).read_bytes)
+    return f"ocr:{document_type}:{hashlib.sha256(content).hexdigest()}"
+
+
+async def _cache_get(key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+    """Cached (extracted_data, confidence), or None on a miss or when Redis is unavailable"""
+    try:
+        cached = await redis_client.get(key)
+    except Exception as e:
+        logger.warning("OCR cache read failed: %s", e)
+        return None
+    if cached is None:
+        return None
+    try:
+        entry = orjson.loads(cached)
+        return entry["extracted_data"], entry["confidence"]
+    except (orjson.JSONDecodeError, KeyError, TypeError) as e:
+        logger.warning("Ignoring corrupt OCR cache entry %s: %s", key, e)
+        return None
+
+
+async def _cache_set(key: str, result: Tuple[Dict[str, Any], float]):
+    extracted_data, confidence = result
+    if confidence < OCR_CACHE_MIN_CONFIDENCE:
+        return
+    try:
+        await redis_client.setex(key, OCR_CACHE_TTL, orjson.dumps(
+            {"extracted_data": extracted_data, "confidence": confidence}, default=str
+        ))
+    except Exception as e:
+        logger.warning("OCR cache write failed: %s", e)
+
+
+async def _cached_ocr(document_type: str, document_path: str, fn) -> Tuple[Dict[str, Any], float]:
+    """Run an OCR method on a document, returning the cached result for identical content"""
+    key = await _ocr_cache_key(document_type, document_path)
+    cached = await _cache_get(key)
+    if cached is not None:
+        return cached
+    
+    result = await fn(document_path)
+    await _cache_set(key, result)
+    return result
 
 
 class DocumentProcessRequest(BaseModel):
     document_path: str
 
 
-class DocumentProcessResponse(BaseModel):
-    success: bool
-    extracted_data: Dict[str, Any]
-    confidence: float
-    error: str | None = None
-
+class BatchProcessRequest(BaseModel):
+    document_type: Literal['aadhar', 'pan', 'gst']
+    document_paths: List[str]
 
-@router.post("/process-aadhar", response_model=DocumentProcessResponse)
-async def process_aadhar_document(request: DocumentProcessRequest):
+@router.post("/process-aadhar")
+async def process_aadhar_document(request: DocumentProcessRequest, ocr: OCRService = Depends(get_ocr_service)):
     """
     Process Aadhaar card document and extract information
     Called by Node.js BullMQ workers
@@ -37,31 +103,31 @@ async def process_aadhar_document(request: DocumentProcessRequest):
         document_path = request.document_path
         
         # Validate file exists
-        if not os.path.exists(document_path):
+        if not await asyncio.to_thread(os.path.exists, document_path):
             raise HTTPException(status_code=404, detail=f"Document not found: {document_path}")
         
         # Process the document
-        extracted_data, confidence = await ocr_service.process_aadhaar_card(document_path)
+        extracted_data, confidence = await _cached_ocr("aadhar", document_path, ocr.process_aadhaar_card)
         
-        return DocumentProcessResponse(
-            success=True,
-            extracted_data=extracted_data,
-            confidence=confidence,
-            error=None
-        )
+        return {
+            "success": True,
+            "extracted_data": extracted_data,
+            "confidence": confidence,
+            "error": None
+        }
         
     except Exception as e:
-        print(f"Error processing Aadhar document: {str(e)}")
-        return DocumentProcessResponse(
-            success=False,
-            extracted_data={},
-            confidence=0.0,
-            error=str(e)
-        )
+        logger.error("Error processing Aadhar document: %s", e)
+        return {
+            "success": False,
+            "extracted_data": {},
+            "confidence": 0.0,
+            "error": str(e)
+        }
 
 
-@router.post("/process-pan", response_model=DocumentProcessResponse)
-async def process_pan_document(request: DocumentProcessRequest):
+@router.post("/process-pan")
+async def process_pan_document(request: DocumentProcessRequest, ocr: OCRService = Depends(get_ocr_service)):
     """
     Process PAN card document and extract information
     Called by Node.js BullMQ workers
@@ -70,31 +136,31 @@ async def process_pan_document(request: DocumentProcessRequest):
         document_path = request.document_path
         
         # Validate file exists
-        if not os.path.exists(document_path):
+        if not await asyncio.to_thread(os.path.exists, document_path):
             raise HTTPException(status_code=404, detail=f"Document not found: {document_path}")
         
         # Process the document
-        extracted_data, confidence = await ocr_service.process_pan_card(document_path)
+        extracted_data, confidence = await _cached_ocr("pan", document_path, ocr.process_pan_card)
         
-        return DocumentProcessResponse(
-            success=True,
-            extracted_data=extracted_data,
-            confidence=confidence,
-            error=None
-        )
+        return {
+            "success": True,
+            "extracted_data": extracted_data,
+            "confidence": confidence,
+            "error": None
+        }
         
     except Exception as e:
-        print(f"Error processing PAN document: {str(e)}")
-        return DocumentProcessResponse(
-            success=False,
-            extracted_data={},
-            confidence=0.0,
-            error=str(e)
-        )
+        logger.error("Error processing PAN document: %s", e)
+        return {
+            "success": False,
+            "extracted_data": {},
+            "confidence": 0.0,
+            "error": str(e)
+        }
 
 
-@router.post("/process-gst", response_model=DocumentProcessResponse)
-async def process_gst_document(request: DocumentProcessRequest):
+@router.post("/process-gst")
+async def process_gst_document(request: DocumentProcessRequest, ocr: OCRService = Depends(get_ocr_service)):
     """
     Process GST certificate document and extract information
     Called by Node.js BullMQ workers
@@ -103,34 +169,109 @@ async def process_gst_document(request: DocumentProcessRequest):
         document_path = request.document_path
         
         # Validate file exists
-        if not os.path.exists(document_path):
+        if not await asyncio.to_thread(os.path.exists, document_path):
             raise HTTPException(status_code=404, detail=f"Document not found: {document_path}")
         
         # Process the document
-        extracted_data, confidence = await ocr_service.process_gst_certificate(document_path)
+        extracted_data, confidence = await _cached_ocr("gst", document_path, ocr.process_gst_certificate)
         
-        return DocumentProcessResponse(
-            success=True,
-            extracted_data=extracted_data,
-            confidence=confidence,
-            error=None
-        )
+        return {
+            "success": True,
+            "extracted_data": extracted_data,
+            "confidence": confidence,
+            "error": None
+        }
         
     except Exception as e:
-        print(f"Error processing GST document: {str(e)}")
-        return DocumentProcessResponse(
-            success=False,
-            extracted_data={},
-            confidence=0.0,
-            error=str(e)
-        )
+        logger.error("Error processing GST document: %s", e)
+        return {
+            "success": False,
+            "extracted_data": {},
+            "confidence": 0.0,
+            "error": str(e)
+        }
+
+
+@router.post("/process-batch")
+async def process_document_batch(request: BatchProcessRequest, ocr: OCRService = Depends(get_ocr_service)):
+    """
+    Process a batch of documents of the same type in one call
+    Called by Node.js BullMQ workers with a whole Stage 3 batch; results are in request order
+    """
+    # Stat all files in parallel off the event loop; only regular files are processed
+    exists = await asyncio.gather(*(asyncio.to_thread(os.path.isfile, path) for path in request.document_paths))
+    existing_paths = [path for path, found in zip(request.document_paths, exists) if found]
+    
+    # A file can still vanish or be unreadable when it is hashed; that fails only its own document
+    keys = await asyncio.gather(
+        *(_ocr_cache_key(request.document_type, path) for path in existing_paths),
+        return_exceptions=True
+    )
+    outcomes = list(keys)
+    readable = [i for i, key in enumerate(keys) if not isinstance(key, BaseException)]
+    
+    # Serve already-processed content from the cache; only misses go to OCR
+    cached = await asyncio.gather(*(_cache_get(keys[i]) for i in readable))
+    misses = []
+    for i, hit in zip(readable, cached):
+        if hit is None:
+            misses.append(i)
+        else:
+            outcomes[i] = hit
+    
+    processed = await ocr.process_batch(request.document_type, [existing_paths[i] for i in misses])
+    for i, outcome in zip(misses, processed):
+        outcomes[i] = outcome
+    await asyncio.gather(*(
+        _cache_set(keys[i], outcome) for i, outcome in zip(misses, processed)
+        if not isinstance(outcome, BaseException)
+    ))
+    outcomes = iter(outcomes)
+    
+    results = []
+    for path, found in zip(request.document_paths, exists):
+        if not found:
+            results.append({
+                "success": False,
+                "extracted_data": {},
+                "confidence": 0.0,
+                "error": f"Document not found: {path}"
+            })
+            continue
+        
+        outcome = next(outcomes)
+        if isinstance(outcome, BaseException):
+            logger.error("Error processing %s document %s: %s", request.document_type, path, outcome)
+            results.append({
+                "success": False,
+                "extracted_data": {},
+                "confidence": 0.0,
+                "error": str(outcome)
+            })
+        else:
+            extracted_data, confidence = outcome
+            results.append({
+                "success": True,
+                "extracted_data": extracted_data,
+                "confidence": confidence,
+                "error": None
+            })
+    
+    return {"results": results}
 
 
 @router.get("/health")
 async def ocr_health_check():
     """Health check endpoint for OCR service"""
-    return {
+    global _health_cache
+    now = time.monotonic()
+    if _health_cache and now - _health_cache[0] < HEALTH_CACHE_TTL:
+        return _health_cache[1]
+    
+    result = {
         "status": "healthy",
         "service": "ocr_processing",
-        "openai_configured": bool(os.getenv("OPENAI_API_KEY"))
+        "openai_configured": _OPENAI_CONFIGURED
     }
+    _health_cache = (now, result)
+    return result
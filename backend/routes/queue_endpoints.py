@@ -3,17 +3,40 @@ Queue Processing Endpoints
 Main FastAPI endpoints to trigger and monitor Stage 3 & 4
 Communicates with Node.js BullMQ service
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
-import requests
+from typing import Dict, Any, List, Optional, Tuple
+import httpx
 import os
+import time
+
+from utils.etag_cache import ETagCache
 
 router = APIRouter(prefix="/api/queue", tags=["Queue Processing"])
 
 # Node.js Queue Service URL
 QUEUE_SERVICE_URL = os.getenv("QUEUE_SERVICE_URL", "http://localhost:3005")
 
+# Pooled keep-alive client for all queue service calls
+_client = httpx.AsyncClient(
+    base_url=QUEUE_SERVICE_URL,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=httpx.Timeout(10.0, connect=5.0)
+)
+
+
+# Health results reused for this long, so frequent probes don't hit the queue service each time
+HEALTH_CACHE_TTL = 2.0  # seconds
+_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+# Dashboard polls of batch listings/stats are served from here for a few seconds
+_listing_cache = ETagCache(ttl=3.0)
+
+
+@router.on_event("shutdown")
+async def close_queue_client():
+    await _client.aclose()
+
 
 class Stage3TriggerResponse(BaseModel):
     success: bool
@@ -48,8 +71,8 @@ async def trigger_stage3_batching():
         Processing summary with batch counts
     """
     try:
-        response = requests.post(
-            f"{QUEUE_SERVICE_URL}/api/stage3/create-batches",
+        response = await _client.post(
+            "/api/stage3/create-batches",
             timeout=30
         )
         
@@ -62,7 +85,7 @@ async def trigger_stage3_batching():
                 detail=f"Queue service error: {response.text}"
             )
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise HTTPException(
             status_code=503,
             detail=f"Cannot connect to queue service at {QUEUE_SERVICE_URL}. Is the Node.js service running?"
@@ -80,8 +103,8 @@ async def get_queue_statistics():
         Queue status including job counts and worker information
     """
     try:
-        response = requests.get(
-            f"{QUEUE_SERVICE_URL}/api/queue/stats",
+        response = await _client.get(
+            "/api/queue/stats",
             timeout=10
         )
         
@@ -93,7 +116,7 @@ async def get_queue_statistics():
                 detail=f"Queue service error: {response.text}"
             )
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise HTTPException(
             status_code=503,
             detail=f"Cannot connect to queue service at {QUEUE_SERVICE_URL}"
@@ -102,8 +125,20 @@ async def get_queue_statistics():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _fetch_json(path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+    """GET a queue service endpoint, raising HTTPException on a non-200 reply"""
+    response = await _client.get(path, params=params, timeout=10)
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Queue service error: {response.text}"
+        )
+    return response.json()
+
+
 @router.get("/batches")
 async def get_batches(
+    request: Request,
     status: Optional[str] = None,
     document_type: Optional[str] = None,
     limit: int = 50,
@@ -132,25 +167,19 @@ async def get_batches(
         if document_type:
             params["document_type"] = document_type
         
-        response = requests.get(
-            f"{QUEUE_SERVICE_URL}/api/batches",
-            params=params,
-            timeout=10
+        return await _listing_cache.respond(
+            request,
+            ("/api/batches", tuple(sorted(params.items()))),
+            lambda: _fetch_json("/api/batches", params)
         )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Queue service error: {response.text}"
-            )
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise HTTPException(
             status_code=503,
             detail=f"Cannot connect to queue service at {QUEUE_SERVICE_URL}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -167,8 +196,8 @@ async def get_batch_details(batch_id: str):
         Batch details including progress and results
     """
     try:
-        response = requests.get(
-            f"{QUEUE_SERVICE_URL}/api/batches/{batch_id}",
+        response = await _client.get(
+            f"/api/batches/{batch_id}",
             timeout=10
         )
         
@@ -182,7 +211,7 @@ async def get_batch_details(batch_id: str):
                 detail=f"Queue service error: {response.text}"
             )
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise HTTPException(
             status_code=503,
             detail=f"Cannot connect to queue service at {QUEUE_SERVICE_URL}"
@@ -205,8 +234,8 @@ async def retry_failed_batch(batch_id: str):
         Retry confirmation
     """
     try:
-        response = requests.post(
-            f"{QUEUE_SERVICE_URL}/api/batches/{batch_id}/retry",
+        response = await _client.post(
+            f"/api/batches/{batch_id}/retry",
             timeout=10
         )
         
@@ -220,7 +249,7 @@ async def retry_failed_batch(batch_id: str):
                 detail=f"Queue service error: {response.text}"
             )
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise HTTPException(
             status_code=503,
             detail=f"Cannot connect to queue service at {QUEUE_SERVICE_URL}"
@@ -232,7 +261,7 @@ async def retry_failed_batch(batch_id: str):
 
 
 @router.get("/processing-stats")
-async def get_processing_statistics():
+async def get_processing_statistics(request: Request):
     """
     Get overall processing statistics
     
@@ -240,24 +269,15 @@ async def get_processing_statistics():
         Statistics about batches and vendors
     """
     try:
-        response = requests.get(
-            f"{QUEUE_SERVICE_URL}/api/stats",
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Queue service error: {response.text}"
-            )
+        return await _listing_cache.respond(request, ("/api/stats",), lambda: _fetch_json("/api/stats"))
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         raise HTTPException(
             status_code=503,
             detail=f"Cannot connect to queue service at {QUEUE_SERVICE_URL}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -265,9 +285,20 @@ async def get_processing_statistics():
 @router.get("/health")
 async def queue_health_check():
     """Check if queue service is reachable"""
+    global _health_cache
+    now = time.monotonic()
+    if _health_cache and now - _health_cache[0] < HEALTH_CACHE_TTL:
+        return _health_cache[1]
+    
+    result = await _check_queue_service()
+    _health_cache = (now, result)
+    return result
+
+
+async def _check_queue_service() -> Dict[str, Any]:
     try:
-        response = requests.get(
-            f"{QUEUE_SERVICE_URL}/health",
+        response = await _client.get(
+            "/health",
             timeout=5
         )
         
@@ -285,7 +316,7 @@ async def queue_health_check():
                 "detail": response.text
             }
             
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         return {
             "status": "unhealthy",
             "queue_service": "unreachable",
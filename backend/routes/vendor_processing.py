@@ -2,16 +2,24 @@
 Vendor Email Processing Route
 Handles automated vendor registration via Nylas email integration
 """
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Request
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from datetime import datetime
+from functools import lru_cache
 from services.vendor_email_service import VendorEmailService
+from utils.etag_cache import ETagCache
 
 router = APIRouter(prefix="/api/v1/vendors", tags=["Vendor Processing"])
 
-# Initialize service
-vendor_service = VendorEmailService()
+# Dashboard polls of vendor listings/stats are served from here for a few seconds
+_listing_cache = ETagCache(ttl=3.0)
+
+
+@lru_cache(maxsize=None)
+def get_vendor_service() -> VendorEmailService:
+    """Shared VendorEmailService, created on first request (not at import)"""
+    return VendorEmailService()
 
 
 class ProcessEmailsRequest(BaseModel):
@@ -32,7 +40,8 @@ class ProcessEmailsResponse(BaseModel):
 @router.post("/process-emails", response_model=ProcessEmailsResponse)
 async def process_vendor_emails(
     request: ProcessEmailsRequest,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    vendor_service: VendorEmailService = Depends(get_vendor_service)
 ):
     """
     Process vendor registration emails from Nylas
@@ -55,7 +64,7 @@ async def process_vendor_emails(
     try:
         if request.background:
             # Process in background
-            job_id = vendor_service.start_background_processing(
+            job_id = await vendor_service.start_background_processing(
                 limit=request.limit
             )
             
@@ -84,7 +93,7 @@ async def process_vendor_emails(
 
 
 @router.get("/processing-status/{job_id}")
-async def get_processing_status(job_id: str):
+async def get_processing_status(job_id: str, vendor_service: VendorEmailService = Depends(get_vendor_service)):
     """
     Get status of background email processing job
     
@@ -97,7 +106,7 @@ async def get_processing_status(job_id: str):
     - results: Final results if completed
     """
     try:
-        status = vendor_service.get_job_status(job_id)
+        status = await vendor_service.get_job_status(job_id)
         
         if not status:
             raise HTTPException(
@@ -124,7 +133,7 @@ async def get_processing_status(job_id: str):
 
 
 @router.get("/vendor/{vendor_id}")
-async def get_vendor_details(vendor_id: str):
+async def get_vendor_details(vendor_id: str, vendor_service: VendorEmailService = Depends(get_vendor_service)):
     """
     Get vendor details by vendor_id
     
@@ -164,9 +173,11 @@ async def get_vendor_details(vendor_id: str):
 
 @router.get("/vendors/list")
 async def list_vendors(
+    request: Request,
     status: Optional[str] = None,
     limit: int = 100,
-    skip: int = 0
+    skip: int = 0,
+    vendor_service: VendorEmailService = Depends(get_vendor_service)
 ):
     """
     List all processed vendors with optional filtering
@@ -179,7 +190,7 @@ async def list_vendors(
     **Returns:**
     - List of vendors with basic information
     """
-    try:
+    async def fetch():
         vendors = vendor_service.list_vendors(
             status=status,
             limit=limit,
@@ -192,6 +203,9 @@ async def list_vendors(
             "count": len(vendors),
             "timestamp": datetime.now()
         }
+    
+    try:
+        return await _listing_cache.respond(request, ("list", status, limit, skip), fetch)
         
     except Exception as e:
         raise HTTPException(
@@ -201,7 +215,7 @@ async def list_vendors(
 
 
 @router.get("/statistics")
-async def get_processing_statistics():
+async def get_processing_statistics(request: Request, vendor_service: VendorEmailService = Depends(get_vendor_service)):
     """
     Get overall vendor processing statistics
     
@@ -211,14 +225,15 @@ async def get_processing_statistics():
     - Status distribution
     - Recent activity
     """
-    try:
-        stats = vendor_service.get_statistics()
-        
+    async def fetch():
         return {
             "success": True,
-            "statistics": stats,
+            "statistics": vendor_service.get_statistics(),
             "timestamp": datetime.now()
         }
+    
+    try:
+        return await _listing_cache.respond(request, ("statistics",), fetch)
         
     except Exception as e:
         raise HTTPException(
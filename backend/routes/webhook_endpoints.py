@@ -1,28 +1,116 @@
-from fastapi import APIRouter, Request, HTTPException, Header, Query, BackgroundTasks
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, Request, HTTPException, Header, Query, Depends
+from fastapi.responses import PlainTextResponse, ORJSONResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime
+from functools import lru_cache
 from services.webhook_processor import WebhookProcessor
-import json
+from utils.queue_logging import get_queue_logger
+from utils.redis_client import redis_client
+from utils.etag_cache import ETagCache
+import orjson
+import asyncio
+import time
 
-router = APIRouter(prefix="/webhooks/nylas", tags=["Nylas Webhooks"])
+router = APIRouter(prefix="/webhooks/nylas", tags=["Nylas Webhooks"], default_response_class=ORJSONResponse)
+logger = get_queue_logger("vendor.webhooks")
 
-# Initialize webhook processor
-webhook_processor = WebhookProcessor()
+# Largest webhook body accepted (Nylas message metadata is well below this)
+MAX_WEBHOOK_BYTES = 1024 * 1024  # 1 MB
 
+# Email IDs already accepted, so Nylas retries stop at the HTTP layer
+SEEN_EMAIL_TTL = 86400  # 24 hours
 
-async def process_webhook_background(webhook_data: Dict[str, Any]):
+# Accepted webhooks wait here for a fixed pool of workers, bounding concurrent
+# downloads and memory when Nylas delivers (or retries) in bursts
+WEBHOOK_QUEUE_SIZE = 1000
+WEBHOOK_WORKER_COUNT = 16
+# On shutdown, queued webhooks get this long to finish (inside gunicorn's graceful
+# timeout); anything cut off has its dedup key released so the Nylas retry goes through
+WEBHOOK_DRAIN_TIMEOUT = 20.0  # seconds
+_webhook_queue: Optional[asyncio.Queue] = None
+_webhook_workers = []
+
+# Health results reused for this long, so frequent probes don't ping MongoDB each time
+HEALTH_CACHE_TTL = 2.0  # seconds
+_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+# Dashboard polls of the statistics are served from here for a few seconds
+_stats_cache = ETagCache(ttl=3.0)
+
+
+def _seen_key(email_id: str) -> str:
+    return f"nylas:seen:{email_id}"
+
+
+@lru_cache(maxsize=None)
+def get_webhook_processor() -> WebhookProcessor:
+    """Shared WebhookProcessor, created on first request (not at import)"""
+    return WebhookProcessor()
+
+
+async def _release_seen(email_id: Optional[str]):
+    """Forget an accepted email ID so a later retry is processed again"""
+    if not email_id:
+        return
+    try:
+        await redis_client.delete(_seen_key(email_id))
+    except Exception as e:
+        logger.warning("Could not release webhook dedup key for %s: %s", email_id, e)
+
+
+async def process_webhook_background(webhook_data: Dict[str, Any], email_id: Optional[str] = None):
     """
     Process webhook in background (non-blocking)
     Allows multiple webhooks to be processed simultaneously
     """
     try:
-        result = await webhook_processor.process_webhook(webhook_data)
-        print(f"✅ Background webhook processing completed: {result.get('email_id')}")
+        result = await get_webhook_processor().process_webhook(webhook_data)
+        logger.info("Background webhook processing completed: %s", result.get('email_id'))
+        if result.get("status") == "error":
+            await _release_seen(email_id)
         return result
     except Exception as e:
-        print(f"❌ Background webhook processing failed: {str(e)}")
+        logger.error("Background webhook processing failed: %s", e)
+        await _release_seen(email_id)
+
+
+async def _webhook_worker():
+    while True:
+        webhook_data, email_id = await _webhook_queue.get()
+        try:
+            await process_webhook_background(webhook_data, email_id)
+        except asyncio.CancelledError:
+            await _release_seen(email_id)
+            raise
+        finally:
+            _webhook_queue.task_done()
+
+
+@router.on_event("startup")
+async def start_webhook_workers():
+    global _webhook_queue
+    _webhook_queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+    _webhook_workers.extend(asyncio.create_task(_webhook_worker()) for _ in range(WEBHOOK_WORKER_COUNT))
+
+
+@router.on_event("shutdown")
+async def stop_webhook_workers():
+    if _webhook_queue is None:
+        return
+    try:
+        await asyncio.wait_for(_webhook_queue.join(), timeout=WEBHOOK_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Webhook queue not drained within %ss, releasing %d queued webhooks",
+                       WEBHOOK_DRAIN_TIMEOUT, _webhook_queue.qsize())
+    for worker in _webhook_workers:
+        worker.cancel()
+    await asyncio.gather(*_webhook_workers, return_exceptions=True)
+    _webhook_workers.clear()
+    # Never started: let Nylas redeliver them to the next instance
+    while not _webhook_queue.empty():
+        _, email_id = _webhook_queue.get_nowait()
+        await _release_seen(email_id)
 
 
 @router.get("/message-created")
@@ -35,28 +123,28 @@ async def handle_webhook_challenge(challenge: str = Query(None)):
     
     This is called ONCE when you create the webhook in Nylas Dashboard.
     """
-    print(f"🔍 GET request received. Challenge parameter: {challenge}")
+    logger.info("GET request received. Challenge parameter: %s", challenge)
     
     if challenge:
-        print(f"✅ Webhook challenge received: {challenge}")
+        logger.info("Webhook challenge received: %s", challenge)
         # Return plain text response, not JSON
         return PlainTextResponse(content=challenge, status_code=200)
     else:
-        print("❌ No challenge parameter provided")
+        logger.warning("No challenge parameter provided")
         return PlainTextResponse(content="No challenge parameter", status_code=400)
 
 
 @router.post("/message-created")
 async def handle_message_created_webhook(
     request: Request,
-    background_tasks: BackgroundTasks,
-    x_nylas_signature: Optional[str] = Header(None)
+    x_nylas_signature: Optional[str] = Header(None),
+    webhook_processor: WebhookProcessor = Depends(get_webhook_processor)
 ):
     """
     **Nylas Webhook Endpoint - Message Created Event (PARALLEL PROCESSING)**
     
-    This endpoint processes webhooks in the background, allowing multiple emails
-    to be processed simultaneously without blocking.
+    This endpoint queues webhooks for a pool of background workers, allowing multiple
+    emails to be processed simultaneously without blocking.
     
     **How it works:**
     1. Vendor sends email to your admin email
@@ -67,7 +155,7 @@ async def handle_message_created_webhook(
     
     **Parallel Processing:**
     - Multiple emails can arrive simultaneously
-    - Each processes in its own background task
+    - Up to 16 process at once; the rest wait in a bounded queue
     - No waiting - all documents download in parallel
     - Significantly faster than sequential processing
     
@@ -96,36 +184,71 @@ async def handle_message_created_webhook(
     **Response Codes:**
     - 200: Webhook accepted and queued for processing
     - 400: Invalid signature or malformed payload
+    - 503: Processing queue full (Nylas will retry)
     - 500: Processing error (Nylas will retry)
     """
     try:
-        # Get raw body for signature verification
-        raw_body = await request.body()
+        # Reject oversized bodies before reading them
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > MAX_WEBHOOK_BYTES:
+            raise HTTPException(status_code=413, detail="Webhook payload too large")
+        
+        # Stream the body, feeding the signature HMAC as chunks arrive
+        hasher = webhook_processor.new_signature_hasher() if x_nylas_signature else None
+        chunks = []
+        total = 0
+        async for chunk in request.stream():
+            total += len(chunk)
+            if total > MAX_WEBHOOK_BYTES:
+                raise HTTPException(status_code=413, detail="Webhook payload too large")
+            if hasher is not None:
+                hasher.update(chunk)
+            chunks.append(chunk)
         
         # Verify webhook signature (security)
         if x_nylas_signature:
-            is_valid = webhook_processor.verify_webhook_signature(
-                raw_body,
-                x_nylas_signature
-            )
+            is_valid = webhook_processor.signature_matches(hasher, x_nylas_signature)
             
             if not is_valid:
-                print("⚠️ Invalid webhook signature - possible unauthorized request")
+                logger.warning("Invalid webhook signature - possible unauthorized request")
                 raise HTTPException(
                     status_code=401,
                     detail="Invalid webhook signature"
                 )
         else:
-            print("⚠️ WARNING: No signature provided (set NYLAS_WEBHOOK_SECRET in production)")
+            logger.warning("No signature provided (set NYLAS_WEBHOOK_SECRET in production)")
         
         # Parse webhook payload
-        webhook_data = json.loads(raw_body)
+        webhook_data = orjson.loads(b"".join(chunks))
         
         email_id = webhook_data.get('data', {}).get('object', {}).get('id') or webhook_data.get('data', {}).get('id')
-        print(f"📨 Webhook received: {webhook_data.get('type')} - Email ID: {email_id}")
+        logger.info("Webhook received: %s - Email ID: %s", webhook_data.get('type'), email_id)
         
-        # Add to background tasks (non-blocking - returns immediately)
-        background_tasks.add_task(process_webhook_background, webhook_data)
+        # Drop retries of an email that was already accepted (fail open if Redis is unavailable)
+        if email_id:
+            try:
+                first_delivery = await redis_client.set(_seen_key(email_id), b"1", nx=True, ex=SEEN_EMAIL_TTL)
+            except Exception as e:
+                logger.warning("Webhook dedup check failed: %s", e)
+                first_delivery = True
+            
+            if not first_delivery:
+                logger.info("Duplicate webhook ignored - Email ID: %s", email_id)
+                return {
+                    "success": True,
+                    "message": "Webhook already accepted",
+                    "email_id": email_id,
+                    "duplicate": True,
+                    "timestamp": datetime.now().isoformat()
+                }
+        
+        # Hand off to the worker pool (non-blocking - returns immediately)
+        try:
+            _webhook_queue.put_nowait((webhook_data, email_id))
+        except asyncio.QueueFull:
+            await _release_seen(email_id)
+            logger.warning("Webhook queue full - rejecting Email ID: %s", email_id)
+            raise HTTPException(status_code=503, detail="Webhook queue full, retry later")
         
         # Return success immediately (webhook processing happens in background)
         return {
@@ -138,13 +261,13 @@ async def handle_message_created_webhook(
         
     except HTTPException:
         raise
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid JSON payload: {str(e)}"
         )
     except Exception as e:
-        print(f"❌ Webhook acceptance error: {str(e)}")
+        logger.error("Webhook acceptance error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Webhook acceptance error: {str(e)}"
@@ -152,7 +275,7 @@ async def handle_message_created_webhook(
 
 
 @router.get("/statistics")
-async def get_webhook_statistics():
+async def get_webhook_statistics(request: Request, webhook_processor: WebhookProcessor = Depends(get_webhook_processor)):
     """
     Get webhook processing statistics
     
@@ -167,14 +290,15 @@ async def get_webhook_statistics():
     - Error rates
     - Recent activity
     """
-    try:
-        stats = webhook_processor.get_webhook_statistics()
-        
+    async def fetch():
         return {
             "success": True,
-            "statistics": stats,
+            "statistics": webhook_processor.get_webhook_statistics(),
             "timestamp": datetime.now().isoformat()
         }
+    
+    try:
+        return await _stats_cache.respond(request, "statistics", fetch)
         
     except Exception as e:
         raise HTTPException(
@@ -184,7 +308,7 @@ async def get_webhook_statistics():
 
 
 @router.post("/test")
-async def test_webhook_endpoint(request: Request):
+async def test_webhook_endpoint(request: Request, webhook_processor: WebhookProcessor = Depends(get_webhook_processor)):
     """
     **Test Webhook Endpoint (Development Only)**
     
@@ -206,9 +330,9 @@ async def test_webhook_endpoint(request: Request):
     **Note:** This skips signature verification for testing.
     """
     try:
-        webhook_data = await request.json()
+        webhook_data = orjson.loads(await request.body())
         
-        print("🧪 TEST WEBHOOK - Processing test payload")
+        logger.info("TEST WEBHOOK - Processing test payload")
         
         # Process without signature verification
         result = await webhook_processor.process_webhook(webhook_data)
@@ -228,7 +352,7 @@ async def test_webhook_endpoint(request: Request):
 
 
 @router.get("/health")
-async def webhook_health_check():
+async def webhook_health_check(webhook_processor: WebhookProcessor = Depends(get_webhook_processor)):
     """
     Health check for webhook endpoint
     
@@ -237,11 +361,16 @@ async def webhook_health_check():
     - MongoDB connection status
     - Configuration status
     """
+    global _health_cache
+    now = time.monotonic()
+    if _health_cache and now - _health_cache[0] < HEALTH_CACHE_TTL:
+        return _health_cache[1]
+    
     try:
-        # Check MongoDB connection
-        webhook_processor.db.command("ping")
+        # Check MongoDB connection (async ping, bounded so a slow cluster can't hang the probe)
+        await asyncio.wait_for(webhook_processor.async_db.command("ping"), timeout=1.0)
         mongo_connected = True
-    except:
+    except Exception:
         mongo_connected = False
     
     # Check configuration
@@ -250,7 +379,7 @@ async def webhook_health_check():
     
     status = "healthy" if (mongo_connected and has_nylas_config) else "degraded"
     
-    return {
+    result = {
         "status": status,
         "checks": {
             "mongodb_connected": mongo_connected,
@@ -260,3 +389,5 @@ async def webhook_health_check():
         "warnings": [] if has_webhook_secret else ["NYLAS_WEBHOOK_SECRET not set - signature verification disabled"],
         "timestamp": datetime.now().isoformat()
     }
+    _health_cache = (now, result)
+    return result
@@ -4,56 +4,311 @@ Processes CSV catalogues using OpenAI LLM to generate structured product data an
 """
 
 import os
-import json
+import asyncio
+import base64
+import codecs
+import gzip
+import hashlib
+import random
+import orjson
+import numpy as np
 import pandas as pd
-import time
-from typing import Dict, Any, List, Tuple
-from openai import OpenAI
+import pyarrow as pa
+import pyarrow.parquet as pq
+from aiolimiter import AsyncLimiter
+from typing import Dict, Any, Iterator, List, Optional, Set, Tuple
+from openai import RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
 from datetime import datetime
+from utils.redis_client import redis_client
+from utils.openai_client import async_openai_client
+
+AI_MODEL = "gpt-4o"
+
+# Maximum OpenAI calls in flight at once across all catalogue batches
+AI_CONCURRENCY = int(os.getenv("AI_CATALOGUE_CONCURRENCY", 10))
+
+# Account limits; calls wait for capacity up front instead of bouncing off 429s
+OPENAI_MAX_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_MAX_REQUESTS_PER_MINUTE", 500))
+OPENAI_MAX_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_MAX_TOKENS_PER_MINUTE", 30000))
+
+# Transient OpenAI failures (429 / timeouts / connection drops / 5xx) retried with backoff
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+MAX_API_ATTEMPTS = 3
+
+# Products per OpenAI standardization call (one CSV chunk per batch): as many as the
+# completion budget allows, so the instruction prefix is sent once per ~40 products.
+# A standardized product (names, price_details, specs, image URLs) measures ~400-800
+# characters of JSON, i.e. 100-200 tokens; budget for the high end so completions
+# aren't cut off mid-array
+STANDARDIZATION_MAX_TOKENS = 8000
+OUTPUT_TOKENS_PER_PRODUCT = int(os.getenv("AI_OUTPUT_TOKENS_PER_PRODUCT", 200))
+PRODUCT_BATCH_SIZE = max(1, min(60, STANDARDIZATION_MAX_TOKENS // OUTPUT_TOKENS_PER_PRODUCT))
+
+# No-AI fallback column classification (name/category candidates in priority order)
+FALLBACK_NAME_COLS = ('name', 'product_name', 'item_name', 'product', 'item')
+FALLBACK_CATEGORY_COLS = ('category', 'type', 'class', 'group')
+IMG_KEYWORDS = frozenset({'image', 'photo', 'picture', 'img', 'thumbnail'})
+
+
+def _widen_arrow_type(a: pa.DataType, b: pa.DataType) -> pa.DataType:
+    """Narrowest type that holds values of both a and b (Parquet chunk schemas)"""
+    if a == b or pa.types.is_null(b):
+        return a
+    if pa.types.is_null(a):
+        return b
+    if pa.types.is_integer(a) and pa.types.is_integer(b):
+        return pa.from_numpy_dtype(np.promote_types(a.to_pandas_dtype(), b.to_pandas_dtype()))
+    if (pa.types.is_integer(a) or pa.types.is_floating(a)) and (pa.types.is_integer(b) or pa.types.is_floating(b)):
+        return pa.float64()
+    if pa.types.is_dictionary(a) and pa.types.is_dictionary(b):
+        # Category columns in every chunk stay categories (chunk dictionaries differ in size)
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+def _is_image_column(column: str) -> bool:
+    """Exact word match first (e.g. "Image URL"), then substring (e.g. "ProductImage")"""
+    lowered = str(column).lower()
+    return not IMG_KEYWORDS.isdisjoint(lowered.replace('_', ' ').split()) or any(kw in lowered for kw in IMG_KEYWORDS)
+
+
+# Rows per chunk when converting a catalogue CSV to its Parquet sibling
+PARQUET_CONVERT_CHUNK_ROWS = 1_000_000
+
+# Object columns with at most this share of distinct values are stored as categories
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+# Fixed instruction prefix for product standardization. It goes in the system message
+# (identical across batches, so it is eligible for server-side prompt caching);
+# only the product rows vary per request
+STANDARDIZATION_INSTRUCTIONS = """You are a product data standardization specialist. Extract meaningful product names and brands.
+
+Standardize these products into a consistent JSON format.
+
+For each product, extract:
+- name: Product name (string) - should be descriptive and meaningful, not just "Product 1"
+- brand: Brand name if identifiable from product name or data (string)
+- category: Product category (string)
+- price_details: Object with {"mrp": number or null, "discount": "percentage" or null, "final_price": number or null}
+- unit: Unit of measurement (piece/kg/meter/etc)
+- specifications: Object with key product specs (DO NOT include Image URL, Page URL, or any image-related fields here)
+- description: Brief description (string)
+- image_url: Primary product image URL (string or empty string) - check for Image URL, photo, picture columns
+- images: Array of additional image URLs (array of strings, can be empty)
+
+Products are given as CSV rows without a header: each row is one product, fields in the order of the Columns line below.
+
+IMPORTANT:
+1. Extract brand from product name (e.g., "Voltas IntelliCool" → brand: "Voltas")
+2. Move all image/photo URLs to image_url and images fields, NOT in specifications
+3. Parse price data into price_details structure with mrp, discount, final_price
+4. Generate meaningful product names, not generic "Product 1", "Product 2"
+
+Return a JSON array with all products in this standardized format."""
+
+# OpenAI Batch API (opt-in per catalogue): status polling for submitted jobs
+BATCH_POLL_INTERVAL = int(os.getenv("OPENAI_BATCH_POLL_SECONDS", 30))
+BATCH_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# LLM results cached by prompt hash (model is part of the key), so repeated
+# catalogues and identical product batches skip the OpenAI round-trip
+AI_CACHE_TTL = 86400  # 24 hours
+
+
+def _ai_cache_key(kind: str, content: str) -> str:
+    return f"ai:{kind}:{AI_MODEL}:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+def _request_cache_key(request: Dict[str, Any]) -> str:
+    """Standardization cache key covering both the instructions and the product rows"""
+    return _ai_cache_key("products", "\n".join(message["content"] for message in request["messages"]))
+
+
+async def _cache_get(key: str) -> Any:
+    """Cached value, or None on a miss or when Redis is unavailable"""
+    try:
+        cached = await redis_client.get(key)
+    except Exception as e:
+        print(f"⚠️ AI cache read failed: {e}")
+        return None
+    return None if cached is None else orjson.loads(cached)
+
+
+async def _cache_set(key: str, value: Any):
+    try:
+        await redis_client.setex(key, AI_CACHE_TTL, orjson.dumps(value))
+    except Exception as e:
+        print(f"⚠️ AI cache write failed: {e}")
 
 
 class AICatalogueService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = async_openai_client
+        self._sem = asyncio.Semaphore(AI_CONCURRENCY)
+        self._request_limiter = AsyncLimiter(OPENAI_MAX_REQUESTS_PER_MINUTE, time_period=60)
+        self._token_limiter = AsyncLimiter(OPENAI_MAX_TOKENS_PER_MINUTE, time_period=60)
     
-    def read_csv_file(self, csv_path: str) -> pd.DataFrame:
-        """Read CSV file with error handling"""
+    async def _reserve_capacity(self, kwargs: Dict[str, Any]):
+        """Wait until the request and its estimated tokens (~4 chars/token + completion) fit the per-minute limits"""
+        prompt_chars = sum(len(message["content"]) for message in kwargs["messages"])
+        estimated_tokens = min(prompt_chars // 4 + kwargs.get("max_tokens", 0), OPENAI_MAX_TOKENS_PER_MINUTE)
+        await self._request_limiter.acquire()
+        await self._token_limiter.acquire(estimated_tokens)
+    
+    async def _call_with_retry(self, **kwargs):
+        """Chat completion with exponential backoff (1s, 2s + jitter) on transient errors"""
+        for attempt in range(MAX_API_ATTEMPTS):
+            try:
+                await self._reserve_capacity(kwargs)
+                async with self._sem:
+                    return await self.client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_API_ATTEMPTS - 1:
+                    raise
+                delay = 2 ** attempt + random.random()
+                print(f"⚠️ OpenAI {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{MAX_API_ATTEMPTS})")
+                await asyncio.sleep(delay)
+    
+    def detect_csv_encoding(self, csv_path: str) -> str:
+        """UTF-8 if the whole file decodes as UTF-8 (checked in 1 MB blocks), else latin1"""
+        decoder = codecs.getincrementaldecoder("utf-8")()
         try:
-            # Try different encodings
-            for encoding in ['utf-8', 'latin1', 'iso-8859-1']:
-                try:
-                    df = pd.read_csv(csv_path, encoding=encoding)
-                    print(f"✅ CSV loaded with {encoding} encoding: {len(df)} rows")
-                    return df
-                except UnicodeDecodeError:
-                    continue
+            with open(csv_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    decoder.decode(block)
+                decoder.decode(b"", final=True)
+            return "utf-8"
+        except UnicodeDecodeError:
+            return "latin1"  # Decodes any byte sequence
+        except OSError as e:
+            raise Exception(f"CSV read error: {str(e)}")
+    
+    def _optimize_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Downcast integer columns and store repetitive text columns as categories"""
+        for col in df.select_dtypes(include="integer").columns:
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+        for col in df.select_dtypes(include="object").columns:
+            if len(df) and df[col].nunique() / len(df) <= CATEGORY_MAX_UNIQUE_RATIO:
+                df[col] = df[col].astype("category")
+        return df
+    
+    def _maybe_convert_to_parquet(self, csv_path: str) -> Optional[str]:
+        """
+        Parquet sibling of the CSV (csv_path + '.parquet'), written on first read
+        Re-processing the same catalogue then loads typed, columnar data instead of
+        re-parsing text. Returns None if conversion fails (callers fall back to the CSV)
+        """
+        parquet_path = csv_path + ".parquet"
+        if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path):
+            return parquet_path
+        
+        encoding = self.detect_csv_encoding(csv_path)
+        tmp_path = parquet_path + ".tmp"
+        try:
+            schema = self._parquet_schema(csv_path, encoding)
+            if schema is None:
+                return None  # Header-only CSV, nothing to cache
+            
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for chunk in pd.read_csv(csv_path, encoding=encoding, chunksize=PARQUET_CONVERT_CHUNK_ROWS):
+                    writer.write_table(self._conform_chunk(chunk, schema))
             
-            raise Exception("Failed to read CSV with any encoding")
+            os.replace(tmp_path, parquet_path)
+            print(f"✅ Catalogue cached as Parquet: {os.path.basename(parquet_path)}")
+            return parquet_path
+        except Exception as e:
+            print(f"⚠️ Parquet conversion failed, reading CSV directly: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+    
+    def _parquet_schema(self, csv_path: str, encoding: str) -> Optional[pa.Schema]:
+        """
+        One Parquet schema that fits every chunk of the CSV (None if it has no rows)
+        Each chunk's optimized types are widened into the running schema, so a later
+        chunk with larger integers, decimals or free text doesn't overflow or fail
+        """
+        schema = None
+        for chunk in pd.read_csv(csv_path, encoding=encoding, chunksize=PARQUET_CONVERT_CHUNK_ROWS):
+            chunk_schema = pa.Schema.from_pandas(self._optimize_dtypes(chunk), preserve_index=False)
+            if schema is None:
+                schema = chunk_schema
+            else:
+                schema = pa.schema([
+                    pa.field(field.name, _widen_arrow_type(field.type, chunk_schema.field(field.name).type))
+                    for field in schema
+                ])
+        return schema
+    
+    def _conform_chunk(self, chunk: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+        """Arrow table of a CSV chunk, cast to the file-wide schema"""
+        for field in schema:
+            if pa.types.is_string(field.type) or pa.types.is_large_string(field.type) or pa.types.is_dictionary(field.type):
+                # Mixed or numeric-looking cells become text (missing values stay null)
+                chunk[field.name] = chunk[field.name].astype("string")
+        return pa.Table.from_pandas(chunk, preserve_index=False).cast(schema)
+    
+    def open_catalogue(self, csv_path: str) -> Tuple[str, Optional[str]]:
+        """(source path, encoding) to read products from; encoding is None for Parquet"""
+        parquet_path = self._maybe_convert_to_parquet(csv_path)
+        if parquet_path:
+            return parquet_path, None
+        return csv_path, self.detect_csv_encoding(csv_path)
+    
+    def read_csv_head(self, source: str, encoding: Optional[str], nrows: int = 100) -> pd.DataFrame:
+        """Read only the first rows of the catalogue (enough for the summary prompt)"""
+        try:
+            if encoding is None:
+                parquet_file = pq.ParquetFile(source)
+                batch = next(parquet_file.iter_batches(batch_size=nrows), None)
+                table = pa.Table.from_batches([batch]) if batch is not None else parquet_file.schema_arrow.empty_table()
+                df = table.to_pandas()
+            else:
+                df = pd.read_csv(source, encoding=encoding, nrows=nrows)
+            print(f"✅ Catalogue head loaded from {os.path.basename(source)}: {len(df)} rows")
+            return df
         except Exception as e:
             raise Exception(f"CSV read error: {str(e)}")
     
-    def convert_csv_to_text(self, df: pd.DataFrame, max_rows: int = 100) -> str:
-        """Convert DataFrame to structured text for LLM processing"""
-        # Get column names
-        columns = df.columns.tolist()
+    def iter_csv_chunks(self, source: str, encoding: Optional[str], chunksize: int = PRODUCT_BATCH_SIZE) -> Iterator[pd.DataFrame]:
+        """Stream the catalogue in chunks; the index keeps counting across chunks"""
+        if encoding is not None:
+            yield from pd.read_csv(source, encoding=encoding, chunksize=chunksize)
+            return
         
-        # Limit rows for LLM context window
-        sample_df = df.head(max_rows)
+        start = 0
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize):
+            chunk = batch.to_pandas()
+            chunk.index = range(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
+    
+    def count_csv_rows(self, source: str, encoding: Optional[str]) -> int:
+        """Count data rows without materializing the catalogue"""
+        if encoding is None:
+            return pq.ParquetFile(source).metadata.num_rows
+        return sum(len(chunk) for chunk in pd.read_csv(source, encoding=encoding, usecols=[0], chunksize=100_000))
+    
+    def convert_csv_to_text(self, sample_df: pd.DataFrame, total_rows: int) -> str:
+        """Convert the head of the catalogue to structured text for LLM processing"""
+        # Get column names
+        columns = sample_df.columns.tolist()
+        max_rows = len(sample_df)
         
         # Create structured text representation
-        text_representation = f"Catalogue with {len(df)} products\n\n"
+        text_representation = f"Catalogue with {total_rows} products\n\n"
         text_representation += f"Columns: {', '.join(columns)}\n\n"
         text_representation += "Product Data:\n"
         
-        for idx, row in sample_df.iterrows():
-            text_representation += f"\nProduct {idx + 1}:\n"
-            for col in columns:
-                value = row[col]
-                if pd.notna(value):  # Skip NaN values
-                    text_representation += f"  {col}: {value}\n"
+        # Records with NaN cells turned into None (skipped below), built in one pass
+        records = sample_df.astype(object).where(sample_df.notna(), None).to_dict(orient="records")
+        text_representation += "".join(
+            f"\nProduct {i + 1}:\n" + "".join(f"  {col}: {value}\n" for col, value in record.items() if value is not None)
+            for i, record in enumerate(records)
+        )
         
-        if len(df) > max_rows:
-            text_representation += f"\n... and {len(df) - max_rows} more products"
+        if total_rows > max_rows:
+            text_representation += f"\n... and {total_rows - max_rows} more products"
         
         return text_representation
     
@@ -64,6 +319,12 @@ class AICatalogueService:
         try:
             company_name = vendor_info.get('company_name', 'Unknown Vendor')
             
+            cache_key = _ai_cache_key("summary", csv_text[:4096] + company_name)
+            cached = await _cache_get(cache_key)
+            if cached is not None:
+                print("✅ AI summary served from cache")
+                return cached
+            
             prompt = f"""You are analyzing a product catalogue for a vendor company.
 
 Based on the catalogue data below, generate a VERY BRIEF summary (1-2 sentences only) describing:
@@ -77,8 +338,8 @@ Catalogue Data:
 {csv_text}
 """
             
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
+            response = await self._call_with_retry(
+                model=AI_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a business analyst. Provide brief, concise summaries only."},
                     {"role": "user", "content": prompt}
@@ -88,6 +349,7 @@ Catalogue Data:
             )
             
             summary = response.choices[0].message.content.strip()
+            await _cache_set(cache_key, summary)
             print(f"✅ AI summary generated: {len(summary)} characters")
             return summary
             
@@ -99,10 +361,16 @@ Catalogue Data:
         self, 
         csv_path: str, 
         vendor_id: str,
-        vendor_info: Dict[str, Any]
+        vendor_info: Dict[str, Any],
+        use_batch_api: bool = False,
+        include_raw: bool = False
     ) -> Tuple[Dict[str, Any], float]:
         """
         Process catalogue CSV using AI to generate structured data
+        With use_batch_api, standardized products are taken from a Batch API job already
+        run by submit_standardization_batch / collect_standardization_batch (cheaper, but
+        results can take up to 24h). With include_raw, fallback products
+        keep their source row as raw_data_gz (base64 gzipped JSON)
         
         Returns:
             Tuple[Dict[str, Any], float]: (processed_data, confidence_score)
@@ -127,7 +395,7 @@ Catalogue Data:
                     "price": "1000",
                     "unit": "piece",
                     "description": "...",
-                    "raw_data": {...}
+                    "raw_data_gz": "H4sI..."  # only with include_raw
                 }
             ],
             "total_products": 100,
@@ -137,24 +405,32 @@ Catalogue Data:
         try:
             print(f"🔄 Processing catalogue: {csv_path}")
             
-            # Step 1: Read CSV
-            df = self.read_csv_file(csv_path)
-            total_products = len(df)
+            # Step 1: Read the catalogue head (products are streamed in chunks later);
+            # Parquet conversion and pandas reads are blocking, so they run in threads
+            source, encoding = await asyncio.to_thread(self.open_catalogue, csv_path)
+            head_df = await asyncio.to_thread(self.read_csv_head, source, encoding, 100)
+            if len(head_df) < 100:
+                total_products = len(head_df)
+            else:
+                total_products = await asyncio.to_thread(self.count_csv_rows, source, encoding)
             
             # Step 2: Convert to text for AI processing
-            csv_text = self.convert_csv_to_text(df, max_rows=100)
-            
-            # Step 3: Generate AI summary
-            ai_summary = await self.generate_ai_summary(csv_text, vendor_info)
+            csv_text = self.convert_csv_to_text(head_df, total_products)
+            del head_df
             
-            # Step 4: Process products with AI standardization
-            products = await self._process_products_with_ai(df, vendor_id)
+            # Steps 3 & 4: Generate AI summary and standardize products concurrently
+            # (independent OpenAI calls, so the summary overlaps the product batches)
+            ai_summary, products = await asyncio.gather(
+                self.generate_ai_summary(csv_text, vendor_info),
+                self._process_products_with_ai(source, encoding, vendor_id, use_batch_api, include_raw)
+            )
             
             # Step 5: Create pages (group products into pages of 6 items each)
             pages = self._create_pages(products, items_per_page=6)
             
             # Step 6: Create catalogue structure
-            catalogue_id = f"CAT_{vendor_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            now = datetime.now()
+            catalogue_id = f"CAT_{vendor_id}_{now.strftime('%Y%m%d_%H%M%S')}"
             
             processed_data = {
                 "catalogue_id": catalogue_id,
@@ -165,7 +441,7 @@ Catalogue Data:
                 "products": products,
                 "total_products": total_products,
                 "total_pages": len(pages),
-                "processed_at": datetime.now().isoformat(),
+                "processed_at": now.isoformat(),
                 "csv_filename": os.path.basename(csv_path)
             }
             
@@ -180,200 +456,321 @@ Catalogue Data:
     
     async def _process_products_with_ai(
         self, 
-        df: pd.DataFrame, 
-        vendor_id: str
+        source: str, 
+        encoding: Optional[str],
+        vendor_id: str,
+        use_batch_api: bool = False,
+        include_raw: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Process individual products with AI to standardize format
-        Uses batch processing for efficiency
+        The catalogue is streamed one batch-sized chunk at a time; only the prompts are kept,
+        and batches are sent concurrently (bounded by the client semaphore). With use_batch_api,
+        results come from an already collected Batch API job instead
         """
         products = []
+        batches, system_prompt = await asyncio.to_thread(self._standardization_batches, source, encoding)
         
-        # Get column names for mapping
-        columns = df.columns.tolist()
-        
-        # Process in batches to avoid token limits
-        batch_size = 20
-        for batch_idx in range(0, len(df), batch_size):
-            batch_df = df.iloc[batch_idx:batch_idx + batch_size]
-            
+        if use_batch_api and batches:
             try:
-                # Create batch prompt
-                batch_products_text = self._create_batch_prompt(batch_df, columns)
-                
-                # Call OpenAI to standardize product data
-                standardized_batch = await self._standardize_products_with_ai(
-                    batch_products_text, 
-                    vendor_id,
-                    batch_idx
-                )
-                
-                products.extend(standardized_batch)
-                
+                results = await self._standardize_with_batch_api(batches, system_prompt, vendor_id)
             except Exception as e:
-                print(f"⚠️ Batch {batch_idx}-{batch_idx + batch_size} failed: {e}")
-                # Fallback: process without AI
-                for idx, row in batch_df.iterrows():
-                    product = self._create_product_without_ai(row, vendor_id, idx)
-                    products.append(product)
+                print(f"⚠️ OpenAI batch failed: {e}")
+                results = [e] * len(batches)
+        else:
+            results = await asyncio.gather(*(
+                self._standardize_products_with_ai(prompt, system_prompt, vendor_id, batch_idx)
+                for batch_idx, _, prompt in batches
+            ), return_exceptions=True)
+        
+        failed = set()
+        for (batch_idx, batch_len, _), result in zip(batches, results):
+            if isinstance(result, Exception):
+                print(f"⚠️ Batch {batch_idx}-{batch_idx + batch_len} failed: {result}")
+                failed.add(batch_idx)
+        
+        # Fallback: one streaming pass builds no-AI products for every failed batch
+        fallback = {}
+        if failed:
+            fallback = await asyncio.to_thread(
+                self._fallback_products, source, encoding, failed, vendor_id, include_raw
+            )
+        
+        # Flatten in batch order
+        for (batch_idx, _, _), result in zip(batches, results):
+            products.extend(fallback.get(batch_idx, []) if batch_idx in failed else result)
         
         return products
     
-    def _create_batch_prompt(self, batch_df: pd.DataFrame, columns: List[str]) -> str:
-        """Create structured prompt for batch product processing"""
-        prompt = "Products to standardize:\n\n"
-        
-        for idx, row in batch_df.iterrows():
-            prompt += f"Product {idx + 1}:\n"
-            for col in columns:
-                value = row[col]
-                if pd.notna(value):
-                    prompt += f"  {col}: {value}\n"
-            prompt += "\n"
+    def _fallback_products(
+        self,
+        source: str,
+        encoding: Optional[str],
+        failed: Set[int],
+        vendor_id: str,
+        include_raw: bool
+    ) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        No-AI products for the failed batches, keyed by batch start row
+        Streams the catalogue once (chunks map 1:1 to batches) and stops after the last failed batch
+        """
+        fallback = {}
+        hints = None  # Fallback column classification, computed on first use
+        last_failed = max(failed)
+        for chunk_df in self.iter_csv_chunks(source, encoding):
+            batch_idx = int(chunk_df.index[0])
+            if batch_idx in failed:
+                hints = hints or self._fallback_column_hints(chunk_df.columns.tolist())
+                fallback[batch_idx] = [
+                    self._create_product_without_ai(row, vendor_id, idx, hints, include_raw)
+                    for idx, row in chunk_df.iterrows()
+                ]
+            if batch_idx >= last_failed:
+                break
+        return fallback
+    
+    def _standardization_batches(self, source: str, encoding: Optional[str]) -> Tuple[List[Tuple[int, int, str]], str]:
+        """
+        One (start row, row count, prompt) per catalogue chunk (chunks map 1:1 to API batches),
+        plus the shared system prompt carrying the column schema
+        """
+        batches = []
+        system_prompt = STANDARDIZATION_INSTRUCTIONS
+        for chunk_df in self.iter_csv_chunks(source, encoding):
+            batch_idx = int(chunk_df.index[0])
+            if not batches:
+                system_prompt = self._standardization_system_prompt(chunk_df)
+            batches.append((batch_idx, len(chunk_df), self._create_batch_prompt(chunk_df)))
+            del chunk_df
+        return batches, system_prompt
+    
+    def _standardization_system_prompt(self, batch_df: pd.DataFrame) -> str:
+        """Instructions plus the column schema; identical for every batch of a catalogue"""
+        columns = batch_df.head(0).to_csv(index=False).strip()
+        return f"{STANDARDIZATION_INSTRUCTIONS}\n\nColumns: {columns}"
+    
+    def _create_batch_prompt(self, batch_df: pd.DataFrame) -> str:
+        """Create prompt for batch product processing (positional CSV rows, schema is in the system prompt)"""
+        return "Rows (CSV):\n" + batch_df.to_csv(index=False, header=False)
+    
+    def _standardization_request(self, products_text: str, system_prompt: str) -> Dict[str, Any]:
+        """Chat completion arguments for one batch (shared by the live and Batch API paths)"""
+        return {
+            "model": AI_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": products_text}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.3,
+            "max_tokens": STANDARDIZATION_MAX_TOKENS
+        }
+    
+    def _finalize_products(
+        self, 
+        standardized_products: List[Dict[str, Any]], 
+        vendor_id: str,
+        batch_start_idx: int
+    ) -> List[Dict[str, Any]]:
+        """Add product IDs, vendor_id, and ensure all required fields exist"""
+        for idx, product in enumerate(standardized_products):
+            product['product_id'] = f"PROD_{vendor_id}_{batch_start_idx + idx + 1:04d}"
+            product['vendor_id'] = vendor_id
+            
+            # Ensure brand field exists
+            if 'brand' not in product:
+                product['brand'] = ""
+            
+            # Ensure price_details structure exists
+            if 'price_details' not in product:
+                product['price_details'] = {"mrp": None, "discount": None, "final_price": None}
+            
+            # Ensure image fields exist
+            if 'image_url' not in product:
+                product['image_url'] = ""
+            if 'images' not in product:
+                product['images'] = []
         
-        return prompt
+        return standardized_products
     
     async def _standardize_products_with_ai(
         self, 
         products_text: str, 
+        system_prompt: str,
         vendor_id: str,
         batch_start_idx: int
     ) -> List[Dict[str, Any]]:
         """
         Use AI to standardize product data format with retry logic
+        (transient API errors are retried in _call_with_retry; malformed JSON is re-requested here)
         """
         max_retries = 4
         retry_delay = 1  # seconds
+        request = self._standardization_request(products_text, system_prompt)
+        cache_key = _request_cache_key(request)
         
         for attempt in range(max_retries):
             try:
-                prompt = f"""Standardize these products into a consistent JSON format.
-
-For each product, extract:
-- name: Product name (string) - should be descriptive and meaningful, not just "Product 1"
-- brand: Brand name if identifiable from product name or data (string)
-- category: Product category (string)
-- price_details: Object with {{"mrp": number or null, "discount": "percentage" or null, "final_price": number or null}}
-- unit: Unit of measurement (piece/kg/meter/etc)
-- specifications: Object with key product specs (DO NOT include Image URL, Page URL, or any image-related fields here)
-- description: Brief description (string)
-- image_url: Primary product image URL (string or empty string) - check for Image URL, photo, picture columns
-- images: Array of additional image URLs (array of strings, can be empty)
-
-IMPORTANT:
-1. Extract brand from product name (e.g., "Voltas IntelliCool" → brand: "Voltas")
-2. Move all image/photo URLs to image_url and images fields, NOT in specifications
-3. Parse price data into price_details structure with mrp, discount, final_price
-4. Generate meaningful product names, not generic "Product 1", "Product 2"
-
-Return a JSON array with all products in this standardized format.
-
-{products_text}
-"""
-                
-                response = self.client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are a product data standardization specialist. Extract meaningful product names and brands."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.3,
-                    max_tokens=4000
-                )
+                standardized_products = await _cache_get(cache_key)
                 
-                result = json.loads(response.choices[0].message.content)
-                standardized_products = result.get('products', [])
-                
-                # Add product IDs, vendor_id, and ensure all required fields exist
-                for idx, product in enumerate(standardized_products):
-                    product['product_id'] = f"PROD_{vendor_id}_{batch_start_idx + idx + 1:04d}"
-                    product['vendor_id'] = vendor_id
-                    
-                    # Ensure brand field exists
-                    if 'brand' not in product:
-                        product['brand'] = ""
-                    
-                    # Ensure price_details structure exists
-                    if 'price_details' not in product:
-                        product['price_details'] = {"mrp": None, "discount": None, "final_price": None}
+                if standardized_products is None:
+                    response = await self._call_with_retry(**request)
+                    choice = response.choices[0]
+                    if choice.finish_reason == "length":
+                        # Re-asking would be cut off the same way; go straight to the fallback
+                        raise ValueError(f"completion truncated at {STANDARDIZATION_MAX_TOKENS} tokens")
                     
-                    # Ensure image fields exist
-                    if 'image_url' not in product:
-                        product['image_url'] = ""
-                    if 'images' not in product:
-                        product['images'] = []
+                    result = orjson.loads(choice.message.content)
+                    standardized_products = result.get('products', [])
+                    await _cache_set(cache_key, standardized_products)
                 
-                return standardized_products
+                return self._finalize_products(standardized_products, vendor_id, batch_start_idx)
                 
-            except json.JSONDecodeError as e:
+            except orjson.JSONDecodeError as e:
                 print(f"⚠️ Attempt {attempt + 1}/{max_retries} - JSON parse error: {e}")
                 if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))  # Exponential backoff
+                    await asyncio.sleep(retry_delay * (attempt + 1))  # Exponential backoff
                     continue
                 else:
                     print(f"❌ AI standardization failed after {max_retries} attempts")
                     raise
                     
             except Exception as e:
-                print(f"⚠️ Attempt {attempt + 1}/{max_retries} - AI standardization error: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))  # Exponential backoff
-                    continue
-                else:
-                    print(f"❌ AI standardization failed after {max_retries} attempts")
-                    raise
+                print(f"❌ AI standardization error: {e}")
+                raise
+    
+    async def submit_standardization_batch(self, csv_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Submit the catalogue's uncached standardization requests as one OpenAI Batch API job
+        (half price, separate quota) without waiting for it
+        
+        Returns the job to pass to collect_standardization_batch, or None when every
+        batch is already cached and the catalogue can be processed right away
+        """
+        source, encoding = await asyncio.to_thread(self.open_catalogue, csv_path)
+        batches, system_prompt = await asyncio.to_thread(self._standardization_batches, source, encoding)
+        requests = {}
+        for _, _, prompt in batches:
+            request = self._standardization_request(prompt, system_prompt)
+            requests[_request_cache_key(request)] = request
+        
+        cached = await asyncio.gather(*(_cache_get(key) for key in requests))
+        misses = {key: request for (key, request), products in zip(requests.items(), cached) if products is None}
+        if not misses:
+            return None
+        
+        jsonl = b"\n".join(
+            orjson.dumps({"custom_id": f"batch_{i}", "method": "POST", "url": "/v1/chat/completions", "body": body})
+            for i, body in enumerate(misses.values())
+        )
+        input_file = await self.client.files.create(file=("catalogue_batch.jsonl", jsonl), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"📦 OpenAI batch submitted: {batch.id} ({len(misses)} requests)")
+        return {"batch_id": batch.id, "cache_keys": list(misses)}
+    
+    async def collect_standardization_batch(self, job: Dict[str, Any]) -> bool:
+        """
+        Check a submitted Batch API job; False while it is still running
+        
+        Once it has ended, each successful result is cached under its request key, where
+        process_catalogue_with_ai(use_batch_api=True) picks it up (failed requests fall
+        back to no-AI products there), and True is returned
+        """
+        batch = await self.client.batches.retrieve(job["batch_id"])
+        if batch.status not in BATCH_TERMINAL_STATUSES:
+            return False
+        
+        if batch.status != "completed" or not batch.output_file_id:
+            print(f"⚠️ OpenAI batch {batch.id} ended with status {batch.status}")
+            return True
+        
+        output = await self.client.files.content(batch.output_file_id)
+        cache_keys = job["cache_keys"]
+        stored = 0
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            entry = orjson.loads(line)
+            i = int(entry["custom_id"].split("_", 1)[1])
+            try:
+                response = entry.get("response") or {}
+                if response.get("status_code") != 200:
+                    raise Exception(entry.get("error") or f"HTTP {response.get('status_code')}")
+                choice = response["body"]["choices"][0]
+                if choice.get("finish_reason") == "length":
+                    raise ValueError(f"completion truncated at {STANDARDIZATION_MAX_TOKENS} tokens")
+                await _cache_set(cache_keys[i], orjson.loads(choice["message"]["content"]).get('products', []))
+                stored += 1
+            except Exception as e:
+                print(f"⚠️ OpenAI batch {batch.id} request {i} failed: {e}")
+        
+        print(f"✅ OpenAI batch {batch.id} completed: {stored}/{len(cache_keys)} results")
+        return True
+    
+    async def _standardize_with_batch_api(
+        self, 
+        batches: List[Tuple[int, int, str]], 
+        system_prompt: str,
+        vendor_id: str
+    ) -> List[Any]:
+        """
+        Standardized products of a collected Batch API job, read back from the cache
+        Returns one result per batch, in order: a product list, or an Exception for a batch
+        the job returned nothing for
+        """
+        requests = [self._standardization_request(prompt, system_prompt) for _, _, prompt in batches]
+        cached = await asyncio.gather(*(_cache_get(_request_cache_key(request)) for request in requests))
+        
+        return [
+            Exception("No result returned by Batch API") if products is None
+            else self._finalize_products(products, vendor_id, batch_idx)
+            for (batch_idx, _, _), products in zip(batches, cached)
+        ]
+    
+    def _fallback_column_hints(self, columns: List[str]) -> Dict[str, Any]:
+        """
+        Classify catalogue columns once for the no-AI fallback
+        Name/category candidates keep their priority order; image columns are split out of the specs
+        """
+        column_set = frozenset(columns)
+        image_cols = [col for col in columns if _is_image_column(col)]
+        image_set = frozenset(image_cols)
+        return {
+            "name_cols": [col for col in FALLBACK_NAME_COLS if col in column_set],
+            "category_cols": [col for col in FALLBACK_CATEGORY_COLS if col in column_set],
+            "image_cols": image_cols,
+            "spec_cols": [col for col in columns if col not in image_set]
+        }
     
     def _create_product_without_ai(
         self, 
         row: pd.Series, 
         vendor_id: str, 
-        idx: int
+        idx: int,
+        hints: Optional[Dict[str, Any]] = None,
+        include_raw: bool = False
     ) -> Dict[str, Any]:
-        """Fallback: create product without AI processing"""
+        """Fallback: create product without AI processing (hints from _fallback_column_hints)"""
         product_id = f"PROD_{vendor_id}_{idx + 1:04d}"
+        hints = hints or self._fallback_column_hints(row.index.tolist())
         
-        # Try to extract common fields
-        row_dict = row.to_dict()
+        # Non-null cells only, computed once per row
+        present = row.dropna().to_dict()
         
-        # Common column name variations
-        name_cols = ['name', 'product_name', 'item_name', 'product', 'item']
-        price_cols = ['price', 'cost', 'rate', 'amount']
-        category_cols = ['category', 'type', 'class', 'group']
+        name = next((str(present[col]) for col in hints["name_cols"] if col in present), None)
+        category = next((str(present[col]) for col in hints["category_cols"] if col in present), None)
         
-        name = None
-        for col in name_cols:
-            if col in row_dict and pd.notna(row_dict[col]):
-                name = str(row_dict[col])
-                break
-        
-        price = None
-        for col in price_cols:
-            if col in row_dict and pd.notna(row_dict[col]):
-                price = str(row_dict[col])
-                break
+        # Image URLs go to image_url/images, everything else to specifications
+        specs = {col: str(present[col]) for col in hints["spec_cols"] if col in present}
+        urls = [str(present[col]) for col in hints["image_cols"] if col in present]
+        image_url = urls[0] if urls else ""
+        images = urls[1:]
         
-        category = None
-        for col in category_cols:
-            if col in row_dict and pd.notna(row_dict[col]):
-                category = str(row_dict[col])
-                break
-        
-        # Extract image URLs from specifications
-        specs = {k: str(v) for k, v in row_dict.items() if pd.notna(v)}
-        image_url = ""
-        images = []
-        
-        # Check for image-related columns
-        for key in list(specs.keys()):
-            if any(img_keyword in key.lower() for img_keyword in ['image', 'photo', 'picture', 'img']):
-                url = specs.pop(key)
-                if not image_url:
-                    image_url = url
-                else:
-                    images.append(url)
-        
-        return {
+        product = {
             "product_id": product_id,
             "vendor_id": vendor_id,
             "name": name or f"Product {idx + 1}",
@@ -384,9 +781,16 @@ Return a JSON array with all products in this standardized format.
             "specifications": specs,
             "description": "",
             "image_url": image_url,
-            "images": images,
-            "raw_data": row_dict
+            "images": images
         }
+        
+        # Source row only on request, compressed (the specs above already hold its values)
+        if include_raw:
+            product["raw_data_gz"] = base64.b64encode(
+                gzip.compress(orjson.dumps(row.to_dict(), default=str))
+            ).decode()
+        
+        return product
     
     def _create_pages(
         self, 
@@ -408,3 +812,7 @@ Return a JSON array with all products in this standardized format.
             pages.append(page)
         
         return pages
+
+
+# Singleton instance shared by all routers
+ai_catalogue_service = AICatalogueService()
@@ -3,10 +3,47 @@ Nylas API Integration Service
 Handles email fetching and attachment downloads from Nylas
 """
 import os
+import base64
+import functools
+import logging
+import shutil
+import asyncio
+import aiofiles
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import TTLCache
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# Attachment downloads in flight at once per service instance
+DOWNLOAD_CONCURRENCY = 10
+
+# Block size for streaming attachments to disk (fewer, larger writes)
+DOWNLOAD_BLOCK_SIZE = 1 << 20  # 1 MB
+
+# Async GETs retry throttled/failed requests like the sync session's Retry adapter:
+# 3 retries with 0.5s/1s/2s backoff, or the server's Retry-After when it sends one
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5  # seconds, doubled per retry
+MAX_RETRY_AFTER = 30.0  # seconds
+
+
+@functools.lru_cache(maxsize=1024)
+def _decode_filename(attachment_id: str) -> str:
+    """Filename encoded in a Nylas v3 attachment ID (format: v0:base64_filename:base64_content_type:size)"""
+    try:
+        parts = attachment_id.split(':', 2)
+        if len(parts) >= 2:
+            return base64.b64decode(parts[1]).decode('utf-8')
+    except Exception:
+        pass
+    return f"attachment_{attachment_id[:20]}"
+
 
 class NylasService:
     """Service for interacting with Nylas API"""
@@ -25,6 +62,33 @@ class NylasService:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        
+        # Pooled keep-alive session: TCP/TLS handshakes to the Nylas host are reused across calls,
+        # and transient 429/5xx responses are retried with backoff
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=20,
+            pool_maxsize=20,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+        
+        self._aclient: Optional[httpx.AsyncClient] = None
+        
+        # Recently fetched message details keyed by (message_id, fields); failures are not cached
+        self._details_cache = TTLCache(maxsize=512, ttl=300)
+    
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        """Async HTTP/2 client for concurrent downloads, created on first use"""
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                http2=True,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(max_connections=20),
+                timeout=httpx.Timeout(30.0, connect=5.0)
+            )
+        return self._aclient
     
     def fetch_emails(self, limit: int = 1000, subject_filter: str = "VENDOR REGISTRATION") -> List[Dict[str, Any]]:
         """
@@ -52,7 +116,7 @@ class NylasService:
                 if next_cursor:
                     params["page_token"] = next_cursor
                 
-                response = requests.get(url, headers=self.headers, params=params)
+                response = self.session.get(url, params=params)
                 
                 if response.status_code != 200:
                     print(f"Error fetching emails: {response.status_code} - {response.text}")
@@ -79,26 +143,96 @@ class NylasService:
             print(f"Error in fetch_emails: {str(e)}")
             raise
     
-    def get_email_details(self, message_id: str) -> Optional[Dict[str, Any]]:
+    async def _aget_with_retry(self, url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """Async GET, retrying 429/5xx responses and transport errors with backoff"""
+        for attempt in range(MAX_RETRIES + 1):
+            delay = RETRY_BACKOFF * 2 ** attempt
+            try:
+                response = await self.aclient.get(url, params=params, headers={"Accept": "application/json"})
+            except httpx.TransportError:
+                if attempt == MAX_RETRIES:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    return response
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = min(float(retry_after), MAX_RETRY_AFTER)
+            await asyncio.sleep(delay)
+    
+    async def _get_page(self, url: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """One page of a Nylas list endpoint (full JSON body), or None on error"""
+        response = await self._aget_with_retry(url, params)
+        if response.status_code != 200:
+            print(f"Error fetching emails: {response.status_code} - {response.text}")
+            return None
+        return response.json()
+    
+    async def fetch_emails_async(self, limit: int = 1000, subject_filter: str = "VENDOR REGISTRATION") -> List[Dict[str, Any]]:
+        """
+        Async version of fetch_emails
+        Pages are requested at the API maximum (200); each request needs the previous
+        page's cursor, so pages are fetched one after another
+        
+        Args:
+            limit: Maximum number of emails to fetch
+            subject_filter: Subject line filter
+            
+        Returns:
+            List of email objects
+        """
+        url = f"{self.base_url}/v3/grants/{self.grant_id}/messages"
+        params = {
+            "limit": min(limit, 200),  # Nylas has per-request limits
+            "subject": subject_filter
+        }
+        
+        all_emails = []
+        page = await self._get_page(url, params)
+        
+        while page is not None:
+            emails = page.get("data", [])
+            next_cursor = page.get("next_cursor")
+            all_emails.extend(emails)
+            
+            if not next_cursor or not emails or len(all_emails) >= limit:
+                break
+            page = await self._get_page(url, {**params, "page_token": next_cursor})
+        
+        all_emails = all_emails[:limit]
+        print(f"Fetched {len(all_emails)} emails from Nylas")
+        return all_emails
+    
+    def get_email_details(self, message_id: str, fields: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Get detailed information about a specific email
         
         Args:
             message_id: Nylas message ID
+            fields: Comma-separated fields to return (Nylas `select`), e.g. "attachments";
+                    None returns the full message
             
         Returns:
             Email details including body and attachments
         """
+        cache_key = (message_id, fields)
+        cached = self._details_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             url = f"{self.base_url}/v3/grants/{self.grant_id}/messages/{message_id}"
             
-            response = requests.get(url, headers=self.headers)
+            response = self.session.get(url, params={"select": fields} if fields else None)
             
             if response.status_code != 200:
                 print(f"Error fetching email {message_id}: {response.status_code}")
                 return None
             
-            return response.json().get("data")
+            details = response.json().get("data")
+            if details is not None:
+                self._details_cache[cache_key] = details
+            return details
             
         except Exception as e:
             print(f"Error in get_email_details: {str(e)}")
@@ -123,37 +257,25 @@ class NylasService:
             
             # Nylas v3: Attachments are accessed via a different endpoint
             # First, decode the attachment_id to get the filename
-            # Format: v0:base64_filename:base64_content_type:size
-            import base64
-            
-            try:
-                parts = attachment_id.split(':')
-                if len(parts) >= 2:
-                    filename_b64 = parts[1]
-                    filename = base64.b64decode(filename_b64).decode('utf-8')
-                else:
-                    filename = f"attachment_{attachment_id[:20]}"
-            except:
-                filename = f"attachment_{attachment_id[:20]}"
-            
-            print(f"🔍 Decoded filename: {filename}")
+            filename = _decode_filename(attachment_id)
+            logger.debug("Decoded filename: %s", filename)
             
             # Nylas v3 API: Download endpoint (NOT metadata endpoint)
             # GET /v3/grants/{grant_id}/attachments/{attachment_id}/download?message_id={message_id}
             url = f"{self.base_url}/v3/grants/{gid}/attachments/{attachment_id}/download"
             
-            print(f"🔗 Downloading from: {url}")
-            print(f"🔗 Query params: message_id={message_id}")
+            logger.debug("Downloading from: %s (message_id=%s)", url, message_id)
             
             # Set headers for binary download - MUST NOT include Content-Type: application/json
+            # (None drops the session default for this request)
             headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Accept": "*/*"  # Accept any content type
+                "Accept": "*/*",  # Accept any content type
+                "Content-Type": None
             }
             
             params = {"message_id": message_id}
             
-            response = requests.get(url, headers=headers, params=params, stream=True)
+            response = self.session.get(url, headers=headers, params=params, stream=True)
             
             if response.status_code != 200:
                 print(f"❌ Error downloading attachment: {response.status_code}")
@@ -166,13 +288,22 @@ class NylasService:
             # Build full save path
             save_path = os.path.join(save_folder, filename)
             
-            # Write file
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            # Write file in 1 MB blocks straight from the socket (unbuffered: writes are already large)
+            response.raw.decode_content = True
+            content_length = response.headers.get("Content-Length")
+            with open(save_path, 'wb', buffering=0) as f:
+                # Reserve the space up front when the size is known
+                if content_length and content_length.isdigit() and hasattr(os, "posix_fallocate"):
+                    try:
+                        os.posix_fallocate(f.fileno(), 0, int(content_length))
+                    except OSError:
+                        pass
+                shutil.copyfileobj(response.raw, f, length=DOWNLOAD_BLOCK_SIZE)
+                # Content-Length may be the compressed size; trim to what was written
+                size = f.tell()
+                f.truncate(size)
             
-            print(f"✅ Downloaded: {filename} ({os.path.getsize(save_path)} bytes)")
+            print(f"✅ Downloaded: {filename} ({size} bytes)")
             return save_path
             
         except Exception as e:
@@ -181,18 +312,103 @@ class NylasService:
             traceback.print_exc()
             return None
     
-    def get_attachments_info(self, message_id: str) -> List[Dict[str, Any]]:
+    async def _aget(self, url: str, params: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Async GET of a Nylas JSON endpoint; returns the "data" payload or None"""
+        try:
+            response = await self._aget_with_retry(url, params)
+            if response.status_code != 200:
+                print(f"Error fetching {url}: {response.status_code}")
+                return None
+            return response.json().get("data")
+        except Exception as e:
+            print(f"Error in _aget: {str(e)}")
+            return None
+    
+    async def bulk_get_email_details(self, message_ids: List[str], concurrency: int = 10) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Fetch details for many emails concurrently
+        
+        Args:
+            message_ids: Nylas message IDs
+            concurrency: Maximum requests in flight
+            
+        Returns:
+            Mapping of message ID -> email details (None where the fetch failed)
+        """
+        sem = asyncio.Semaphore(concurrency)
+        
+        async def fetch(message_id: str) -> Optional[Dict[str, Any]]:
+            async with sem:
+                return await self._aget(f"{self.base_url}/v3/grants/{self.grant_id}/messages/{message_id}")
+        
+        details = await asyncio.gather(*(fetch(message_id) for message_id in message_ids))
+        return dict(zip(message_ids, details))
+    
+    async def _download_one(self, grant_id: str, message_id: str, attachment_id: str, save_folder: str) -> Optional[str]:
+        """Async version of download_attachment, streamed to disk in 1 MB blocks"""
+        try:
+            gid = grant_id or self.grant_id
+            filename = _decode_filename(attachment_id)
+            url = f"{self.base_url}/v3/grants/{gid}/attachments/{attachment_id}/download"
+            
+            async with self.aclient.stream("GET", url, params={"message_id": message_id}, headers={"Accept": "*/*"}) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    print(f"❌ Error downloading attachment: {response.status_code}")
+                    print(f"   Response: {response.text}")
+                    return None
+                
+                await asyncio.to_thread(os.makedirs, save_folder, exist_ok=True)
+                save_path = os.path.join(save_folder, filename)
+                
+                size = 0
+                async with aiofiles.open(save_path, 'wb') as f:
+                    async for chunk in response.aiter_bytes(DOWNLOAD_BLOCK_SIZE):
+                        size += len(chunk)
+                        await f.write(chunk)
+            
+            print(f"✅ Downloaded: {filename} ({size} bytes)")
+            return save_path
+            
+        except Exception as e:
+            print(f"❌ Error downloading attachment {attachment_id[:20]}: {str(e)}")
+            return None
+    
+    async def download_attachments(self, items: List[Dict[str, Any]], concurrency: int = DOWNLOAD_CONCURRENCY) -> List[Optional[str]]:
+        """
+        Download several attachments concurrently
+        
+        Args:
+            items: Dicts with grant_id, message_id, attachment_id and save_folder
+            concurrency: Maximum downloads in flight
+            
+        Returns:
+            Saved file path (or None on failure) for each item, in order
+        """
+        sem = asyncio.Semaphore(concurrency)
+        
+        async def download(item: Dict[str, Any]) -> Optional[str]:
+            async with sem:
+                return await self._download_one(
+                    item.get("grant_id"), item["message_id"], item["attachment_id"], item["save_folder"]
+                )
+        
+        return list(await asyncio.gather(*(download(item) for item in items)))
+    
+    def get_attachments_info(self, message_id: str, email_details: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Get information about all attachments in an email
         
         Args:
             message_id: Nylas message ID
+            email_details: Already-fetched details (e.g. from bulk_get_email_details); fetched if omitted
             
         Returns:
             List of attachment information dictionaries
         """
         try:
-            email_details = self.get_email_details(message_id)
+            if email_details is None:
+                email_details = self.get_email_details(message_id, fields="attachments")
             
             if not email_details:
                 return []
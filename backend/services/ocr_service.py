@@ -1,14 +1,303 @@
 import os
 import re
-import base64
-import json
-from typing import Dict, Any, Tuple, Optional, List
-from openai import OpenAI
-from PIL import Image
+import asyncio
+import functools
+import pybase64  # SIMD base64 for multi-MB image payloads
+import hashlib
+import orjson
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Tuple, Optional, List, Union
+from PIL import Image, ImageOps
 import io
+import numpy as np
+import aiofiles
 import pytesseract
-from pdf2image import convert_from_path
-from dataclasses import dataclass
+try:
+    from tesserocr import PyTessBaseAPI, PSM
+except ImportError:
+    # Bindings not built (no libtesseract headers in the image); OCR goes through the
+    # tesseract CLI via pytesseract instead
+    PyTessBaseAPI = PSM = None
+import fitz  # PyMuPDF
+from dataclasses import dataclass, asdict
+from cachetools import LRUCache
+from aiolimiter import AsyncLimiter
+from openai import RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
+from utils.redis_client import redis_client
+from utils.openai_client import async_openai_client
+
+# Keep Tesseract single-threaded: OpenMP inside Tesseract slows down single-page
+# OCR and fights concurrent tasks. Scale horizontally via gunicorn workers and
+# the OCR task queue instead.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+# Document number patterns, compiled once at import
+_RE_NON_DIGIT = re.compile(r'\D')
+# PAN format: 5 letters, 4 digits, 1 letter
+_RE_PAN = re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$')
+# GSTIN format: 2 digits (state code) + 10 chars PAN + 1 digit (entity number) + 1 letter (Z by default) + 1 alphanumeric (checksum)
+_RE_GSTIN = re.compile(r'^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}[Z]{1}[0-9A-Z]{1}$')
+# Same numbers as they appear inside free-form Tesseract text, as one alternation so a
+# single linear pass finds all three (word boundaries keep them from overlapping)
+_RE_NUMBERS_IN_TEXT = re.compile(
+    r'\b(?:'
+    r'(?P<gstin>[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}[Z]{1}[0-9A-Z]{1})'
+    r'|(?P<pan>[A-Z]{5}[0-9]{4}[A-Z]{1})'
+    r'|(?P<aadhaar>\d{4}\s*\d{4}\s*\d{4})'
+    r')\b'
+)
+
+# Field extraction prompts (one Vision call per document reads, translates and extracts)
+AADHAAR_EXTRACTION_PROMPT = """Extract the following information from this Aadhaar card image:
+1. Full Name
+2. Aadhaar Number (12-digit number)
+3. Father's Name (if visible)
+4. Date of Birth
+5. Gender
+6. Address
+
+The text may be in any Indian language. Read it in the original script, detect the language,
+and translate the extracted values to English.
+
+Return the information in the following JSON format:
+{
+    "name": "extracted name in English",
+    "name_original": "name in original language if different from English",
+    "aadhaar_number": "extracted aadhaar number",
+    "father_name": "extracted father name in English or null",
+    "father_name_original": "father's name in original language if different from English",
+    "dob": "extracted date of birth in DD/MM/YYYY format",
+    "gender": "Male/Female/Other",
+    "address": "extracted address in English",
+    "address_original": "address in original language if different from English",
+    "detected_language": "language the document is written in",
+    "confidence": 0.0
+}
+
+Keep all numbers, dates, and the Aadhaar number exactly as they appear in the original.
+If any field is not clearly visible or readable, set it to null.
+Provide a confidence score between 0.0 and 1.0 based on image quality and text clarity."""
+
+PAN_EXTRACTION_PROMPT = """Extract the following information from this PAN card image:
+1. Full Name
+2. PAN Number (10-character alphanumeric)
+3. Father's Name
+4. Date of Birth
+
+The text may be in any Indian language. Read it in the original script, detect the language,
+and translate the extracted values to English.
+
+Return the information in the following JSON format:
+{
+    "name": "extracted name in English",
+    "name_original": "name in original language if different from English",
+    "pan_number": "extracted PAN number",
+    "father_name": "extracted father name in English or null",
+    "father_name_original": "father's name in original language if different from English",
+    "dob": "extracted date of birth in DD/MM/YYYY format",
+    "detected_language": "language the document is written in",
+    "confidence": 0.0
+}
+
+Keep all numbers, dates, and the PAN number exactly as they appear in the original.
+If any field is not clearly visible or readable, set it to null.
+Provide a confidence score between 0.0 and 1.0 based on image quality and text clarity."""
+
+GST_EXTRACTION_PROMPT = """Extract the following information from this GST Certificate image:
+1. GSTIN (15-character alphanumeric)
+2. Legal Name of Business
+3. Trade Name (if different)
+4. Address
+5. State
+6. Registration Type
+7. Date of Registration
+8. Constitution of Business
+9. Name (of signing officer/authority)
+10. Designation (of signing officer/authority)
+11. Date of Issue
+
+The text may be in any Indian language. Read it in the original script, detect the language,
+and translate the extracted values to English.
+
+Return the information in the following JSON format:
+{
+    "gstin": "extracted GSTIN number",
+    "business_name": "extracted legal business name in English",
+    "business_name_original": "business name in original language if different from English",
+    "trade_name": "extracted trade name or null",
+    "address": "extracted address in English",
+    "address_original": "address in original language if different from English",
+    "state": "extracted state name",
+    "registration_type": "Regular/Composition/Casual/etc",
+    "date_of_registration": "extracted date in DD/MM/YYYY format",
+    "constitution_of_business": "Proprietorship/Partnership/Company/etc",
+    "name": "name of signing officer/authority",
+    "designation": "designation of signing officer/authority",
+    "date_of_issue": "date of certificate issue in DD/MM/YYYY format",
+    "detected_language": "language the document is written in",
+    "confidence": 0.0
+}
+
+Keep all numbers, dates, and the GSTIN exactly as they appear in the original.
+If any field is not clearly visible or readable, set it to null.
+Provide a confidence score between 0.0 and 1.0 based on image quality and text clarity."""
+
+# Backfill batches: up to this many documents of one type share a single Vision
+# request (one rate-limit hit instead of K), answered as {"results": [...]}
+MULTI_IMAGE_BATCH_SIZE = 4
+MULTI_IMAGE_INSTRUCTIONS = """The {count} images below are separate documents of the same type, in order.
+Apply the instructions that follow to each image independently and return a JSON object
+{{"results": [...]}} holding one result object per image, in the same order.
+
+"""
+
+# Per document type: (prompt, number field, validator method, completion tokens per document)
+_EXTRACTION_SPECS = {
+    "aadhar": (AADHAAR_EXTRACTION_PROMPT, "aadhaar_number", "_validate_aadhaar_number", 500),
+    "pan": (PAN_EXTRACTION_PROMPT, "pan_number", "_validate_pan_number", 500),
+    "gst": (GST_EXTRACTION_PROMPT, "gstin", "_validate_gstin", 600)
+}
+
+def _scan_document_numbers(text: str) -> Dict[str, str]:
+    """First Aadhaar, PAN and GSTIN found in OCR text, keyed by kind (missing kinds are absent)"""
+    found: Dict[str, str] = {}
+    for match in _RE_NUMBERS_IN_TEXT.finditer(text):
+        kind = match.lastgroup
+        if kind not in found:
+            found[kind] = match.group(kind)
+            if len(found) == 3:
+                break
+    return found
+
+# First page of uploaded PDFs is rendered at the pdf2image default resolution (PyMuPDF base is 72 DPI)
+PDF_RENDER_DPI = 200
+_PDF_RENDER_MATRIX = fitz.Matrix(PDF_RENDER_DPI / 72, PDF_RENDER_DPI / 72)
+
+# Images sent to the Vision API are capped at this longest edge and re-encoded as
+# JPEG; ID cards stay fully legible while upload bytes drop several-fold
+VISION_MAX_EDGE = 1600
+VISION_JPEG_QUALITY = 85
+EXIF_ORIENTATION = 0x0112  # EXIF tag for how the camera was held
+
+# Max OpenAI requests in flight per service instance
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", 20))
+
+# Proactive throttling to the account's per-minute limits, so bursts of uploads
+# wait for capacity instead of hitting 429s and degrading to Tesseract
+OPENAI_MAX_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_MAX_REQUESTS_PER_MINUTE", 500))
+OPENAI_MAX_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_MAX_TOKENS_PER_MINUTE", 30000))
+# Prompt tokens charged per image (high detail, <=1600 px edge) and per text request
+IMAGE_TOKEN_ESTIMATE = 1200
+TEXT_TOKEN_ESTIMATE = 500
+
+# Transient OpenAI errors are retried with jittered exponential backoff (capped at 30s)
+# before a document falls back to Tesseract
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+MAX_API_ATTEMPTS = 5
+MAX_RETRY_DELAY = 30.0
+
+# Threads for fallback Tesseract OCR; each holds its own engine per language set
+# (~100 MB of traineddata), so keep this small
+TESSERACT_THREADS = int(os.getenv("TESSERACT_THREADS", min(4, os.cpu_count() or 1)))
+# Tesseract input is binarized (Gaussian adaptive threshold) and deskewed first;
+# clean black-on-white text is read faster and more accurately than raw color scans
+THRESHOLD_BLOCK_SIZE = 31
+THRESHOLD_OFFSET = 10
+MAX_DESKEW_ANGLE = 15  # degrees; larger estimates are layout, not skew
+# Every Indic language pack is only loaded when the script can't be told; otherwise an
+# orientation/script detection pass (osd.traineddata, cheap) picks English plus the
+# one language for the detected script
+TESSERACT_ALL_LANGS = 'eng+hin+tam+tel+kan+mal+pan+ben'
+TESSERACT_SCRIPT_LANGS = {
+    "Latin": "eng",
+    "Devanagari": "eng+hin",
+    "Tamil": "eng+tam",
+    "Telugu": "eng+tel",
+    "Kannada": "eng+kan",
+    "Malayalam": "eng+mal",
+    "Gurmukhi": "eng+pan",
+    "Bengali": "eng+ben"
+}
+MIN_SCRIPT_CONFIDENCE = 1.0
+
+# Encoded images kept in memory by content hash, so retries and re-submissions of
+# the same upload skip PDF rendering and re-encoding (large encodings aren't kept)
+ENCODE_CACHE_SIZE = 64
+ENCODE_CACHE_MAX_CHARS = 5 * 1024 * 1024
+# detect_and_translate results cached in Redis by content hash
+DETECT_CACHE_TTL = 86400  # 24 hours
+# Detected-language labels that skip the translation call even if the model flags it
+ENGLISH_LANGUAGE_NAMES = frozenset({"english", "en", "en-us", "en-gb", "en-in"})
+
+def _preprocess_for_tesseract(image: Image.Image) -> Image.Image:
+    """Grayscale, adaptive threshold and deskew (unchanged if OpenCV can't be loaded)"""
+    # Imported on first fallback OCR rather than at module load, so a broken OpenCV
+    # install only costs preprocessing instead of keeping the app from starting
+    try:
+        import cv2
+    except ImportError as e:
+        print(f"OpenCV unavailable, skipping Tesseract preprocessing: {e}")
+        return image
+    gray = np.asarray(image.convert("L"))
+    binary = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, THRESHOLD_BLOCK_SIZE, THRESHOLD_OFFSET
+    )
+    return Image.fromarray(_deskew(cv2, binary))
+
+def _deskew(cv2, binary: np.ndarray) -> np.ndarray:
+    """Rotate a black-on-white image so the bounding box of its text is level"""
+    coords = cv2.findNonZero(cv2.bitwise_not(binary))
+    if coords is None:
+        return binary
+    angle = cv2.minAreaRect(coords)[-1]
+    # minAreaRect angle conventions differ across OpenCV versions; fold into (-45, 45]
+    if angle > 45:
+        angle -= 90
+    elif angle <= -45:
+        angle += 90
+    if abs(angle) < 0.5 or abs(angle) > MAX_DESKEW_ANGLE:
+        return binary
+    height, width = binary.shape
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(binary, rotation, (width, height), flags=cv2.INTER_NEAREST, borderValue=255)
+
+async def _redis_get(key: str) -> Optional[bytes]:
+    """Cached value, or None on a miss or when Redis is unavailable"""
+    try:
+        return await redis_client.get(key)
+    except Exception as e:
+        print(f"⚠️ OCR cache read failed: {e}")
+        return None
+
+async def _redis_setex(key: str, ttl: int, value: bytes):
+    try:
+        await redis_client.setex(key, ttl, value)
+    except Exception as e:
+        print(f"⚠️ OCR cache write failed: {e}")
+
+@dataclass
+class _LoadedImage:
+    """One uploaded document, read once and shared by Vision encoding and Tesseract"""
+    data: bytes
+    sha256: str
+    is_pdf: bool
+    _decoded: Optional[Image.Image] = None
+    
+    @property
+    def pil(self) -> Image.Image:
+        """Full-resolution image (first page rendered for PDFs), decoded on first use"""
+        if self._decoded is None:
+            if self.is_pdf:
+                with fitz.open(stream=self.data, filetype="pdf") as doc:
+                    pix = doc.load_page(0).get_pixmap(matrix=_PDF_RENDER_MATRIX, alpha=False, colorspace=fitz.csRGB)
+                    self._decoded = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            else:
+                self._decoded = Image.open(io.BytesIO(self.data))
+                self._decoded.load()
+        return self._decoded
 
 @dataclass
 class OCRResult:
@@ -19,47 +308,141 @@ class OCRResult:
 
 class OCRService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-    def encode_image_to_base64(self, image_path: str) -> str:
-        """Convert image to base64 for OpenAI Vision API"""
-        # If the file is a PDF, convert first page to image
-        if image_path.lower().endswith('.pdf'):
+        # Process-wide pooled client; async so document requests don't block the
+        # event loop while GPT-4o responds
+        self.client = async_openai_client
+        self._sem = asyncio.Semaphore(OPENAI_CONCURRENCY)
+        self._request_limiter = AsyncLimiter(OPENAI_MAX_REQUESTS_PER_MINUTE, time_period=60)
+        self._token_limiter = AsyncLimiter(OPENAI_MAX_TOKENS_PER_MINUTE, time_period=60)
+        self._encoded_images = LRUCache(maxsize=ENCODE_CACHE_SIZE)
+        # In-process Tesseract engines, one per language set and thread (an engine is not
+        # thread-safe), loaded on first use and reused; fallback OCR runs on its own pool
+        # so it never blocks the event loop
+        self._tess_local = threading.local()
+        self._tess_executor = ThreadPoolExecutor(max_workers=TESSERACT_THREADS, thread_name_prefix="tesseract")
+    
+    async def _reserve_capacity(self, kwargs: Dict[str, Any]):
+        """Wait until the request and its estimated tokens (prompt + completion) fit the per-minute limits"""
+        estimated_tokens = kwargs.get("max_tokens") or TEXT_TOKEN_ESTIMATE
+        for message in kwargs["messages"]:
+            content = message["content"]
+            if isinstance(content, str):
+                estimated_tokens += len(content) // 4
+            else:
+                estimated_tokens += sum(
+                    IMAGE_TOKEN_ESTIMATE if part["type"] == "image_url" else len(part["text"]) // 4
+                    for part in content
+                )
+        await self._request_limiter.acquire()
+        await self._token_limiter.acquire(min(estimated_tokens, OPENAI_MAX_TOKENS_PER_MINUTE))
+    
+    async def _chat_completion(self, **kwargs):
+        """Chat completion within the rate limits and concurrency cap, retried on transient errors"""
+        for attempt in range(MAX_API_ATTEMPTS):
             try:
-                images = convert_from_path(image_path, first_page=1, last_page=1)
-                if images:
-                    # Save the first page as a temporary JPEG
-                    temp_image_path = image_path + '_temp.jpg'
-                    images[0].save(temp_image_path, 'JPEG')
-                    with open(temp_image_path, "rb") as image_file:
-                        base64_string = base64.b64encode(image_file.read()).decode('utf-8')
-                    # Clean up temporary file
-                    os.remove(temp_image_path)
-                    return base64_string
-            except Exception as e:
-                print(f"PDF conversion failed: {e}")
-                raise
-        else:
-            # Handle regular image files
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+                await self._reserve_capacity(kwargs)
+                async with self._sem:
+                    return await self.client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_API_ATTEMPTS - 1:
+                    raise
+                delay = min(MAX_RETRY_DELAY, 2 ** attempt + random.random())
+                print(f"⚠️ OpenAI {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{MAX_API_ATTEMPTS})")
+                await asyncio.sleep(delay)
+        
+    async def _load_image(self, image_path: str) -> _LoadedImage:
+        """Read a document once without blocking the loop; later stages share the bytes and decode"""
+        async with aiofiles.open(image_path, 'rb') as f:
+            data = await f.read()
+        return _LoadedImage(data, hashlib.sha256(data).hexdigest(), image_path.lower().endswith('.pdf'))
+    
+    async def encode_image_to_base64(self, image: Union[str, _LoadedImage]) -> str:
+        """Convert image to base64 for OpenAI Vision API (reusing the encoding of identical content)"""
+        if isinstance(image, str):
+            image = await self._load_image(image)
+        encoded = self._encoded_images.get(image.sha256)
+        if encoded is None:
+            # PDF rendering and JPEG re-encoding are CPU work, kept off the event loop
+            encoded = await asyncio.to_thread(self._encode_loaded, image)
+            if len(encoded) <= ENCODE_CACHE_MAX_CHARS:
+                self._encoded_images[image.sha256] = encoded
+        return encoded
+    
+    def _encode_loaded(self, loaded: _LoadedImage) -> str:
+        if not loaded.is_pdf:
+            image = loaded.pil
+            if (image.format == "JPEG" and max(image.size) <= VISION_MAX_EDGE
+                    and image.getexif().get(EXIF_ORIENTATION, 1) == 1):
+                # Already small enough and upright: send the original bytes
+                return pybase64.b64encode_as_string(loaded.data)
+        
+        # Downscale an upright copy (the re-encoded JPEG carries no EXIF orientation, so
+        # phone photos are rotated here; the full-resolution decode stays available for
+        # Tesseract) and encode it as JPEG in memory
+        image = ImageOps.exif_transpose(loaded.pil)
+        image.thumbnail((VISION_MAX_EDGE, VISION_MAX_EDGE), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, "JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+        return pybase64.b64encode_as_string(buffer.getbuffer())
+    
+    def _tess_api(self, lang: str, psm: Optional[int] = None) -> "PyTessBaseAPI":
+        """This thread's Tesseract engine for a language set, created on first use"""
+        apis = getattr(self._tess_local, "apis", None)
+        if apis is None:
+            apis = self._tess_local.apis = {}
+        api = apis.get(lang)
+        if api is None:
+            api = apis[lang] = PyTessBaseAPI(lang=lang, psm=PSM.AUTO if psm is None else psm)
+        return api
     
-    def extract_text_with_tesseract(self, image_path: str, lang: str = 'eng+hin+tam+tel+kan+mal+pan+ben') -> str:
-        """Fallback OCR using Tesseract with multi-language support"""
+    def _detect_tesseract_langs(self, image: Image.Image) -> str:
+        """Smallest language set for the image's script, or every language if detection is unsure"""
         try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image, lang=lang)
-            return text
+            if PyTessBaseAPI is None:
+                osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+                script, confidence = osd.get("script"), osd.get("script_conf", 0)
+            else:
+                api = self._tess_api("osd", PSM.OSD_ONLY)
+                api.SetImage(image)
+                osd = api.DetectOrientationScript() or {}
+                script, confidence = osd.get("script_name"), osd.get("script_conf", 0)
+        except Exception as e:
+            print(f"Tesseract script detection failed: {e}")
+            return TESSERACT_ALL_LANGS
+        if confidence < MIN_SCRIPT_CONFIDENCE:
+            return TESSERACT_ALL_LANGS
+        return TESSERACT_SCRIPT_LANGS.get(script, TESSERACT_ALL_LANGS)
+    
+    def extract_text_with_tesseract(self, image: Union[str, _LoadedImage], lang: Optional[str] = None) -> str:
+        """
+        Fallback OCR using Tesseract with multi-language support (a path, or an already loaded document)
+        
+        Without an explicit lang, the language set is chosen from the detected script
+        """
+        try:
+            image = ImageOps.exif_transpose(Image.open(image) if isinstance(image, str) else image.pil)
+            image = _preprocess_for_tesseract(image)
+            lang = lang or self._detect_tesseract_langs(image)
+            if PyTessBaseAPI is None:
+                return pytesseract.image_to_string(image, lang=lang)
+            api = self._tess_api(lang)
+            api.SetImage(image)
+            return api.GetUTF8Text()
         except Exception as e:
             print(f"Tesseract OCR failed: {e}")
             return ""
+    
+    async def _tesseract_text(self, image: Union[str, _LoadedImage]) -> str:
+        """extract_text_with_tesseract on the Tesseract thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._tess_executor, self.extract_text_with_tesseract, image)
 
     # Voice-related methods
     async def transcribe_audio(self, audio_file_path: str) -> str:
         """Convert audio to text using OpenAI Whisper API"""
         try:
             with open(audio_file_path, "rb") as audio_file:
-                transcription = await self.client.audio.transcriptions.acreate(
+                transcription = await self.client.audio.transcriptions.create(
                     file=audio_file,
                     model="whisper-1"
                 )
@@ -71,7 +454,7 @@ class OCRService:
     async def text_to_speech(self, text: str, voice: str = "nova") -> bytes:
         """Convert text to speech using OpenAI TTS API"""
         try:
-            response = await self.client.audio.speech.acreate(
+            response = await self.client.audio.speech.create(
                 model="tts-1",
                 voice=voice,  # alloy, echo, fable, onyx, nova, shimmer
                 input=text
@@ -86,11 +469,18 @@ class OCRService:
         Detect text in any language and translate to English if needed
         Returns the original text, detected language, translated text, and confidence score
         """
+        image = image_path  # Replaced by the loaded document, shared with the fallback
         try:
-            base64_image = self.encode_image_to_base64(image_path)
+            image = await self._load_image(image_path)
+            # Keyed by the hash of the file bytes, so a hit skips decoding and encoding
+            cache_key = f"ocr:detect:{image.sha256}"
+            cached = await _redis_get(cache_key)
+            if cached is not None:
+                return OCRResult(**orjson.loads(cached))
+            base64_image = await self.encode_image_to_base64(image)
             
             # First, detect text and language
-            response = self.client.chat.completions.create(
+            response = await self._chat_completion(
                 model="gpt-4o",
                 messages=[
                     {
@@ -112,15 +502,18 @@ class OCRService:
                 response_format={ "type": "json_object" }
             )
             
-            result = json.loads(response.choices[0].message.content)
+            result = orjson.loads(response.choices[0].message.content)
             original_text = result.get('text', '')
             detected_language = result.get('language', 'unknown')
-            needs_translation = result.get('needs_translation', False)
+            needs_translation = (
+                result.get('needs_translation', False)
+                and str(detected_language).strip().lower() not in ENGLISH_LANGUAGE_NAMES
+            )
             
             translated_text = original_text
             if needs_translation and original_text:
                 # Translate to English if needed
-                translation_response = self.client.chat.completions.create(
+                translation_response = await self._chat_completion(
                     model="gpt-4o",
                     messages=[
                         {
@@ -131,17 +524,19 @@ class OCRService:
                 )
                 translated_text = translation_response.choices[0].message.content
             
-            return OCRResult(
+            ocr_result = OCRResult(
                 text=original_text,
                 detected_language=detected_language,
                 translated_text=translated_text,
                 confidence=0.95 if response.choices[0].finish_reason == "stop" else 0.7
             )
+            await _redis_setex(cache_key, DETECT_CACHE_TTL, orjson.dumps(asdict(ocr_result)))
+            return ocr_result
             
         except Exception as e:
             print(f"OpenAI Vision API OCR failed: {e}")
             # Fallback to Tesseract
-            text = self.extract_text_with_tesseract(image_path)
+            text = await self._tesseract_text(image)
             return OCRResult(
                 text=text,
                 detected_language="unknown",
@@ -151,45 +546,16 @@ class OCRService:
     
     async def process_aadhaar_card(self, image_path: str) -> Tuple[Dict[str, Any], float]:
         """Process Aadhaar card and extract information using OpenAI Vision API with multilingual support"""
+        image = image_path  # Replaced by the loaded document, shared with the fallback
         try:
-            # First, use our multilingual OCR to detect and translate text
-            ocr_result = await self.detect_and_translate(image_path)
-            base64_image = self.encode_image_to_base64(image_path)
-            
-            prompt = f"""
-            Extract the following information from this Aadhaar card image:
-            1. Full Name
-            2. Aadhaar Number (12-digit number)
-            3. Father's Name (if visible)
-            4. Date of Birth
-            5. Gender
-            6. Address
+            # One Vision call reads the card in its original script, detects the language,
+            # translates and extracts the fields (no separate detect/translate round trips)
+            image = await self._load_image(image_path)
+            base64_image = await self.encode_image_to_base64(image)
             
-            Original detected text: {ocr_result.text}
-            English translation: {ocr_result.translated_text}
-            Detected language: {ocr_result.detected_language}
+            prompt = AADHAAR_EXTRACTION_PROMPT
             
-            Return the information in the following JSON format:
-            {{
-                "name": "extracted name in English",
-                "name_original": "name in original language if different from English",
-                "aadhaar_number": "extracted aadhaar number",
-                "father_name": "extracted father name in English or null",
-                "father_name_original": "father's name in original language if different from English",
-                "dob": "extracted date of birth in DD/MM/YYYY format",
-                "gender": "Male/Female/Other",
-                "address": "extracted address in English",
-                "address_original": "address in original language if different from English",
-                "detected_language": "{ocr_result.detected_language}",
-                "confidence": {ocr_result.confidence}
-            }}
-            
-            Keep all numbers, dates, and the Aadhaar number exactly as they appear in the original.
-            If any field is not clearly visible or readable, set it to null.
-            Provide a confidence score between 0.0 and 1.0 based on image quality and text clarity.
-            """
-            
-            response = self.client.chat.completions.create(
+            response = await self._chat_completion(
                 model="gpt-4o",
                 messages=[
                     {
@@ -206,61 +572,33 @@ class OCRService:
                         ]
                     }
                 ],
+                response_format={"type": "json_object"},
                 max_tokens=500
             )
             
-            # Parse the JSON response
-            result_text = response.choices[0].message.content
-            result_json = self._extract_json_from_response(result_text)
+            # json_object mode guarantees a bare JSON object; anything else raises and falls back
+            result_json = orjson.loads(response.choices[0].message.content)
             
             # Validate Aadhaar number format
-            if result_json.get('aadhaar_number'):
-                result_json['aadhaar_number'] = self._validate_aadhaar_number(result_json['aadhaar_number'])
-            
-            confidence = result_json.pop('confidence', 0.8)
-            return result_json, confidence
+            return self._finalize_extraction("aadhar", result_json)
             
         except Exception as e:
             print(f"OpenAI Vision API failed: {e}")
             # Fallback to Tesseract + regex
-            return await self._fallback_aadhaar_extraction(image_path)
+            return await self._fallback_aadhaar_extraction(image)
     
     async def process_pan_card(self, image_path: str) -> Tuple[Dict[str, Any], float]:
         """Process PAN card and extract information using OpenAI Vision API with multilingual support"""
+        image = image_path  # Replaced by the loaded document, shared with the fallback
         try:
-            # First, use our multilingual OCR to detect and translate text
-            ocr_result = await self.detect_and_translate(image_path)
-            base64_image = self.encode_image_to_base64(image_path)
-            
-            prompt = f"""
-            Extract the following information from this PAN card image:
-            1. Full Name
-            2. PAN Number (10-character alphanumeric)
-            3. Father's Name
-            4. Date of Birth
-            
-            Original detected text: {ocr_result.text}
-            English translation: {ocr_result.translated_text}
-            Detected language: {ocr_result.detected_language}
-            
-            Return the information in the following JSON format:
-            {{
-                "name": "extracted name in English",
-                "name_original": "name in original language if different from English",
-                "pan_number": "extracted PAN number",
-                "father_name": "extracted father name in English or null",
-                "father_name_original": "father's name in original language if different from English",
-                "dob": "extracted date of birth in DD/MM/YYYY format",
-                "detected_language": "{ocr_result.detected_language}",
-                "confidence": {ocr_result.confidence}
-            }}
+            # One Vision call reads the card in its original script, detects the language,
+            # translates and extracts the fields (no separate detect/translate round trips)
+            image = await self._load_image(image_path)
+            base64_image = await self.encode_image_to_base64(image)
             
-            Keep all numbers, dates, and the PAN number exactly as they appear in the original.
-            If any field is not clearly visible or readable, set it to null.
-            Provide a confidence score between 0.0 and 1.0 based on image quality and text clarity.
-            """
+            prompt = PAN_EXTRACTION_PROMPT
             
-            response = self.client.chat.completions.create(
+            response = await self._chat_completion(
                 model="gpt-4o",
                 messages=[
                     {
@@ -277,75 +615,33 @@ class OCRService:
                         ]
                     }
                 ],
+                response_format={"type": "json_object"},
                 max_tokens=500
             )
             
-            # Parse the JSON response
-            result_text = response.choices[0].message.content
-            result_json = self._extract_json_from_response(result_text)
+            # json_object mode guarantees a bare JSON object; anything else raises and falls back
+            result_json = orjson.loads(response.choices[0].message.content)
             
             # Validate PAN number format
-            if result_json.get('pan_number'):
-                result_json['pan_number'] = self._validate_pan_number(result_json['pan_number'])
-            
-            confidence = result_json.pop('confidence', 0.8)
-            return result_json, confidence
+            return self._finalize_extraction("pan", result_json)
             
         except Exception as e:
             print(f"OpenAI Vision API failed: {e}")
             # Fallback to Tesseract + regex
-            return await self._fallback_pan_extraction(image_path)
+            return await self._fallback_pan_extraction(image)
     
     async def process_gst_certificate(self, image_path: str) -> Tuple[Dict[str, Any], float]:
         """Process GST certificate and extract information using OpenAI Vision API with multilingual support"""
+        image = image_path  # Replaced by the loaded document, shared with the fallback
         try:
-            # First, use our multilingual OCR to detect and translate text
-            ocr_result = await self.detect_and_translate(image_path)
-            base64_image = self.encode_image_to_base64(image_path)
-            
-            prompt = f"""
-            Extract the following information from this GST Certificate image:
-            1. GSTIN (15-character alphanumeric)
-            2. Legal Name of Business
-            3. Trade Name (if different)
-            4. Address
-            5. State
-            6. Registration Type
-            7. Date of Registration
-            8. Constitution of Business
-            9. Name (of signing officer/authority)
-            10. Designation (of signing officer/authority)
-            11. Date of Issue
-            
-            Original detected text: {ocr_result.text}
-            English translation: {ocr_result.translated_text}
-            Detected language: {ocr_result.detected_language}
+            # One Vision call reads the card in its original script, detects the language,
+            # translates and extracts the fields (no separate detect/translate round trips)
+            image = await self._load_image(image_path)
+            base64_image = await self.encode_image_to_base64(image)
             
-            Return the information in the following JSON format:
-            {{
-                "gstin": "extracted GSTIN number",
-                "business_name": "extracted legal business name in English",
-                "business_name_original": "business name in original language if different from English",
-                "trade_name": "extracted trade name or null",
-                "address": "extracted address in English",
-                "address_original": "address in original language if different from English",
-                "state": "extracted state name",
-                "registration_type": "Regular/Composition/Casual/etc",
-                "date_of_registration": "extracted date in DD/MM/YYYY format",
-                "constitution_of_business": "Proprietorship/Partnership/Company/etc",
-                "name": "name of signing officer/authority",
-                "designation": "designation of signing officer/authority",
-                "date_of_issue": "date of certificate issue in DD/MM/YYYY format",
-                "detected_language": "{ocr_result.detected_language}",
-                "confidence": {ocr_result.confidence}
-            }}
+            prompt = GST_EXTRACTION_PROMPT
             
-            Keep all numbers, dates, and the GSTIN exactly as they appear in the original.
-            If any field is not clearly visible or readable, set it to null.
-            Provide a confidence score between 0.0 and 1.0 based on image quality and text clarity.
-            """
-            
-            response = self.client.chat.completions.create(
+            response = await self._chat_completion(
                 model="gpt-4o",
                 messages=[
                     {
@@ -362,40 +658,76 @@ class OCRService:
                         ]
                     }
                 ],
+                response_format={"type": "json_object"},
                 max_tokens=600
             )
             
-            # Parse the JSON response
-            result_text = response.choices[0].message.content
-            result_json = self._extract_json_from_response(result_text)
+            # json_object mode guarantees a bare JSON object; anything else raises and falls back
+            result_json = orjson.loads(response.choices[0].message.content)
             
             # Validate GSTIN format
-            if result_json.get('gstin'):
-                result_json['gstin'] = self._validate_gstin(result_json['gstin'])
-            
-            confidence = result_json.pop('confidence', 0.8)
-            return result_json, confidence
+            return self._finalize_extraction("gst", result_json)
             
         except Exception as e:
             print(f"OpenAI Vision API failed: {e}")
             # Fallback to Tesseract + regex
-            return await self._fallback_gst_extraction(image_path)
+            return await self._fallback_gst_extraction(image)
     
-    def _extract_json_from_response(self, response_text: str) -> Dict[str, Any]:
-        """Extract JSON from OpenAI response text"""
-        try:
-            # Try to find JSON in the response
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            
-            if json_start != -1 and json_end != 0:
-                json_str = response_text[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                raise ValueError("No JSON found in response")
-        except Exception as e:
-            print(f"Failed to parse JSON from response: {e}")
-            return {}
+    async def process_batch(self, document_type: str, image_paths: List[str]) -> List[Any]:
+        """
+        Process several documents of one type concurrently
+        Returns (extracted_data, confidence) per path, or the exception raised for that path
+        """
+        process = {
+            "aadhar": self.process_aadhaar_card,
+            "pan": self.process_pan_card,
+            "gst": self.process_gst_certificate
+        }[document_type]
+        
+        async def process_group(paths: List[str]) -> List[Any]:
+            if len(paths) > 1:
+                try:
+                    return await self._process_group(document_type, paths)
+                except Exception as e:
+                    print(f"⚠️ Multi-image request failed ({e}), processing {len(paths)} documents individually")
+            return await asyncio.gather(*(process(path) for path in paths), return_exceptions=True)
+        
+        # Documents go out K per Vision request; groups overlap on the event loop and
+        # _chat_completion bounds how many are in flight
+        groups = [image_paths[i:i + MULTI_IMAGE_BATCH_SIZE] for i in range(0, len(image_paths), MULTI_IMAGE_BATCH_SIZE)]
+        grouped_results = await asyncio.gather(*(process_group(group) for group in groups))
+        return [result for results in grouped_results for result in results]
+    
+    async def _process_group(self, document_type: str, image_paths: List[str]) -> List[Tuple[Dict[str, Any], float]]:
+        """Extract several documents of one type with a single multi-image Vision request"""
+        prompt, _, _, max_tokens = _EXTRACTION_SPECS[document_type]
+        base64_images = await asyncio.gather(*(self.encode_image_to_base64(path) for path in image_paths))
+        
+        content = [{"type": "text", "text": MULTI_IMAGE_INSTRUCTIONS.format(count=len(image_paths)) + prompt}]
+        content.extend(
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}", "detail": "high"}}
+            for base64_image in base64_images
+        )
+        response = await self._chat_completion(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": content}],
+            response_format={"type": "json_object"},
+            max_tokens=max_tokens * len(image_paths)
+        )
+        
+        results = orjson.loads(response.choices[0].message.content).get("results")
+        if not isinstance(results, list) or len(results) != len(image_paths):
+            raise ValueError(f"expected {len(image_paths)} results, got {len(results) if isinstance(results, list) else 'none'}")
+        return [self._finalize_extraction(document_type, result_json) for result_json in results]
+    
+    def _finalize_extraction(self, document_type: str, result_json: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """Validate the document number and split off the model's confidence score"""
+        _, number_field, validator, _ = _EXTRACTION_SPECS[document_type]
+        if result_json.get(number_field):
+            result_json[number_field] = getattr(self, validator)(result_json[number_field])
+        
+        confidence = result_json.pop('confidence', 0.8)
+        return result_json, confidence
     
     def _validate_aadhaar_number(self, aadhaar: str) -> Optional[str]:
         """Validate and clean Aadhaar number"""
@@ -403,7 +735,7 @@ class OCRService:
             return None
         
         # Remove all non-digits
-        aadhaar_clean = re.sub(r'\D', '', aadhaar)
+        aadhaar_clean = _RE_NON_DIGIT.sub('', aadhaar)
         
         # Check if it's 12 digits
         if len(aadhaar_clean) == 12:
@@ -419,10 +751,7 @@ class OCRService:
         # Remove spaces and convert to uppercase
         pan_clean = pan.replace(' ', '').upper()
         
-        # PAN format: 5 letters, 4 digits, 1 letter
-        pan_pattern = r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$'
-        
-        if re.match(pan_pattern, pan_clean):
+        if _RE_PAN.match(pan_clean):
             return pan_clean
         
         return None
@@ -435,22 +764,17 @@ class OCRService:
         # Remove spaces and convert to uppercase
         gstin_clean = gstin.replace(' ', '').upper()
         
-        # GSTIN format: 2 digits (state code) + 10 chars PAN + 1 digit (entity number) + 1 letter (Z by default) + 1 alphanumeric (checksum)
-        gstin_pattern = r'^[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}[Z]{1}[0-9A-Z]{1}$'
-        
-        if re.match(gstin_pattern, gstin_clean) and len(gstin_clean) == 15:
+        if _RE_GSTIN.match(gstin_clean) and len(gstin_clean) == 15:
             return gstin_clean
         
         return None
     
-    async def _fallback_aadhaar_extraction(self, image_path: str) -> Tuple[Dict[str, Any], float]:
+    async def _fallback_aadhaar_extraction(self, image: Union[str, _LoadedImage]) -> Tuple[Dict[str, Any], float]:
         """Fallback method using Tesseract OCR for Aadhaar"""
-        text = self.extract_text_with_tesseract(image_path)
+        text = await self._tesseract_text(image)
         
         # Extract Aadhaar number using regex
-        aadhaar_pattern = r'\b\d{4}\s*\d{4}\s*\d{4}\b'
-        aadhaar_match = re.search(aadhaar_pattern, text)
-        aadhaar_number = self._validate_aadhaar_number(aadhaar_match.group()) if aadhaar_match else None
+        aadhaar_number = self._validate_aadhaar_number(_scan_document_numbers(text).get("aadhaar"))
         
         # Extract other information using basic patterns
         result = {
@@ -468,14 +792,12 @@ class OCRService:
         
         return result, 0.5  # Lower confidence for fallback method
     
-    async def _fallback_pan_extraction(self, image_path: str) -> Tuple[Dict[str, Any], float]:
+    async def _fallback_pan_extraction(self, image: Union[str, _LoadedImage]) -> Tuple[Dict[str, Any], float]:
         """Fallback method using Tesseract OCR for PAN"""
-        text = self.extract_text_with_tesseract(image_path)
+        text = await self._tesseract_text(image)
         
         # Extract PAN number using regex
-        pan_pattern = r'\b[A-Z]{5}[0-9]{4}[A-Z]{1}\b'
-        pan_match = re.search(pan_pattern, text)
-        pan_number = pan_match.group() if pan_match else None
+        pan_number = _scan_document_numbers(text).get("pan")
         
         result = {
             "name": None,
@@ -489,14 +811,12 @@ class OCRService:
         
         return result, 0.5  # Lower confidence for fallback method
     
-    async def _fallback_gst_extraction(self, image_path: str) -> Tuple[Dict[str, Any], float]:
+    async def _fallback_gst_extraction(self, image: Union[str, _LoadedImage]) -> Tuple[Dict[str, Any], float]:
         """Fallback method using Tesseract OCR for GST"""
-        text = self.extract_text_with_tesseract(image_path)
+        text = await self._tesseract_text(image)
         
         # Extract GSTIN using regex
-        gstin_pattern = r'\b[0-9]{2}[A-Z]{5}[0-9]{4}[A-Z]{1}[1-9A-Z]{1}[Z]{1}[0-9A-Z]{1}\b'
-        gstin_match = re.search(gstin_pattern, text)
-        gstin = self._validate_gstin(gstin_match.group()) if gstin_match else None
+        gstin = self._validate_gstin(_scan_document_numbers(text).get("gstin"))
         
         result = {
             "gstin": gstin,
@@ -514,4 +834,22 @@ class OCRService:
             "detected_language": "unknown"
         }
         
-        return result, 0.5  # Lower confidence for fallback method
\ No newline at end of file
+        return result, 0.5  # Lower confidence for fallback method
+
+@functools.lru_cache(maxsize=None)
+def get_ocr_service() -> OCRService:
+    """Shared OCRService instance, created on first use"""
+    return OCRService()
+
+
+# Worker processes keep one event loop for their lifetime, since the service's async
+# HTTP pool and semaphore are bound to the loop they are first used on
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def run_ocr_sync(method_name: str, image_path: str) -> Tuple[Dict[str, Any], float]:
+    """Run one OCR method to completion on this process's service (entry point for OCR worker processes)"""
+    global _worker_loop
+    if _worker_loop is None:
+        _worker_loop = asyncio.new_event_loop()
+    return _worker_loop.run_until_complete(getattr(get_ocr_service(), method_name)(image_path))
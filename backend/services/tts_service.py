@@ -1,14 +1,30 @@
-from openai import OpenAI
-import os
-import base64
-from typing import Optional
+import pybase64  # SIMD base64 for audio payloads
+from typing import Iterator, Optional
+from utils.openai_client import openai_client
+
+# Audio is relayed to streaming callers in chunks of this size
+TTS_STREAM_CHUNK_SIZE = 16 * 1024
 
 class TTSService:
     """Service for handling text-to-speech conversion using OpenAI's API"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai_client  # Shared pooled client
         
+    def stream_speech(self, text: str, voice: Optional[str] = "nova") -> Iterator[bytes]:
+        """
+        Yield MP3 audio chunks as OpenAI produces them
+        Playback can start on the first chunk and memory stays at one chunk
+        (no full-audio buffer, no base64 copy)
+        """
+        with self.client.audio.speech.with_streaming_response.create(
+            model="tts-1",
+            voice=voice,
+            input=text,
+            speed=1.0
+        ) as response:
+            yield from response.iter_bytes(TTS_STREAM_CHUNK_SIZE)
+    
     def text_to_speech(self, text: str, voice: Optional[str] = "nova") -> str:
         """
         Convert text to speech using OpenAI's TTS API
@@ -31,7 +47,7 @@ class TTSService:
             audio_data = response.content
             
             # Convert to base64 for sending over HTTP
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+            audio_base64 = pybase64.b64encode_as_string(audio_data)
             
             return audio_base64
             
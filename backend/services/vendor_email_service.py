@@ -5,14 +5,56 @@ Implements Stage 1 & 2 of the vendor registration pipeline
 import os
 import re
 import json
-import uuid
-import asyncio
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 from pymongo import MongoClient
 from services.nylas_service import NylasService
-import concurrent.futures
 from utils.pdf_converter import pdf_converter
+from utils.http_client import shared_http
+
+# Advanced regex patterns for email body parsing - flexible and case-insensitive,
+# compiled once at import
+_BODY_PATTERN_SOURCES = {
+    # Name: looks for variations like "name:", "full name:", "vendor name:", etc.
+    "name": r"(?:vendor\s+)?(?:full\s+)?name[\s:]+([A-Za-z\s.]+?)(?:\n|age|role|gender|mobile|phone|email|$)",
+    
+    # Age: looks for "age:" followed by 1-3 digits
+    "age": r"age[\s:]+(\d{1,3})",
+    
+    # Role: looks for "role:", "designation:", "type:", "category:" followed by text
+    "role": r"(?:role|designation|type|category|business\s+type)[\s:]+([A-Za-z\s/\-]+?)(?:\n|gender|mobile|phone|email|$)",
+    
+    # Gender: looks for "gender:", "sex:" followed by Male/Female/Other variations
+    "gender": r"(?:gender|sex)[\s:]+([A-Za-z]+)",
+    
+    # Mobile: looks for "mobile:", "phone:", "contact:", "number:" followed by phone number
+    # Handles formats like: +91-9876543210, 9876543210, [+91-9876543210], (+91) 9876543210, etc.
+    "mobile": r"(?:mobile|phone|contact|number|cell)[\s:]+[\[\(]?([0-9+\s\-()]+?)[\]\)]?(?:\n|registered|address|attachments|$)",
+    
+    # Email: comprehensive email pattern
+    "email": r"(?:email|e-mail|mail)[\s:]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
+    
+    # Company Name: looks for "company:", "company name:", "business name:", "organization:", etc.
+    "company": r"(?:company(?:\s+name)?|business(?:\s+name)?|organization|firm|enterprise)[\s:]+([A-Za-z0-9\s.&,-]+?)(?:\n|official|email|mobile|phone|registered|$)",
+    
+    # Address: looks for "address:", "location:", etc. (multi-line support)
+    "address": r"(?:address|location|office\s+address)[\s:]+(.+?)(?:\n\n|\nname|\nage|\nrole|$)",
+}
+_BODY_PATTERNS = {
+    field: re.compile(pattern, re.IGNORECASE | re.MULTILINE | re.DOTALL)
+    for field, pattern in _BODY_PATTERN_SOURCES.items()
+}
+
+# Subject, filename and validation patterns, compiled once at import
+_RE_SUBJECT_DASH = re.compile(r"vendor\s*registration\s*[-:]\s*(.+?)$", re.IGNORECASE)
+_RE_SUBJECT_SUFFIX = re.compile(r"(.+?)\s*[-:]\s*vendor\s*registration", re.IGNORECASE)
+_RE_SUBJECT_KEYWORDS = re.compile(r"(vendor|registration)", re.IGNORECASE)
+_RE_SEPARATORS = re.compile(r"[_\-]+")
+_RE_CATALOGUE_NAME = re.compile(r"catalog(?:ue)?|product|inventory")
+_RE_AADHAAR_NAME = re.compile(r"aadh[a]?ar")
+_RE_WHITESPACE = re.compile(r'\s+')
+_RE_NON_DIGIT = re.compile(r"[^\d]")
+_RE_EMAIL = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
 
 
 class VendorEmailService:
@@ -34,39 +76,16 @@ class VendorEmailService:
         self.processed_emails = self.db["processed_emails"]
         self.vendors = self.db["vendors"]
         self.rejected_emails = self.db["rejected_emails"]
-        self.job_status = {}  # In-memory job status tracking
+        
+        # Background runs are BullMQ jobs on the Node.js queue service
+        self.queue_service_url = os.getenv("QUEUE_SERVICE_URL", "http://localhost:3005")
         
         # Vendor storage base path
         self.vendors_base_path = "vendors"
         os.makedirs(self.vendors_base_path, exist_ok=True)
         
-        # Advanced regex patterns for email body parsing - flexible and case-insensitive
-        self.patterns = {
-            # Name: looks for variations like "name:", "full name:", "vendor name:", etc.
-            "name": r"(?:vendor\s+)?(?:full\s+)?name[\s:]+([A-Za-z\s.]+?)(?:\n|age|role|gender|mobile|phone|email|$)",
-            
-            # Age: looks for "age:" followed by 1-3 digits
-            "age": r"age[\s:]+(\d{1,3})",
-            
-            # Role: looks for "role:", "designation:", "type:", "category:" followed by text
-            "role": r"(?:role|designation|type|category|business\s+type)[\s:]+([A-Za-z\s/\-]+?)(?:\n|gender|mobile|phone|email|$)",
-            
-            # Gender: looks for "gender:", "sex:" followed by Male/Female/Other variations
-            "gender": r"(?:gender|sex)[\s:]+([A-Za-z]+)",
-            
-            # Mobile: looks for "mobile:", "phone:", "contact:", "number:" followed by phone number
-            # Handles formats like: +91-9876543210, 9876543210, [+91-9876543210], (+91) 9876543210, etc.
-            "mobile": r"(?:mobile|phone|contact|number|cell)[\s:]+[\[\(]?([0-9+\s\-()]+?)[\]\)]?(?:\n|registered|address|attachments|$)",
-            
-            # Email: comprehensive email pattern
-            "email": r"(?:email|e-mail|mail)[\s:]+([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})",
-            
-            # Company Name: looks for "company:", "company name:", "business name:", "organization:", etc.
-            "company": r"(?:company(?:\s+name)?|business(?:\s+name)?|organization|firm|enterprise)[\s:]+([A-Za-z0-9\s.&,-]+?)(?:\n|official|email|mobile|phone|registered|$)",
-            
-            # Address: looks for "address:", "location:", etc. (multi-line support)
-            "address": r"(?:address|location|office\s+address)[\s:]+(.+?)(?:\n\n|\nname|\nage|\nrole|$)",
-        }
+        # Compiled body patterns (module level, shared by all instances)
+        self.patterns = _BODY_PATTERNS
     
     def validate_subject(self, subject: str) -> Tuple[bool, Optional[str]]:
         """
@@ -99,21 +118,19 @@ class VendorEmailService:
         company_name = "Unknown"
         
         # Pattern 1: "VENDOR REGISTRATION - Company Name"
-        dash_pattern = r"vendor\s*registration\s*[-:]\s*(.+?)$"
-        match = re.search(dash_pattern, subject, re.IGNORECASE)
+        match = _RE_SUBJECT_DASH.search(subject)
         if match:
             company_name = match.group(1).strip()
         
         # Pattern 2: "Company Name - VENDOR REGISTRATION"
-        elif re.search(r"(.+?)\s*[-:]\s*vendor\s*registration", subject, re.IGNORECASE):
-            match = re.search(r"(.+?)\s*[-:]\s*vendor\s*registration", subject, re.IGNORECASE)
+        elif match := _RE_SUBJECT_SUFFIX.search(subject):
             company_name = match.group(1).strip()
         
         # Pattern 3: Extract from filename-like patterns "companyname_vendor_registration"
         elif "_" in subject or "-" in subject:
             # Remove "vendor" and "registration" words and clean up
-            cleaned = re.sub(r"(vendor|registration)", "", subject, flags=re.IGNORECASE)
-            cleaned = re.sub(r"[_\-]+", " ", cleaned).strip()
+            cleaned = _RE_SUBJECT_KEYWORDS.sub("", subject)
+            cleaned = _RE_SEPARATORS.sub(" ", cleaned).strip()
             if cleaned:
                 company_name = cleaned
         
@@ -153,7 +170,7 @@ class VendorEmailService:
             filename_lower = filename.lower()
             
             # Check for catalogue first (CSV only)
-            if re.search(r"catalog(?:ue)?|product|inventory", filename_lower):
+            if _RE_CATALOGUE_NAME.search(filename_lower):
                 has_csv = any(filename_lower.endswith(ext) for ext in valid_extensions_csv)
                 if has_csv:
                     found_types.add("catalogue")
@@ -171,7 +188,7 @@ class VendorEmailService:
             
             # Check if filename contains required keywords (case-insensitive, simple substring match)
             # Check for aadhar/aadhaar (both spellings)
-            if re.search(r"aadh[a]?ar", filename_lower):
+            if _RE_AADHAAR_NAME.search(filename_lower):
                 found_types.add("aadhar")
             
             # Check for PAN (simple substring)
@@ -204,11 +221,11 @@ class VendorEmailService:
         
         # Extract each field using advanced regex (case-insensitive, multi-line)
         for field, pattern in self.patterns.items():
-            match = re.search(pattern, email_body, re.IGNORECASE | re.MULTILINE | re.DOTALL)
+            match = pattern.search(email_body)
             if match:
                 value = match.group(1).strip()
                 # Clean up extra whitespace
-                value = re.sub(r'\s+', ' ', value)
+                value = _RE_WHITESPACE.sub(' ', value)
                 info[field] = value
         
         # Post-processing and validation
@@ -218,7 +235,7 @@ class VendorEmailService:
         # Validate and clean mobile number
         if "mobile" in info:
             # Extract only digits
-            digits = re.sub(r"[^\d]", "", info["mobile"])
+            digits = _RE_NON_DIGIT.sub("", info["mobile"])
             if len(digits) < 10 or len(digits) > 15:
                 validation_issues.append(f"Invalid mobile length: {len(digits)} digits")
                 validation_status = "needs_manual_review"
@@ -228,8 +245,7 @@ class VendorEmailService:
         
         # Validate email format
         if "email" in info:
-            email_pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-            if not re.match(email_pattern, info["email"]):
+            if not _RE_EMAIL.match(info["email"]):
                 validation_issues.append("Invalid email format")
                 validation_status = "needs_manual_review"
         
@@ -311,6 +327,12 @@ class VendorEmailService:
             "valid_emails": []
         }
         
+        # Prefetch details for every subject-valid email concurrently
+        details_by_id = await self.nylas.bulk_get_email_details([
+            email.get("id") for email in emails
+            if self.validate_subject(email.get("subject", ""))[0]
+        ])
+        
         for email in emails:
             try:
                 email_id = email.get("id")
@@ -332,8 +354,9 @@ class VendorEmailService:
                     continue
                 
                 # Get email body and attachments
-                email_details = self.nylas.get_email_details(email_id)
+                email_details = details_by_id.get(email_id)
                 if not email_details:
+                    print(f"⚠️ Could not fetch details for email {email_id}, skipping until the next run")
                     continue
                 
                 body = email_details.get("body", "")
@@ -434,12 +457,11 @@ class VendorEmailService:
         filename_lower = filename.lower()
         
         # Check for catalogue (must be CSV)
-        if filename_lower.endswith('.csv') and ('catalogue' in filename_lower or 'catalog' in filename_lower or 
-                                                  'product' in filename_lower or 'inventory' in filename_lower):
+        if filename_lower.endswith('.csv') and _RE_CATALOGUE_NAME.search(filename_lower):
             return "catalogue"
         
         # Check for aadhar/aadhaar (both spellings)
-        elif re.search(r"aadh[a]?ar", filename_lower):
+        elif _RE_AADHAAR_NAME.search(filename_lower):
             return "aadhar"
         
         # Check for PAN (as whole word or part of compound words)
@@ -473,75 +495,64 @@ class VendorEmailService:
         # Use grant_id from parameter or environment
         gid = grant_id or os.getenv("NYLAS_GRANT_ID")
         
-        # Use ThreadPoolExecutor for parallel downloads
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            futures = []
+        # Classify first; only aadhar/pan/gst attachments are downloaded
+        pending = []
+        for att in attachments:
+            att_id = att.get("id")
+            filename = att.get("filename")
+            doc_type = self.classify_document_type(filename)
             
-            for att in attachments:
-                att_id = att.get("id")
-                filename = att.get("filename")
-                doc_type = self.classify_document_type(filename)
-                
-                if not doc_type:
-                    print(f"⏭️ Skipping {filename} (not aadhar/pan/gst)")
-                    continue
-                
-                print(f"📤 Submitting download: {filename} (ID: {att_id})")
-                
-                # Submit download task with new signature
-                future = executor.submit(
-                    self.nylas.download_attachment,
-                    gid,
-                    email_id,
-                    att_id,
-                    documents_path
-                )
-                futures.append((future, att, doc_type, filename))
+            if not doc_type:
+                print(f"⏭️ Skipping {filename} (not aadhar/pan/gst)")
+                continue
             
-            # Collect results
-            for future, att, doc_type, filename in futures:
-                try:
-                    file_path = future.result(timeout=30)
+            print(f"📤 Submitting download: {filename} (ID: {att_id})")
+            pending.append((att, doc_type, filename))
+        
+        # Download all concurrently over the shared async Nylas client
+        file_paths = await self.nylas.download_attachments([
+            {
+                "grant_id": gid,
+                "message_id": email_id,
+                "attachment_id": att.get("id"),
+                "save_folder": documents_path
+            }
+            for att, _, _ in pending
+        ])
+        
+        # Collect results
+        for (att, doc_type, filename), file_path in zip(pending, file_paths):
+            try:
+                if file_path and os.path.exists(file_path):
+                    file_size = os.path.getsize(file_path)
                     
-                    if file_path and os.path.exists(file_path):
-                        file_size = os.path.getsize(file_path)
-                        
-                        # Check if file is a PDF - convert to images
-                        if pdf_converter.is_pdf(file_path):
-                            print(f"📄 PDF detected: {filename}, converting to images...")
-                            try:
-                                # Convert PDF to image(s) - returns list of converted images
-                                converted_images = pdf_converter.convert_pdf_to_images(
-                                    file_path, 
-                                    output_format="png"
-                                )
-                                
-                                # Add each converted image to downloaded_docs
-                                for img_info in converted_images:
-                                    img_filename = os.path.basename(img_info["path"])
-                                    downloaded_docs.append({
-                                        "type": doc_type,  # Same doc type for all pages
-                                        "filename": img_filename,
-                                        "path": img_info["path"],
-                                        "size": img_info["size"],
-                                        "downloaded_at": datetime.now().isoformat(),
-                                        "converted_from_pdf": True,
-                                        "pdf_page": img_info["page"]
-                                    })
-                                    print(f"✅ Converted page {img_info['page']}: {img_filename}")
-                                
-                            except Exception as pdf_error:
-                                print(f"⚠️ PDF conversion failed for {filename}: {pdf_error}")
-                                # Fallback: keep original PDF if conversion fails
+                    # Check if file is a PDF - convert to images
+                    if pdf_converter.is_pdf(file_path):
+                        print(f"📄 PDF detected: {filename}, converting to images...")
+                        try:
+                            # Convert PDF to image(s) - returns list of converted images
+                            converted_images = pdf_converter.convert_pdf_to_images(
+                                file_path, 
+                                output_format="png"
+                            )
+                            
+                            # Add each converted image to downloaded_docs
+                            for img_info in converted_images:
+                                img_filename = os.path.basename(img_info["path"])
                                 downloaded_docs.append({
-                                    "type": doc_type,
-                                    "filename": filename,
-                                    "path": file_path,
-                                    "size": file_size,
-                                    "downloaded_at": datetime.now().isoformat()
+                                    "type": doc_type,  # Same doc type for all pages
+                                    "filename": img_filename,
+                                    "path": img_info["path"],
+                                    "size": img_info["size"],
+                                    "downloaded_at": datetime.now().isoformat(),
+                                    "converted_from_pdf": True,
+                                    "pdf_page": img_info["page"]
                                 })
-                        else:
-                            # Regular image file - add as-is
+                                print(f"✅ Converted page {img_info['page']}: {img_filename}")
+                            
+                        except Exception as pdf_error:
+                            print(f"⚠️ PDF conversion failed for {filename}: {pdf_error}")
+                            # Fallback: keep original PDF if conversion fails
                             downloaded_docs.append({
                                 "type": doc_type,
                                 "filename": filename,
@@ -549,12 +560,21 @@ class VendorEmailService:
                                 "size": file_size,
                                 "downloaded_at": datetime.now().isoformat()
                             })
-                            print(f"✅ Successfully downloaded: {filename}")
                     else:
-                        print(f"❌ Failed to download: {filename}")
-                        
-                except Exception as e:
-                    print(f"❌ Error downloading {filename}: {str(e)}")
+                        # Regular image file - add as-is
+                        downloaded_docs.append({
+                            "type": doc_type,
+                            "filename": filename,
+                            "path": file_path,
+                            "size": file_size,
+                            "downloaded_at": datetime.now().isoformat()
+                        })
+                        print(f"✅ Successfully downloaded: {filename}")
+                else:
+                    print(f"❌ Failed to download: {filename}")
+                    
+            except Exception as e:
+                print(f"❌ Error downloading {filename}: {str(e)}")
         
         return downloaded_docs
     
@@ -669,7 +689,7 @@ class VendorEmailService:
         try:
             # Fetch emails from Nylas
             print(f"Fetching up to {limit} emails from Nylas...")
-            emails = self.nylas.fetch_emails(limit=limit)
+            emails = await self.nylas.fetch_emails_async(limit=limit)
             
             if not emails:
                 return {
@@ -715,49 +735,27 @@ class VendorEmailService:
             print(f"Error in process_emails: {str(e)}")
             raise
     
-    def start_background_processing(self, limit: int = 1000) -> str:
+    async def start_background_processing(self, limit: int = 1000) -> str:
         """
-        Start email processing in background
+        Queue email processing as a BullMQ job on the Node.js queue service
         
         Returns:
-            Job ID for tracking
+            BullMQ job ID for tracking
         """
-        job_id = str(uuid.uuid4())
-        
-        self.job_status[job_id] = {
-            "status": "processing",
-            "started_at": datetime.now().isoformat(),
-            "progress": {}
-        }
-        
-        # In a real implementation, use background task queue like Celery or BullMQ
-        # For now, we'll simulate with asyncio
-        asyncio.create_task(self._background_process(job_id, limit))
-        
-        return job_id
-    
-    async def _background_process(self, job_id: str, limit: int):
-        """Background processing task"""
-        try:
-            result = await self.process_emails(limit=limit)
-            
-            self.job_status[job_id] = {
-                "status": "completed",
-                "started_at": self.job_status[job_id]["started_at"],
-                "completed_at": datetime.now().isoformat(),
-                "results": result
-            }
-        except Exception as e:
-            self.job_status[job_id] = {
-                "status": "failed",
-                "started_at": self.job_status[job_id]["started_at"],
-                "failed_at": datetime.now().isoformat(),
-                "error": str(e)
-            }
+        response = await shared_http.post(
+            f"{self.queue_service_url}/api/jobs/email-processing",
+            json={"limit": limit}
+        )
+        response.raise_for_status()
+        return response.json()["job_id"]
     
-    def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
-        """Get background job status"""
-        return self.job_status.get(job_id)
+    async def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get background job status from the queue service"""
+        response = await shared_http.get(f"{self.queue_service_url}/api/jobs/{job_id}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
     
     def get_vendor_by_id(self, vendor_id: str) -> Optional[Dict[str, Any]]:
         """Get vendor details from MongoDB"""
@@ -5,12 +5,12 @@ Production-ready implementation with signature verification
 """
 import os
 import hmac
-import hashlib
 import json
 import re
 from typing import Dict, Any, Optional
 from datetime import datetime
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from services.nylas_service import NylasService
 from utils.catalogue_processor import catalogue_processor
 import asyncio
@@ -18,6 +18,11 @@ import concurrent.futures
 from html import unescape
 from html.parser import HTMLParser
 
+# HTML-to-text patterns, compiled once at import
+_RE_BLOCK_END = re.compile(r'<br\s*/?>|</(?:p|div|tr|li|h[1-6])>', re.IGNORECASE)
+_RE_TAG = re.compile(r'<[^>]+>')
+_RE_INLINE_SPACE = re.compile(r'[ \t]+')
+_RE_BLANK_LINES = re.compile(r'\n\s*\n')
 
 class WebhookProcessor:
     """Process vendor registration emails in real-time via webhooks"""
@@ -34,6 +39,10 @@ class WebhookProcessor:
         self.mongo_client = MongoClient(mongo_uri)
         self.db = self.mongo_client.get_database()
         
+        # Async client for non-blocking checks from async routes (health probes)
+        self.async_mongo_client = AsyncIOMotorClient(mongo_uri)
+        self.async_db = self.async_mongo_client.get_database()
+        
         # Collections
         self.processed_emails = self.db["processed_emails"]
         self.vendors = self.db["vendors"]
@@ -42,6 +51,7 @@ class WebhookProcessor:
         
         # Nylas webhook secret for signature verification
         self.webhook_secret = os.getenv("NYLAS_WEBHOOK_SECRET", "")
+        self._secret_bytes = self.webhook_secret.encode('utf-8')
         
         # Vendor storage base path
         self.vendors_base_path = "vendors"
@@ -62,16 +72,11 @@ class WebhookProcessor:
         # Decode HTML entities
         text = unescape(html_content)
         
-        # Replace common HTML tags with newlines
-        text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
-        text = re.sub(r'</p>', '\n', text, flags=re.IGNORECASE)
-        text = re.sub(r'</div>', '\n', text, flags=re.IGNORECASE)
-        text = re.sub(r'</tr>', '\n', text, flags=re.IGNORECASE)
-        text = re.sub(r'</li>', '\n', text, flags=re.IGNORECASE)
-        text = re.sub(r'</h[1-6]>', '\n', text, flags=re.IGNORECASE)
+        # Replace common HTML tags with newlines (br, /p, /div, /tr, /li, /h1-6 in one pass)
+        text = _RE_BLOCK_END.sub('\n', text)
         
         # Remove all remaining HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
+        text = _RE_TAG.sub('', text)
         
         # Replace HTML entities
         text = text.replace('&nbsp;', ' ')
@@ -81,40 +86,30 @@ class WebhookProcessor:
         text = text.replace('&quot;', '"')
         
         # Normalize whitespace
-        text = re.sub(r'[ \t]+', ' ', text)  # Multiple spaces to single space
-        text = re.sub(r'\n\s*\n', '\n\n', text)  # Multiple newlines to double newline
+        text = _RE_INLINE_SPACE.sub(' ', text)  # Multiple spaces to single space
+        text = _RE_BLANK_LINES.sub('\n\n', text)  # Multiple newlines to double newline
         text = text.strip()
         
         return text
     
-    def verify_webhook_signature(self, payload: bytes, signature: str) -> bool:
+    def new_signature_hasher(self):
         """
-        Verify Nylas webhook signature for security
-        Prevents unauthorized webhook calls
-        
-        Args:
-            payload: Raw request body (bytes)
-            signature: X-Nylas-Signature header value
-            
-        Returns:
-            True if signature is valid, False otherwise
+        Incremental HMAC-SHA256 for verifying a streamed webhook body
+        Returns None when no webhook secret is configured
         """
         if not self.webhook_secret:
+            return None
+        return hmac.new(self._secret_bytes, digestmod='sha256')
+    
+    def signature_matches(self, hasher, signature: str) -> bool:
+        """Check a fully fed hasher from new_signature_hasher against the X-Nylas-Signature value"""
+        if hasher is None:
             # If no secret configured, skip verification (development only)
             print("WARNING: NYLAS_WEBHOOK_SECRET not set - skipping signature verification")
             return True
-        
         try:
-            # Calculate expected signature
-            expected_signature = hmac.new(
-                self.webhook_secret.encode('utf-8'),
-                payload,
-                hashlib.sha256
-            ).hexdigest()
-            
-            # Compare signatures (timing-safe comparison)
-            return hmac.compare_digest(expected_signature, signature)
-            
+            # Timing-safe comparison; raises TypeError for a non-ASCII header value
+            return hmac.compare_digest(hasher.hexdigest(), signature)
         except Exception as e:
             print(f"Error verifying webhook signature: {str(e)}")
             return False
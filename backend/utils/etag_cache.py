@@ -0,0 +1,44 @@
+"""
+ETag Response Cache
+Short-lived cache for read-only listing endpoints polled by dashboards.
+Serialized bodies are kept for a few seconds with a blake2b ETag, so repeat
+polls are served locally and clients sending If-None-Match get a 304.
+The ETag covers the payload minus volatile top-level fields (the response
+timestamp), so it only changes when the data does
+"""
+import hashlib
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Tuple
+
+import orjson
+from cachetools import TTLCache
+from fastapi import Request, Response
+
+
+class ETagCache:
+    def __init__(self, ttl: float = 3.0, maxsize: int = 256, volatile_fields: Iterable[str] = ("timestamp",)):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._volatile_fields = frozenset(volatile_fields)
+
+    async def respond(self, request: Request, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Response:
+        """Serve `fetch()` as JSON from the cache, or 304 when the client's copy is current"""
+        etag, body = await self._get(key, fetch)
+
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    async def _get(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Tuple[str, bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            payload = await fetch()
+            body = orjson.dumps(payload, default=str)
+            entry = (self._etag(payload), body)
+            self._entries[key] = entry
+        return entry
+
+    def _etag(self, payload: Any) -> str:
+        if isinstance(payload, dict):
+            payload = {k: v for k, v in payload.items() if k not in self._volatile_fields}
+        stable = orjson.dumps(payload, default=str, option=orjson.OPT_SORT_KEYS)
+        return f'"{hashlib.blake2b(stable, digest_size=16).hexdigest()}"'
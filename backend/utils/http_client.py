@@ -0,0 +1,19 @@
+"""
+Shared HTTP Client
+One pooled httpx.AsyncClient reused by routers that make outbound calls
+(OCR callbacks to the Node.js queue service), so requests to the same host
+multiplex over warm HTTP/2 connections instead of reconnecting per call
+"""
+import httpx
+
+
+shared_http = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(10.0, connect=2.0),
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=64)
+)
+
+
+async def close_shared_http():
+    """Close the shared client's connections (call on app shutdown)"""
+    await shared_http.aclose()
@@ -0,0 +1,34 @@
+"""
+Shared OpenAI Clients
+One process-wide client per flavour (sync for the chat routes and TTS, async for
+OCR and catalogue processing), each over a pooled HTTP/2 connection set, so
+services reuse warm TLS connections instead of building their own pools
+"""
+import os
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+
+OPENAI_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+OPENAI_TIMEOUT = 60.0
+# Callers own retries (OCR and catalogue calls back off on 429s/timeouts themselves),
+# so the SDK's built-in retries are off rather than multiplying the attempts
+OPENAI_MAX_RETRIES = 0
+
+openai_client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_retries=OPENAI_MAX_RETRIES,
+    http_client=httpx.Client(http2=True, limits=OPENAI_POOL_LIMITS, timeout=OPENAI_TIMEOUT)
+)
+
+async_openai_client = AsyncOpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    max_retries=OPENAI_MAX_RETRIES,
+    http_client=httpx.AsyncClient(http2=True, limits=OPENAI_POOL_LIMITS, timeout=OPENAI_TIMEOUT)
+)
+
+
+async def close_openai_clients():
+    """Close pooled OpenAI connections (call on app shutdown)"""
+    await async_openai_client.close()
+    openai_client.close()
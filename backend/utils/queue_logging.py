@@ -0,0 +1,39 @@
+"""
+Non-blocking Logging
+Loggers for hot request paths: records are put on an in-memory queue and
+written to stderr by a single background thread, so request handlers never
+block on stdout/stderr I/O
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+
+
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_listener = None
+
+
+def _start_listener():
+    global _listener
+    if _listener is not None:
+        return
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    _listener = logging.handlers.QueueListener(_log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_queue_logger(name: str, level: int = logging.INFO) -> logging.Logger:
+    """Logger whose records are handed to the background writer thread"""
+    _start_listener()
+    
+    logger = logging.getLogger(name)
+    if not any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers):
+        logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
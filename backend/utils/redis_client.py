@@ -0,0 +1,21 @@
+"""
+Shared Redis Client
+One async connection pool to the Redis instance BullMQ runs on, reused for
+OCR result caching and webhook de-duplication
+"""
+import os
+import redis.asyncio as redis
+
+
+redis_pool = redis.ConnectionPool(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    password=os.getenv("REDIS_PASSWORD") or None
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+
+async def close_redis():
+    """Close pooled Redis connections (call on app shutdown)"""
+    await redis_client.aclose()
+    await redis_pool.disconnect()
@@ -1,27 +1,24 @@
 # OpenAI LLM-based verification for vendor info vs documents
 import os
-import json
-from openai import OpenAI
+from utils.openai_client import async_openai_client
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+client = async_openai_client if OPENAI_API_KEY else None
 
-def verify_vendor_info_with_documents(vendor_draft_path: str, vendor_id: str) -> bool:
+async def verify_vendor_info_with_documents(db, vendor_id: str) -> bool:
 	"""
 	Verifies if the vendor's basic info matches Aadhaar, PAN, and GST document data using OpenAI LLM.
-	Updates the vendor draft JSON with an 'is_verified' field.
+	Updates the vendor draft in the given database with an 'is_verified' field.
 	Returns True if verified, False otherwise.
 	"""
 	if not client:
 		raise RuntimeError("OpenAI API key not set in environment variable 'OPENAI_API_KEY'.")
 
-	# Load vendor draft data
-	with open(vendor_draft_path, 'r', encoding='utf-8') as f:
-		vendor_drafts = json.load(f)
-
-	vendor = vendor_drafts.get(vendor_id)
-	if not vendor:
+	# Load only this vendor's draft
+	draft = db.get_vendor_draft(vendor_id)
+	if not draft:
 		raise ValueError(f"Vendor with id {vendor_id} not found.")
+	vendor = draft.dict()
 
 	# Prepare info for LLM
 	basic = vendor.get('basic_details') or {}
@@ -68,7 +65,7 @@ Status: verified/not_verified
 Reason: [detailed explanation of what matches or what doesn't match]
 """
 
-	response = client.chat.completions.create(
+	response = await client.chat.completions.create(
 		model="gpt-4o",
 		messages=[{"role": "system", "content": "You are a flexible document verification assistant. Be reasonable with minor differences in names, spellings, and formats."},
 				  {"role": "user", "content": prompt}],
@@ -93,10 +90,9 @@ Reason: [detailed explanation of what matches or what doesn't match]
 	verification_reason = reason_line if reason_line else "No specific reason provided"
 
 	# Update vendor draft with both verification status and reason
-	vendor['is_verified'] = is_verified
-	vendor['verification_reason'] = verification_reason
-	vendor_drafts[vendor_id] = vendor
-	with open(vendor_draft_path, 'w', encoding='utf-8') as f:
-		json.dump(vendor_drafts, f, indent=2, ensure_ascii=False)
+	db.update_vendor_draft(vendor_id, {
+		'is_verified': is_verified,
+		'verification_reason': verification_reason
+	})
 
 	return is_verified
@@ -13,6 +13,9 @@ const { BullMQAdapter } = require('@bull-board/api/bullMQAdapter');
 const { ExpressAdapter } = require('@bull-board/express');
 
 const { documentQueue } = require('./queues/document_queue');
+const { emailProcessingQueue } = require('./queues/email_processing_queue');
+// Email processing jobs only wait on the Python API, so their worker runs in this process
+const { emailProcessingWorker } = require('./workers/email_processing_worker');
 const BatchingService = require('./services/batching_service');
 const MongoService = require('./services/mongo_service');
 const callbackRoutes = require('./routes/callback_routes');
@@ -38,7 +41,7 @@ const serverAdapter = new ExpressAdapter();
 serverAdapter.setBasePath('/admin/queues');
 
 createBullBoard({
-  queues: [new BullMQAdapter(documentQueue)],
+  queues: [new BullMQAdapter(documentQueue), new BullMQAdapter(emailProcessingQueue)],
   serverAdapter: serverAdapter,
 });
 
@@ -227,6 +230,57 @@ app.post('/api/batches/:batchId/retry', async (req, res) => {
   }
 });
 
+// BullMQ job state -> status reported to the Python API
+const EMAIL_JOB_STATUS = {
+  waiting: 'queued',
+  delayed: 'queued',
+  prioritized: 'queued',
+  active: 'processing',
+  completed: 'completed',
+  failed: 'failed'
+};
+
+// Queue a Stage 1 & 2 email processing run
+app.post('/api/jobs/email-processing', async (req, res) => {
+  try {
+    const { limit = 1000 } = req.body || {};
+    
+    const job = await emailProcessingQueue.add('process_emails', { limit });
+    
+    res.json({
+      success: true,
+      job_id: job.id
+    });
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Get email processing job status
+app.get('/api/jobs/:jobId', async (req, res) => {
+  try {
+    const job = await emailProcessingQueue.getJob(req.params.jobId);
+    
+    if (!job) {
+      return res.status(404).json({ error: 'Job not found' });
+    }
+    
+    const state = await job.getState();
+    
+    res.json({
+      job_id: job.id,
+      status: EMAIL_JOB_STATUS[state] || state,
+      progress: typeof job.progress === 'object' ? job.progress : {},
+      results: job.returnvalue || null,
+      error: job.failedReason || null,
+      started_at: job.processedOn ? new Date(job.processedOn).toISOString() : null,
+      finished_at: job.finishedOn ? new Date(job.finishedOn).toISOString() : null
+    });
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
 // Start server
 app.listen(PORT, async () => {
   console.log(`🚀 BullMQ Queue Service running on port ${PORT}`);
@@ -242,14 +296,18 @@ app.listen(PORT, async () => {
 // Graceful shutdown
 process.on('SIGTERM', async () => {
   console.log('SIGTERM received, closing gracefully...');
-  // Only close the queue, scheduler runs in separate container
+  // Only close the queues, scheduler runs in separate container
+  await emailProcessingWorker.close();
+  await emailProcessingQueue.close();
   await documentQueue.close();
   process.exit(0);
 });
 
 process.on('SIGINT', async () => {
   console.log('SIGINT received, closing gracefully...');
-  // Only close the queue, scheduler runs in separate container
+  // Only close the queues, scheduler runs in separate container
+  await emailProcessingWorker.close();
+  await emailProcessingQueue.close();
   await documentQueue.close();
   process.exit(0);
 });
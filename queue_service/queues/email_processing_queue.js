@@ -0,0 +1,31 @@
+/**
+ * BullMQ Email Processing Queue
+ * Tracks Stage 1 & 2 runs (Nylas email fetch + attachment download)
+ * requested by the Python API, so they survive API restarts and can be
+ * polled from any API worker
+ */
+
+const { Queue } = require('bullmq');
+const { connection } = require('./document_queue');
+
+const emailProcessingQueue = new Queue('email_processing', {
+  connection,
+  defaultJobOptions: {
+    attempts: 1, // A full run is expensive; callers re-trigger instead
+    removeOnComplete: {
+      count: 100, // Keep last 100 completed runs
+      age: 24 * 3600, // Keep for 24 hours
+    },
+    removeOnFail: {
+      count: 500, // Keep last 500 failed runs for debugging
+    },
+  },
+});
+
+emailProcessingQueue.on('error', (error) => {
+  console.error('❌ Email processing queue error:', error);
+});
+
+module.exports = {
+  emailProcessingQueue,
+};
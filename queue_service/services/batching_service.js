@@ -210,16 +210,17 @@ class BatchingService {
 
   /**
    * Add batches to BullMQ queue
+   * One addBulk (single Redis round-trip) and one bulkWrite for the job IDs
    */
   async addBatchesToQueue(batches) {
     try {
-      const jobs = [];
+      if (batches.length === 0) return 0;
       
-      for (const batch of batches) {
-        const job = await documentQueue.add(
-          'extract_documents',
-          batch,
-          {
+      const jobs = await documentQueue.addBulk(
+        batches.map(batch => ({
+          name: 'extract_documents',
+          data: batch,
+          opts: {
             priority: batch.priority,
             attempts: 3,
             backoff: {
@@ -227,13 +228,13 @@ class BatchingService {
               delay: 5000
             }
           }
-        );
-        
-        // Update batch with job_id
-        await this.mongoService.updateBatchJobId(batch.batch_id, job.id);
-        
-        jobs.push(job.id);
-      }
+        }))
+      );
+      
+      // Update batches with their job_ids
+      await this.mongoService.updateBatchJobIds(
+        jobs.map((job, i) => ({ batchId: batches[i].batch_id, jobId: job.id }))
+      );
       
       console.log(`✅ Added ${jobs.length} jobs to BullMQ queue`);
       
@@ -8,6 +8,10 @@ const axios = require('axios');
 const fs = require('fs').promises;
 const path = require('path');
 
+// Per-document budget; a batch gets one per document, since Vision retries and the
+// Tesseract fallback can push individual documents well past the old 90s in the worst case
+const DOCUMENT_TIMEOUT_MS = 90000;
+
 class ExtractionService {
   constructor() {
     // Python FastAPI backend URL (where OCR service runs)
@@ -15,60 +19,43 @@ class ExtractionService {
   }
 
   /**
-   * Process a batch of documents (10 documents of same type) in PARALLEL
-   * Uses Promise.allSettled to send all requests simultaneously
+   * Process a batch of documents (10 documents of same type) in ONE request
+   * The Python /process-batch endpoint runs the OCR for all documents concurrently
    */
   async processBatch(documentType, documents, progressCallback) {
     const total = documents.length;
     
     try {
-      console.log(`  🚀 Starting parallel processing of ${total} documents...`);
+      console.log(`  🚀 Submitting batch of ${total} documents...`);
+      
+      let batchResults;
+      try {
+        batchResults = await this.processDocumentBatch(
+          documentType,
+          documents.map(doc => doc.document.path)
+        );
+      } catch (error) {
+        // Whole request failed - every document in the batch failed with it
+        console.error(`  ❌ Batch request failed:`, error.message);
+        batchResults = documents.map(() => ({ success: false, error: error.message }));
+      }
       
-      // Create array of promises - all start simultaneously
-      const processingPromises = documents.map((doc, index) => {
-        console.log(`  📄 Submitting ${index + 1}/${total}: ${doc.document.filename}`);
+      // Results come back in request order
+      const results = documents.map((doc, index) => {
+        const result = batchResults[index] || { success: false, error: 'Missing result' };
         
-        // Return promise for this document's processing
-        return this.processDocument(documentType, doc.document.path)
-          .then(result => ({
-            vendor_id: doc.vendor_id,
-            document_filename: doc.document.filename,
-            success: true,
-            data: result.data,
-            confidence: result.confidence,
-            error: null
-          }))
-          .catch(error => {
-            console.error(`  ❌ Failed to process ${doc.document.filename}:`, error.message);
-            return {
-              vendor_id: doc.vendor_id,
-              document_filename: doc.document.filename,
-              success: false,
-              data: null,
-              confidence: 0,
-              error: error.message
-            };
-          });
-      });
-      
-      // Wait for ALL documents to complete (parallel execution)
-      const settledResults = await Promise.allSettled(processingPromises);
-      
-      // Extract results from settled promises
-      const results = settledResults.map((settled, index) => {
-        if (settled.status === 'fulfilled') {
-          return settled.value;
-        } else {
-          // Promise itself rejected (shouldn't happen with .catch above, but safety)
-          return {
-            vendor_id: documents[index].vendor_id,
-            document_filename: documents[index].document.filename,
-            success: false,
-            data: null,
-            confidence: 0,
-            error: settled.reason?.message || 'Unknown error'
-          };
+        if (!result.success) {
+          console.error(`  ❌ Failed to process ${doc.document.filename}:`, result.error);
         }
+        
+        return {
+          vendor_id: doc.vendor_id,
+          document_filename: doc.document.filename,
+          success: !!result.success,
+          data: result.success ? result.extracted_data : null,
+          confidence: result.success ? result.confidence : 0,
+          error: result.success ? null : (result.error || 'Processing failed')
+        };
       });
       
       // Update progress to 100% after all complete
@@ -77,7 +64,7 @@ class ExtractionService {
       }
       
       const successCount = results.filter(r => r.success).length;
-      console.log(`  ✅ Parallel processing complete: ${successCount}/${total} successful`);
+      console.log(`  ✅ Batch processing complete: ${successCount}/${total} successful`);
       
       return results;
       
@@ -87,6 +74,38 @@ class ExtractionService {
     }
   }
 
+  /**
+   * Process several documents of one type with a single call to the Python OCR service
+   */
+  async processDocumentBatch(documentType, documentPaths) {
+    try {
+      const response = await axios.post(
+        `${this.pythonApiUrl}/api/ocr/process-batch`,
+        {
+          document_type: documentType,
+          document_paths: documentPaths
+        },
+        {
+          timeout: DOCUMENT_TIMEOUT_MS * Math.max(documentPaths.length, 1), // sized to the batch
+          headers: {
+            'Content-Type': 'application/json'
+          }
+        }
+      );
+      
+      return response.data.results;
+      
+    } catch (error) {
+      if (error.response) {
+        throw new Error(`API error: ${error.response.status} - ${JSON.stringify(error.response.data?.detail || 'Unknown error')}`);
+      } else if (error.request) {
+        throw new Error('No response from Python API server');
+      } else {
+        throw error;
+      }
+    }
+  }
+
   /**
    * Process a single document by calling Python OCR service
    */
@@ -116,7 +135,7 @@ class ExtractionService {
           document_path: documentPath
         },
         {
-          timeout: 90000, // 90 second timeout (increased for parallel processing)
+          timeout: DOCUMENT_TIMEOUT_MS, // 90 second timeout (increased for parallel processing)
           headers: {
             'Content-Type': 'application/json'
           }
@@ -148,6 +148,23 @@ class MongoService {
     return result;
   }
 
+  async updateBatchJobIds(jobIdsByBatch) {
+    const collection = this.db.collection('batches');
+    const now = new Date();
+    
+    const result = await collection.bulkWrite(
+      jobIdsByBatch.map(({ batchId, jobId }) => ({
+        updateOne: {
+          filter: { batch_id: batchId },
+          update: { $set: { job_id: jobId, updated_at: now } }
+        }
+      })),
+      { ordered: false }
+    );
+    
+    return result;
+  }
+
   async updateBatchStatus(batchId, status, additionalData = {}) {
     const collection = this.db.collection('batches');
     
@@ -0,0 +1,57 @@
+/**
+ * Stage 1 & 2: BullMQ Worker - Email Processing
+ * Runs queued email processing jobs by calling the Python API synchronously
+ * (the Nylas/validation pipeline lives in the Python service)
+ */
+
+const { Worker } = require('bullmq');
+const axios = require('axios');
+const { connection } = require('../queues/document_queue');
+
+const PYTHON_API_URL = process.env.PYTHON_API_URL || 'http://localhost:8000';
+const EMAIL_WORKER_CONCURRENCY = parseInt(process.env.EMAIL_WORKER_CONCURRENCY) || 1;
+
+const emailProcessingWorker = new Worker(
+  'email_processing',
+  async (job) => {
+    const { limit } = job.data;
+    
+    console.log(`📧 Processing emails: job ${job.id} | Limit: ${limit}`);
+    
+    const response = await axios.post(
+      `${PYTHON_API_URL}/api/v1/vendors/process-emails`,
+      {
+        limit,
+        background: false
+      },
+      {
+        timeout: 30 * 60 * 1000, // 30 minutes for a full fetch + download run
+        headers: {
+          'Content-Type': 'application/json'
+        }
+      }
+    );
+    
+    return response.data.summary;
+  },
+  {
+    connection,
+    concurrency: EMAIL_WORKER_CONCURRENCY
+  }
+);
+
+emailProcessingWorker.on('completed', (job) => {
+  console.log(`✅ Email processing job ${job.id} completed`);
+});
+
+emailProcessingWorker.on('failed', (job, err) => {
+  console.error(`❌ Email processing job ${job.id} failed:`, err.message);
+});
+
+emailProcessingWorker.on('error', (err) => {
+  console.error('❌ Email processing worker error:', err);
+});
+
+module.exports = {
+  emailProcessingWorker,
+};